@@ -0,0 +1,5 @@
+"""Benchmarks of sokobanpy hot paths
+
+- Author: Quan Lin
+- License: MIT
+"""
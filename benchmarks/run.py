@@ -0,0 +1,427 @@
+"""Time the engine hot paths and compare the results across commits
+
+- Author: Quan Lin
+- License: MIT
+
+Run from the repository root:
+
+    python -m benchmarks.run --output before.json
+    git checkout other-branch
+    python -m benchmarks.run --output after.json --compare before.json
+
+Every benchmark reports a throughput in operations per second, where the
+operation is named by its `unit`. Each one is repeated and the best run is
+kept, since slower runs only measure interference from the rest of the
+machine. `--compare` exits with status 1 when any benchmark is slower than
+the baseline by more than `--threshold`.
+"""
+
+from functools import partial
+from pathlib import Path
+import argparse
+import datetime
+import json
+import platform
+import random
+import subprocess
+import sys
+import time
+
+from sokobanpy import (
+    __version__,
+    SokobanVector,
+    LevelTemplate,
+    Sokoban,
+    CompactSokoban,
+    solve,
+)
+from sokobanpy.collections import SokobanCollection
+
+ROOT = Path(__file__).resolve().parent.parent
+BEGINNER_PATH = ROOT / "examples" / "example04" / "level_collections" / "0Beginner.slc"
+
+SMALL_LEVEL = (
+    ""
+    + "    #####\n"
+    + "    #   #\n"
+    + "    #$  #\n"
+    + "  ###  $##\n"
+    + "  #  $ $ #\n"
+    + "### # ## #   ######\n"
+    + "#   # ## #####  ..#\n"
+    + "# $  $          ..#\n"
+    + "##### ### #@##  ..#\n"
+    + "    #     #########\n"
+    + "    #######\n"
+)
+LARGE_SIZE = 60
+LARGE_LEVEL = "\n".join(
+    ["#" * LARGE_SIZE]
+    + ["#" + " " * (LARGE_SIZE - 2) + "#"] * (LARGE_SIZE // 2 - 1)
+    + ["#" + " " * (LARGE_SIZE // 2 - 1) + "@" + " " * (LARGE_SIZE // 2 - 2) + "#"]
+    + ["#" + " " * (LARGE_SIZE - 2) + "#"] * (LARGE_SIZE // 2 - 2)
+    + ["#" * LARGE_SIZE]
+)
+ENGINES = (Sokoban, CompactSokoban)
+SOLVER_NODES = 5000
+
+
+def _beginner_levels():
+    """Return the level strings of `0Beginner.slc`."""
+    collection = SokobanCollection(BEGINNER_PATH)
+    return [collection.level_string(i) for i in range(len(collection))]
+
+
+def _parse():
+    """Parse level strings into templates, bypassing the template cache."""
+    levels = _beginner_levels() + [SMALL_LEVEL]
+
+    def run():
+        for level_string in levels:
+            LevelTemplate.from_string(level_string)
+        return len(levels)
+
+    return run, "level"
+
+
+def _load(cls):
+    """Start games of levels whose templates are cached."""
+    levels = _beginner_levels() + [SMALL_LEVEL]
+
+    def run():
+        for level_string in levels:
+            cls(level_string)
+        return len(levels)
+
+    return run, "game"
+
+
+def _move_undo(cls):
+    """Make a random walk of moves and pushes, then undo all of it."""
+    game = cls(SMALL_LEVEL)
+    rng = random.Random(0)
+    directions = [rng.choice(Sokoban.DIRECTIONS) for _ in range(1000)]
+
+    def run():
+        nmove = 0
+        for direction in directions:
+            nmove += game.move(direction)
+        while game.undo():
+            pass
+        return len(directions) + nmove
+
+    return run, "call"
+
+
+def _move(cls):
+    """Make a random walk of moves and pushes without keeping undo history.
+
+    The flat board of `CompactSokoban` exists to make this faster than the
+    set-based `Sokoban`; compare the two results.
+    """
+    rng = random.Random(0)
+    directions = [rng.choice(Sokoban.DIRECTIONS) for _ in range(1000)]
+
+    def run():
+        game = cls(SMALL_LEVEL, undo_limit=0)
+        move = game.move
+        for direction in directions:
+            move(direction)
+        return len(directions)
+
+    return run, "call"
+
+
+def _can_move(cls):
+    """Check every direction from a fixed position."""
+    game = cls(SMALL_LEVEL)
+    directions = Sokoban.DIRECTIONS * 250
+
+    def run():
+        for direction in directions:
+            game.can_move(direction)
+        return len(directions)
+
+    return run, "call"
+
+
+def _find_path(cls, level_string):
+    """Find the path to the farthest reachable cell.
+
+    Queries alternate between two player positions, so every query recomputes
+    the reachability map instead of reusing the cached one.
+    """
+    game = cls(level_string)
+    cells = (SokobanVector(r, c) for r in range(game.nrow) for c in range(game.ncol))
+    target = max(
+        (cell for cell in cells if cell != game.player and game.reachable(cell)),
+        key=lambda cell: len(game.find_path(cell)),
+    )
+    direction = next(
+        direction
+        for direction in Sokoban.DIRECTIONS
+        if game.can_move(direction) and game.player + direction not in game.boxes
+    )
+
+    def run():
+        game.move(direction)
+        game.find_path(target)
+        game.undo()
+        game.find_path(target)
+        return 2
+
+    return run, "query"
+
+
+def _to_grid(cls):
+    """Copy the board into a grid of symbols."""
+    game = cls(SMALL_LEVEL)
+
+    def run():
+        for _ in range(100):
+            game.to_grid()
+        return 100
+
+    return run, "call"
+
+
+def _render(cls):
+    """Render the board as a string after each move and each undo."""
+    game = cls(SMALL_LEVEL)
+    direction = Sokoban.UP
+
+    def run():
+        for _ in range(50):
+            game.move(direction)
+            str(game)
+            game.undo()
+            str(game)
+        return 100
+
+    return run, "call"
+
+
+def _solve_beginner():
+    """Solve every level of `0Beginner.slc` in turn."""
+    levels = _beginner_levels()
+
+    def run():
+        for level_string in levels:
+            solve(Sokoban(level_string))
+        return len(levels)
+
+    return run, "level"
+
+
+def _solve_nodes(jobs):
+    """Expand a fixed number of search nodes on a hard level.
+
+    With more than one job this includes starting the worker processes.
+    """
+
+    def run():
+        return solve(Sokoban(SMALL_LEVEL), max_nodes=SOLVER_NODES, jobs=jobs).nodes
+
+    return run, "node"
+
+
+BENCHMARKS = (
+    [("parse", _parse)]
+    + [(f"load[{cls.__name__}]", partial(_load, cls)) for cls in ENGINES]
+    + [(f"move_undo[{cls.__name__}]", partial(_move_undo, cls)) for cls in ENGINES]
+    + [(f"move[{cls.__name__}]", partial(_move, cls)) for cls in ENGINES]
+    + [(f"can_move[{cls.__name__}]", partial(_can_move, cls)) for cls in ENGINES]
+    + [
+        (f"find_path_small[{cls.__name__}]", partial(_find_path, cls, SMALL_LEVEL))
+        for cls in ENGINES
+    ]
+    + [
+        (f"find_path_large[{cls.__name__}]", partial(_find_path, cls, LARGE_LEVEL))
+        for cls in ENGINES
+    ]
+    + [(f"to_grid[{cls.__name__}]", partial(_to_grid, cls)) for cls in ENGINES]
+    + [(f"str[{cls.__name__}]", partial(_render, cls)) for cls in ENGINES]
+    + [
+        ("solve_beginner", _solve_beginner),
+        ("solve_nodes", partial(_solve_nodes, 1)),
+        ("solve_nodes_parallel", partial(_solve_nodes, 2)),
+    ]
+)
+
+
+def measure(run, repeat=5, min_time=0.2):
+    """Time a benchmark function.
+
+    The function is called in a loop long enough to last `min_time`, and the
+    loop is timed `repeat` times.
+
+    Args:
+        run (Callable[[], int]): Function returning the number of operations
+            it performed.
+        repeat (int): Number of timed loops.
+        min_time (float): Minimum duration of a loop, in seconds.
+
+    Returns:
+        dict: Best `ops_per_sec` and `sec_per_op`, with the `loops` per
+            timing and `repeat`.
+    """
+    loops = 1
+    while True:
+        ops, elapsed = _time_loop(run, loops)
+        if elapsed >= min_time:
+            break
+        loops *= 10 if elapsed < min_time / 10 else 2
+
+    best = ops / elapsed
+    for _ in range(repeat - 1):
+        ops, elapsed = _time_loop(run, loops)
+        best = max(best, ops / elapsed)
+    return {
+        "ops_per_sec": best,
+        "sec_per_op": 1 / best,
+        "loops": loops,
+        "repeat": repeat,
+    }
+
+
+def _time_loop(run, loops):
+    """Return the operations performed and the seconds taken by `loops` calls."""
+    ops = 0
+    start = time.perf_counter()
+    for _ in range(loops):
+        ops += run()
+    return ops, time.perf_counter() - start
+
+
+def run_benchmarks(names=None, repeat=5, min_time=0.2):
+    """Run benchmarks and collect their results.
+
+    Args:
+        names (Iterable[str] | None): Substrings selecting benchmarks by name;
+            None runs them all.
+        repeat (int): Number of timed loops per benchmark.
+        min_time (float): Minimum duration of a loop, in seconds.
+
+    Returns:
+        dict: Environment metadata and a `results` dict keyed by benchmark name.
+    """
+    names = None if names is None else list(names)
+    results = {}
+    for name, setup in BENCHMARKS:
+        if names is not None and not any(part in name for part in names):
+            continue
+        run, unit = setup()
+        results[name] = dict(measure(run, repeat, min_time), unit=unit)
+    return {
+        "sokobanpy": __version__,
+        "commit": _commit(),
+        "python": sys.version.split()[0],
+        "implementation": platform.python_implementation(),
+        "machine": platform.machine(),
+        "date": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "results": results,
+    }
+
+
+def _commit():
+    """Return the git commit of the working tree, or None outside a checkout."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline, current, threshold=0.1):
+    """Compare two benchmark reports.
+
+    Args:
+        baseline (dict): Earlier report from `run_benchmarks`.
+        current (dict): Later report from `run_benchmarks`.
+        threshold (float): Relative slowdown counted as a regression.
+
+    Returns:
+        list[tuple[str, float, float, float, bool]]: For each benchmark in
+            both reports, its name, baseline and current throughput, the ratio
+            of current to baseline, and whether it regressed.
+    """
+    rows = []
+    for name, result in current["results"].items():
+        if name not in baseline["results"]:
+            continue
+        old = baseline["results"][name]["ops_per_sec"]
+        new = result["ops_per_sec"]
+        ratio = new / old
+        rows.append((name, old, new, ratio, ratio < 1 - threshold))
+    return rows
+
+
+def _print_report(report):
+    """Print the throughput of every benchmark of a report."""
+    print(f"sokobanpy {report['sokobanpy']} at {report['commit']}")
+    for name, result in report["results"].items():
+        print(f"{name:32} {result['ops_per_sec']:14,.0f} {result['unit']}/s")
+
+
+def _print_comparison(baseline, rows):
+    """Print a comparison from `compare`."""
+    print(f"\nCompared with {baseline['commit']}:")
+    for name, old, new, ratio, regressed in rows:
+        flag = "  REGRESSION" if regressed else ""
+        print(f"{name:32} {old:14,.0f} -> {new:14,.0f} {ratio:6.2f}x{flag}")
+
+
+def main():
+    """Run, save and compare benchmarks from the command line.
+
+    Exits with status 1 when `--compare` finds a regression.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark sokobanpy hot paths.")
+    parser.add_argument(
+        "names", help="run only benchmarks whose name contains one", nargs="*"
+    )
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument(
+        "--input", help="read results from this file instead of running"
+    )
+    parser.add_argument("--compare", help="baseline JSON results to compare against")
+    parser.add_argument(
+        "--threshold",
+        help="relative slowdown reported as a regression (default 0.1)",
+        type=float,
+        default=0.1,
+    )
+    parser.add_argument(
+        "--repeat", help="timed loops per benchmark (default 5)", type=int, default=5
+    )
+    parser.add_argument(
+        "--min-time",
+        help="minimum seconds per timed loop (default 0.2)",
+        type=float,
+        default=0.2,
+    )
+    args = parser.parse_args()
+
+    if args.input:
+        report = json.loads(Path(args.input).read_text())
+    else:
+        report = run_benchmarks(args.names or None, args.repeat, args.min_time)
+    _print_report(report)
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2) + "\n")
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        rows = compare(baseline, report, args.threshold)
+        _print_comparison(baseline, rows)
+        if any(row[-1] for row in rows):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -10,11 +10,11 @@
 """
 
 from pathlib import Path
-from xml.etree import ElementTree
 
 from text_engine import Screen, Sprite, Manager
 from menu_tree import MenuTree
 from sokobanpy import Sokoban
+from sokobanpy.collections import SokobanCollection
 
 
 SCREEN_WIDTH = 48
@@ -29,21 +29,20 @@ class Menu(Sprite):
         self.init_menu()
 
     def init_menu(self):
-        self.collections = [
-            item
+        self.collections = {
+            item.stem: SokobanCollection(item)
             for item in COLLECTIONS_PATH.iterdir()
             if item.suffix == COLLECTION_SUFFIX
-        ]
+        }
 
         NAME = "name"
         CHILDREN = "children"
         menu_dict = {NAME: "MENU", CHILDREN: []}
-        for collection in self.collections:
-            root = ElementTree.fromstring(collection.read_text())
-            collection_dict = {NAME: collection.stem, CHILDREN: []}
+        for stem, collection in self.collections.items():
+            collection_dict = {NAME: stem, CHILDREN: []}
             menu_dict[CHILDREN].append(collection_dict)
-            for level in root.findall("./LevelCollection/Level"):
-                collection_dict[CHILDREN].append({NAME: level.get("Id")})
+            for level_id in collection.ids:
+                collection_dict[CHILDREN].append({NAME: level_id})
 
         self.menutree = MenuTree.build_from_dict(
             menu_dict,
@@ -98,19 +97,10 @@ class SokobanGame(Manager):
 
     def init_play(self):
         _, collection_stem, level_id = self.menu.menutree.get_active_path().split("/")
-        collection = COLLECTIONS_PATH / (collection_stem + COLLECTION_SUFFIX)
+        collection = self.menu.collections[collection_stem]
         self.state = self.STATE_PLAY
         self.kill_sprites()
-        root = ElementTree.fromstring(collection.read_text())
-
-        # level_string = "\n".join(
-        #     line.text
-        #     for line in root.findall(f"./LevelCollection/Level[@Id='{level_id}']/L")
-        # )
-        level = root.findall("./LevelCollection/Level")[
-            self.menu.menutree.get_opened_index()
-        ]
-        level_string = "\n".join(line.text for line in level.findall("./L"))
+        level_string = collection.level_string(self.menu.menutree.get_opened_index())
 
         self.sokoban_board = SokobanBoard(level_string)
         self.add_sprite(self.sokoban_board)
@@ -156,6 +146,10 @@ class SokobanGame(Manager):
             self.sokoban_board.update()
             if self.sokoban_board.sokoban.is_solved():
                 self.set_debug_info("Solved!" + " " * SCREEN_WIDTH)
+            elif self.sokoban_board.sokoban.is_deadlocked():
+                self.set_debug_info(
+                    "Deadlocked! Press 'u' to undo." + " " * SCREEN_WIDTH
+                )
             else:
                 self.set_debug_info(
                     f"nmove={self.sokoban_board.sokoban.nmove}"
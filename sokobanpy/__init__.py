@@ -7,10 +7,36 @@
 from .sokobanpy import (
     __version__,
     SokobanVector,
+    SokobanVectorPool,
+    SokobanHistory,
+    SokobanStats,
+    LevelTemplate,
     Sokoban,
+    CompactSokoban,
+)
+from .solver import (
+    SolverResult,
+    TranspositionTable,
+    Solver,
+    ParallelSolver,
+    BidirectionalSolver,
+    solve,
+    solve_collection,
 )
 
 __all__ = [
     "SokobanVector",
+    "SokobanVectorPool",
+    "SokobanHistory",
+    "SokobanStats",
+    "LevelTemplate",
     "Sokoban",
+    "CompactSokoban",
+    "SolverResult",
+    "TranspositionTable",
+    "Solver",
+    "ParallelSolver",
+    "BidirectionalSolver",
+    "solve",
+    "solve_collection",
 ]
@@ -0,0 +1,231 @@
+"""Vectorised Sokoban boards with NumPy
+
+- Author: Quan Lin
+- License: MIT
+"""
+
+import numpy as np
+
+from .sokobanpy import DEFAULT_LEVEL_STRING, Sokoban
+
+
+class SokobanBatch:
+    """Many Sokoban boards stepped together with NumPy.
+
+    Boards are stored on flat padded arrays like `CompactSokoban`, all with the
+    same shape: levels smaller than the largest one are padded with walls, so
+    boards of different levels can be mixed. `step` moves every player at once
+    with the exact rules of `Sokoban.move`.
+
+    Actions are direction codes, the indices of `Sokoban.DIRECTIONS`.
+
+    Attributes:
+        n (int): Number of boards.
+        nrow (int): Number of rows of the largest level.
+        ncol (int): Number of columns of the largest level.
+        walls (numpy.ndarray): Bool array of shape `(n, size)`; also True
+            outside each level.
+        goals (numpy.ndarray): Bool array of shape `(n, size)`.
+        boxes (numpy.ndarray): Bool array of shape `(n, size)`.
+        player (numpy.ndarray): Flat player index of each board.
+        nmove (numpy.ndarray): Number of moves made on each board.
+        npush (numpy.ndarray): Number of box pushes made on each board.
+        step_reward (float): Reward of every step.
+        box_on_goal_reward (float): Reward of pushing a box onto a goal;
+            pushing a box off a goal gives the opposite.
+        solved_reward (float): Reward of solving a board.
+    """
+
+    def __init__(
+        self,
+        levels=(DEFAULT_LEVEL_STRING,),
+        step_reward=-0.1,
+        box_on_goal_reward=1.0,
+        solved_reward=10.0,
+    ):
+        """Initialize a SokobanBatch instance.
+
+        Args:
+            levels (Iterable[str | Sokoban]): One level string or game per board.
+                Games are copied in their current state.
+            step_reward (float): Reward of every step.
+            box_on_goal_reward (float): Reward of pushing a box onto a goal.
+            solved_reward (float): Reward of solving a board.
+
+        Raises:
+            ValueError: If there are no levels or a level has no player.
+        """
+        games = [
+            level if isinstance(level, Sokoban) else Sokoban(level) for level in levels
+        ]
+        if not games:
+            raise ValueError("SokobanBatch needs at least one level")
+        if any(game.player is None for game in games):
+            raise ValueError("every level needs a player")
+
+        self.step_reward = step_reward
+        self.box_on_goal_reward = box_on_goal_reward
+        self.solved_reward = solved_reward
+
+        self.n = len(games)
+        self.nrow = max(game.nrow for game in games)
+        self.ncol = max(game.ncol for game in games)
+        self.width = self.ncol + 2
+        self.size = self.width * (self.nrow + 2)
+        self.offsets = np.array([1, self.width, -1, -self.width], dtype=np.int64)
+
+        self.walls = np.ones((self.n, self.size), dtype=bool)
+        self.goals = np.zeros((self.n, self.size), dtype=bool)
+        self.boxes = np.zeros((self.n, self.size), dtype=bool)
+        self.player = np.zeros(self.n, dtype=np.int64)
+        self.nmove = np.zeros(self.n, dtype=np.int64)
+        self.npush = np.zeros(self.n, dtype=np.int64)
+
+        for i, game in enumerate(games):
+            for r in range(game.nrow):
+                start = (r + 1) * self.width + 1
+                self.walls[i, start : start + game.ncol] = False
+            for wall in game.walls:
+                self.walls[i, self.index(wall)] = True
+            for goal in game.goals:
+                self.goals[i, self.index(goal)] = True
+            for box in game.boxes:
+                self.boxes[i, self.index(box)] = True
+            self.player[i] = self.index(game.player)
+            self.nmove[i] = game.nmove
+            self.npush[i] = game.npush
+
+        self._shapes = [(game.nrow, game.ncol) for game in games]
+        self._rows = np.arange(self.n)
+        self._nbox = self.boxes.sum(axis=1)
+        self._solvable = self._nbox == self.goals.sum(axis=1)
+        self._nbox_in_goal = (self.boxes & self.goals).sum(axis=1)
+
+    @classmethod
+    def from_level(cls, level_string, n, **kwargs):
+        """Create a batch of `n` copies of one level.
+
+        Args:
+            level_string (str): Level shared by all boards.
+            n (int): Number of boards.
+            **kwargs: Reward settings passed to `SokobanBatch`.
+
+        Returns:
+            SokobanBatch: The new batch.
+        """
+        batch = cls([level_string], **kwargs)
+        batch.walls = np.repeat(batch.walls, n, axis=0)
+        batch.goals = np.repeat(batch.goals, n, axis=0)
+        batch.boxes = np.repeat(batch.boxes, n, axis=0)
+        batch.player = np.repeat(batch.player, n)
+        batch.nmove = np.repeat(batch.nmove, n)
+        batch.npush = np.repeat(batch.npush, n)
+        batch.n = n
+        batch._shapes = batch._shapes * n
+        batch._rows = np.arange(n)
+        batch._nbox = np.repeat(batch._nbox, n)
+        batch._solvable = np.repeat(batch._solvable, n)
+        batch._nbox_in_goal = np.repeat(batch._nbox_in_goal, n)
+        return batch
+
+    def index(self, position):
+        """Return the flat index of a position.
+
+        Args:
+            position (SokobanVector): Position on the board.
+
+        Returns:
+            int: Flat index into the board arrays.
+        """
+        return (position.r + 1) * self.width + position.c + 1
+
+    def is_solved(self):
+        """Check which boards have all boxes on goals.
+
+        Returns:
+            numpy.ndarray: Bool array of shape `(n,)`.
+        """
+        return self._solvable & (self._nbox_in_goal == self._nbox)
+
+    def step(self, actions):
+        """Move the player of every board, pushing boxes where necessary.
+
+        Args:
+            actions (array_like): Direction code of each board, shape `(n,)`.
+
+        Returns:
+            tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+                Whether each move was legal, whether it pushed a box, whether
+                each board is solved afterwards, and the reward of each board.
+        """
+        rows = self._rows
+        offsets = self.offsets[np.asarray(actions)]
+        new_player = self.player + offsets
+        new_box = np.clip(new_player + offsets, 0, self.size - 1)
+
+        box_ahead = self.boxes[rows, new_player]
+        moved = ~self.walls[rows, new_player] & ~(
+            box_ahead & (self.walls[rows, new_box] | self.boxes[rows, new_box])
+        )
+        pushed = moved & box_ahead
+
+        push_rows = rows[pushed]
+        old_box = new_player[pushed]
+        new_box = new_box[pushed]
+        self.boxes[push_rows, old_box] = False
+        self.boxes[push_rows, new_box] = True
+        box_in_goal_change = np.zeros(self.n, dtype=np.int64)
+        box_in_goal_change[push_rows] = self.goals[push_rows, new_box].astype(
+            np.int64
+        ) - self.goals[push_rows, old_box].astype(np.int64)
+        self._nbox_in_goal += box_in_goal_change
+
+        self.player = np.where(moved, new_player, self.player)
+        self.nmove += moved
+        self.npush += pushed
+
+        solved = self.is_solved()
+        reward = (
+            self.step_reward
+            + self.box_on_goal_reward * box_in_goal_change
+            + self.solved_reward * (solved & pushed)
+        )
+
+        return moved, pushed, solved, reward
+
+    def to_sokoban(self, i):
+        """Return board `i` as a `Sokoban` game, without its history.
+
+        Args:
+            i (int): Board index.
+
+        Returns:
+            Sokoban: Game in the same state as board `i`.
+        """
+        chars = {
+            (False, False): Sokoban.SPACE,
+            (False, True): Sokoban.GOAL,
+            (True, False): Sokoban.BOX,
+            (True, True): Sokoban.BOX_IN_GOAL,
+        }
+        player_chars = {False: Sokoban.PLAYER, True: Sokoban.PLAYER_IN_GOAL}
+        nrow, ncol = self._shapes[i]
+        lines = []
+        for r in range(nrow):
+            line = ""
+            for c in range(ncol):
+                index = (r + 1) * self.width + c + 1
+                if index == self.player[i]:
+                    line += player_chars[bool(self.goals[i, index])]
+                elif self.walls[i, index]:
+                    line += Sokoban.WALL
+                else:
+                    line += chars[
+                        (bool(self.boxes[i, index]), bool(self.goals[i, index]))
+                    ]
+            lines.append(line)
+
+        game = Sokoban("\n".join(lines))
+        game.nmove = int(self.nmove[i])
+        game.npush = int(self.npush[i])
+        return game
@@ -0,0 +1,153 @@
+"""Indexed Sokoban level collections
+
+- Author: Quan Lin
+- License: MIT
+"""
+
+from xml.etree import ElementTree
+from xml.parsers import expat
+
+from .sokobanpy import Sokoban
+
+
+class SokobanCollection:
+    """Levels of an `.slc` collection file, parsed one at a time on demand.
+
+    The file is scanned once with a streaming XML parser to record the byte
+    range of every `<Level>` element. Loading a level then reads and parses
+    only its own bytes, so opening the last level of a large collection does
+    not parse the others.
+
+    Levels are looked up by index, or by their `Id` attribute when the key is
+    a string.
+
+    Attributes:
+        path (str | os.PathLike): Path of the collection file.
+        title (str | None): Title of the collection.
+        ids (list[str | None]): `Id` attribute of each level, in file order.
+    """
+
+    _END_TAG = b"</Level>"
+
+    def __init__(self, path):
+        """Initialize a SokobanCollection instance by indexing a file.
+
+        Args:
+            path (str | os.PathLike): Path of the collection file.
+
+        Raises:
+            xml.parsers.expat.ExpatError: If the file is not well-formed XML.
+        """
+        self.path = path
+        self.title = None
+        self.ids = []
+        self._spans = []
+        self._encoding = "utf-8"
+
+        parser = expat.ParserCreate()
+        stack = []
+        title = []
+
+        def xml_decl(version, encoding, standalone):
+            if encoding:
+                self._encoding = encoding
+
+        def start_element(name, attrs):
+            stack.append(name)
+            if name == "Level":
+                self.ids.append(attrs.get("Id"))
+                self._spans.append([parser.CurrentByteIndex, None])
+
+        def end_element(name):
+            stack.pop()
+            if name == "Level":
+                self._spans[-1][1] = parser.CurrentByteIndex
+
+        def character_data(data):
+            if len(stack) == 2 and stack[-1] == "Title":
+                title.append(data)
+
+        parser.XmlDeclHandler = xml_decl
+        parser.StartElementHandler = start_element
+        parser.EndElementHandler = end_element
+        parser.CharacterDataHandler = character_data
+        with open(path, "rb") as file:
+            parser.ParseFile(file)
+
+        if title:
+            self.title = "".join(title).strip()
+        self._index = {
+            level_id: i for i, level_id in enumerate(self.ids) if level_id is not None
+        }
+
+    def __len__(self):
+        """Return the number of levels."""
+        return len(self._spans)
+
+    def __getitem__(self, key):
+        """Return a new game of a level.
+
+        Args:
+            key (int | str): Level index, or level `Id` if a string.
+
+        Returns:
+            Sokoban: The game.
+        """
+        return self.load(key)
+
+    def __iter__(self):
+        """Iterate over new games of all levels, parsing each in turn."""
+        for i in range(len(self)):
+            yield self.load(i)
+
+    def index(self, level_id):
+        """Return the index of the level with a given `Id`.
+
+        Args:
+            level_id (str): Value of the level's `Id` attribute.
+
+        Returns:
+            int: Index of the level.
+
+        Raises:
+            KeyError: If no level has this `Id`.
+        """
+        return self._index[level_id]
+
+    def level_string(self, key):
+        """Return the level string of a level.
+
+        Args:
+            key (int | str): Level index, or level `Id` if a string.
+
+        Returns:
+            str: The level string, one line per `<L>` element.
+
+        Raises:
+            IndexError: If the index is out of range.
+            KeyError: If no level has this `Id`.
+        """
+        if isinstance(key, str):
+            key = self.index(key)
+        start, end = self._spans[key]
+        with open(self.path, "rb") as file:
+            file.seek(start)
+            data = file.read(end - start + len(self._END_TAG))
+        # The end index is that of the end tag, or just past a self-closing tag.
+        if not data.endswith(self._END_TAG):
+            data = data[: end - start]
+        level = ElementTree.fromstring(data.decode(self._encoding))
+        return "\n".join(line.text or "" for line in level.findall("./L"))
+
+    def load(self, key, cls=Sokoban, **kwargs):
+        """Return a new game of a level.
+
+        Args:
+            key (int | str): Level index, or level `Id` if a string.
+            cls (type): Game class to create, `Sokoban` or a subclass.
+            **kwargs: Extra arguments for the game class, such as `undo_limit`.
+
+        Returns:
+            Sokoban: The game.
+        """
+        return cls(self.level_string(key), **kwargs)
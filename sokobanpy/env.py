@@ -0,0 +1,198 @@
+"""Gym-style Sokoban environment with NumPy observations
+
+- Author: Quan Lin
+- License: MIT
+"""
+
+import numpy as np
+
+from .sokobanpy import DEFAULT_LEVEL_STRING, CompactSokoban
+
+
+class SokobanEnv:
+    """Reinforcement-learning environment around `CompactSokoban`.
+
+    Follows the Gymnasium API without depending on it: `reset` returns
+    `(observation, info)` and `step` returns
+    `(observation, reward, terminated, truncated, info)`. Actions are direction
+    codes, the indices of `Sokoban.DIRECTIONS`. An episode terminates as soon
+    as the level is solved, which the `"solved"` entry of the info dict of
+    both `reset` and `step` reports; a level solved from the start terminates
+    on the first step.
+
+    Observations are `uint8` arrays of shape `(4, nrow, ncol)` holding one-hot
+    wall, goal, box and player channels. The same array is returned by every
+    call and patched in place for the cells a move touches, so it is never
+    rebuilt from the grid; copy it to keep an earlier observation. It is kept
+    in step by `step` only: after changing `game` directly, for example with
+    `undo` or `restore`, call `refresh` to rebuild it from `board`.
+
+    Attributes:
+        level_string (str): Level played after every `reset`.
+        max_steps (int | None): Steps before an episode is truncated; None for
+            no limit.
+        undo_limit (int | None): Undo history size of the game; 0 keeps no
+            history.
+        step_reward (float): Reward of every step.
+        box_on_goal_reward (float): Reward of pushing a box onto a goal;
+            pushing a box off a goal gives the opposite.
+        solved_reward (float): Reward of solving the level.
+        game (CompactSokoban | None): Game of the current episode.
+        observation (numpy.ndarray | None): Current observation.
+        nstep (int): Number of steps taken in the current episode.
+    """
+
+    WALL_CHANNEL = 0
+    GOAL_CHANNEL = 1
+    BOX_CHANNEL = 2
+    PLAYER_CHANNEL = 3
+    NUM_ACTIONS = 4
+
+    def __init__(
+        self,
+        level_string=DEFAULT_LEVEL_STRING,
+        max_steps=None,
+        undo_limit=0,
+        step_reward=-0.1,
+        box_on_goal_reward=1.0,
+        solved_reward=10.0,
+    ):
+        """Initialize a SokobanEnv instance.
+
+        Args:
+            level_string (str): Level played after every `reset`.
+            max_steps (int | None): Steps before an episode is truncated.
+            undo_limit (int | None): Undo history size of the game.
+            step_reward (float): Reward of every step.
+            box_on_goal_reward (float): Reward of pushing a box onto a goal.
+            solved_reward (float): Reward of solving the level.
+        """
+        self.level_string = level_string
+        self.max_steps = max_steps
+        self.undo_limit = undo_limit
+        self.step_reward = step_reward
+        self.box_on_goal_reward = box_on_goal_reward
+        self.solved_reward = solved_reward
+        self.game = None
+        self.observation = None
+        self.nstep = 0
+
+    @property
+    def board(self):
+        """numpy.ndarray: Zero-copy view of the game's padded flag board.
+
+        The view has shape `(nrow + 2, ncol + 2)` and follows the game as it
+        moves. See `CompactSokoban` for the flag values.
+        """
+        game = self.game
+        return np.frombuffer(game._board, dtype=np.uint8).reshape(-1, game._width)
+
+    def reset(self, level_string=None, seed=None, options=None):
+        """Start a new episode.
+
+        Args:
+            level_string (str | None): Level to play from now on; None to
+                replay the current one.
+            seed (int | None): Accepted for Gymnasium compatibility; the
+                environment has no randomness.
+            options (dict | None): May hold a `"level_string"` entry, used
+                when `level_string` is None.
+
+        Returns:
+            tuple[numpy.ndarray, dict]: The observation and an info dict.
+
+        Raises:
+            ValueError: If the level has no player.
+        """
+        if level_string is None and options is not None:
+            level_string = options.get("level_string")
+        if level_string is not None:
+            self.level_string = level_string
+        game = self.game = CompactSokoban(self.level_string, self.undo_limit)
+        if game.player is None:
+            raise ValueError("the level has no player")
+        self.nstep = 0
+        self.observation = np.empty((4, game.nrow, game.ncol), dtype=np.uint8)
+
+        return self.refresh(), self._info(False, False)
+
+    def refresh(self):
+        """Rebuild the observation in place from `board`.
+
+        Returns:
+            numpy.ndarray: The observation.
+        """
+        game = self.game
+        observation = self.observation
+        board = self.board[1:-1, 1:-1]
+        for channel, flag in (
+            (self.WALL_CHANNEL, game._WALL_FLAG),
+            (self.GOAL_CHANNEL, game._GOAL_FLAG),
+            (self.BOX_CHANNEL, game._BOX_FLAG),
+        ):
+            np.not_equal(board & flag, 0, out=observation[channel], casting="unsafe")
+        observation[self.PLAYER_CHANNEL] = 0
+        observation[self.PLAYER_CHANNEL][self._coordinates(game._player)] = 1
+        return observation
+
+    def step(self, action):
+        """Move the player, pushing a box if necessary.
+
+        Illegal moves leave the board unchanged but still count as steps.
+
+        Args:
+            action (int): Direction code, an index of `Sokoban.DIRECTIONS`.
+
+        Returns:
+            tuple[numpy.ndarray, float, bool, bool, dict]: The observation, the
+                reward, whether the level is solved, whether the step limit
+                was reached, and an info dict.
+        """
+        game = self.game
+        observation = self.observation
+        old_player = game._player
+        npush = game.npush
+        nbox_in_goal = game._nbox_in_goal
+
+        moved = game.move(game.DIRECTIONS[action])
+        pushed = game.npush != npush
+        if moved:
+            new_player = game._player
+            observation[self.PLAYER_CHANNEL][self._coordinates(old_player)] = 0
+            observation[self.PLAYER_CHANNEL][self._coordinates(new_player)] = 1
+            if pushed:
+                new_box = 2 * new_player - old_player
+                observation[self.BOX_CHANNEL][self._coordinates(new_player)] = 0
+                observation[self.BOX_CHANNEL][self._coordinates(new_box)] = 1
+        self.nstep += 1
+
+        # A level may already be solved at `reset`, before any push.
+        terminated = game.is_solved()
+        truncated = (
+            not terminated
+            and self.max_steps is not None
+            and self.nstep >= self.max_steps
+        )
+        reward = (
+            self.step_reward
+            + self.box_on_goal_reward * (game._nbox_in_goal - nbox_in_goal)
+            + (self.solved_reward if terminated else 0.0)
+        )
+
+        return observation, reward, terminated, truncated, self._info(moved, pushed)
+
+    def _coordinates(self, index):
+        """Return the observation row and column of a flat board index."""
+        r, c = divmod(index, self.game._width)
+        return r - 1, c - 1
+
+    def _info(self, moved, pushed):
+        """Return the info dict of a step."""
+        return {
+            "moved": moved,
+            "pushed": pushed,
+            "solved": self.game.is_solved(),
+            "nmove": self.game.nmove,
+            "npush": self.game.npush,
+            "nbox_in_goal": self.game._nbox_in_goal,
+        }
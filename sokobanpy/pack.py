@@ -0,0 +1,256 @@
+"""Binary, memory-mappable Sokoban level packs
+
+- Author: Quan Lin
+- License: MIT
+
+A pack file holds many levels in three parts, all little-endian:
+
+- A header: the magic bytes `SOKP`, the format version (uint16), a reserved
+  uint16 and the number of levels (uint32).
+- An index with one entry per level: the file offset of its cell data
+  (uint64), its number of rows and its number of columns (uint16 each).
+- The cell data of every level: `nrow * ncol` cells in row-major order,
+  3 bits each, packed from the lowest bit up and padded to whole bytes.
+
+Cell codes are the indices of `CELL_SYMBOLS`.
+"""
+
+from pathlib import Path
+import argparse
+import mmap
+import struct
+
+from .sokobanpy import Sokoban
+
+MAGIC = b"SOKP"
+VERSION = 1
+CELL_SYMBOLS = (
+    Sokoban.SPACE,
+    Sokoban.WALL,
+    Sokoban.GOAL,
+    Sokoban.BOX,
+    Sokoban.BOX_IN_GOAL,
+    Sokoban.PLAYER,
+    Sokoban.PLAYER_IN_GOAL,
+)
+CELL_BITS = 3
+
+_HEADER = struct.Struct("<4sHHI")
+_ENTRY = struct.Struct("<QHH")
+_CELL_CODES = {symbol: code for code, symbol in enumerate(CELL_SYMBOLS)}
+
+
+def _encode(grid, nrow, ncol):
+    """Return the packed cell data of a grid."""
+    value = 0
+    shift = 0
+    for r in range(nrow):
+        row = grid[r]
+        for c in range(ncol):
+            if c < len(row):
+                value |= _CELL_CODES[row[c]] << shift
+            shift += CELL_BITS
+    return value.to_bytes((shift + 7) // 8, "little")
+
+
+def write_pack(path, levels):
+    """Write levels to a pack file.
+
+    Levels are normalised by parsing them with `Sokoban`, so indentation and
+    lines that are not part of the board are dropped.
+
+    Args:
+        path (str | os.PathLike): Path of the pack file to write.
+        levels (Iterable[str | Sokoban]): Level strings or games, whose
+            current state is stored.
+
+    Returns:
+        int: Number of levels written.
+    """
+    entries = []
+    blobs = []
+    for level in levels:
+        game = level if isinstance(level, Sokoban) else Sokoban(level)
+        entries.append((game.nrow, game.ncol))
+        blobs.append(_encode(game.to_grid(), game.nrow, game.ncol))
+
+    offset = _HEADER.size + _ENTRY.size * len(entries)
+    with open(path, "wb") as file:
+        file.write(_HEADER.pack(MAGIC, VERSION, 0, len(entries)))
+        for (nrow, ncol), blob in zip(entries, blobs):
+            file.write(_ENTRY.pack(offset, nrow, ncol))
+            offset += len(blob)
+        for blob in blobs:
+            file.write(blob)
+    return len(entries)
+
+
+def read_levels(path):
+    """Read the level strings of an `.slc` collection or a `.txt` level file.
+
+    A `.txt` file holds one level, as written by
+    `examples/example03/get_txt_levels_from_slc.py`.
+
+    Args:
+        path (str | os.PathLike): Path of the file.
+
+    Returns:
+        list[str]: Level strings, in file order.
+    """
+    path = Path(path)
+    if path.suffix.lower() == ".slc":
+        from .collections import SokobanCollection
+
+        collection = SokobanCollection(path)
+        return [collection.level_string(i) for i in range(len(collection))]
+    return [path.read_text()]
+
+
+def convert(sources, path):
+    """Convert `.slc` and `.txt` level files into one pack file.
+
+    Args:
+        sources (Iterable[str | os.PathLike]): Level files, packed in order.
+        path (str | os.PathLike): Path of the pack file to write.
+
+    Returns:
+        int: Number of levels written.
+    """
+    return write_pack(path, (level for src in sources for level in read_levels(src)))
+
+
+class SokobanPack:
+    """Read-only view of a pack file through a memory map.
+
+    Opening a pack only reads its header; levels are decoded from the mapped
+    pages when they are loaded. Processes mapping the same pack share the
+    pages through the operating system's page cache.
+
+    Attributes:
+        path (str | os.PathLike): Path of the pack file.
+    """
+
+    def __init__(self, path):
+        """Initialize a SokobanPack instance by mapping a pack file.
+
+        Args:
+            path (str | os.PathLike): Path of the pack file.
+
+        Raises:
+            ValueError: If the file is not a pack of a supported version.
+        """
+        self.path = path
+        with open(path, "rb") as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+        if len(self._view) < _HEADER.size:
+            self.close()
+            raise ValueError(f"{path} is not a Sokoban level pack")
+        magic, version, _, self._count = _HEADER.unpack_from(self._view)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"{path} is not a version {VERSION} Sokoban level pack")
+
+    def __enter__(self):
+        """Return the pack itself."""
+        return self
+
+    def __exit__(self, *exc_info):
+        """Close the pack."""
+        self.close()
+
+    def __len__(self):
+        """Return the number of levels."""
+        return self._count
+
+    def __getitem__(self, index):
+        """Return a new game of a level.
+
+        Args:
+            index (int): Level index.
+
+        Returns:
+            Sokoban: The game.
+        """
+        return self.load(index)
+
+    def close(self):
+        """Release the memory map."""
+        self._view.release()
+        self._mmap.close()
+
+    def grid(self, index):
+        """Decode the cells of a level.
+
+        Args:
+            index (int): Level index.
+
+        Returns:
+            list[list[str]]: 2D array of Sokoban symbols.
+
+        Raises:
+            IndexError: If the index is out of range.
+        """
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError("level index out of range")
+        offset, nrow, ncol = _ENTRY.unpack_from(
+            self._view, _HEADER.size + _ENTRY.size * index
+        )
+        size = (nrow * ncol * CELL_BITS + 7) // 8
+        data = self._view[offset : offset + size]
+
+        # Every 3 bytes hold exactly 8 cells.
+        symbols = []
+        for i in range(0, size, 3):
+            chunk = int.from_bytes(data[i : i + 3], "little")
+            for _ in range(8):
+                symbols.append(CELL_SYMBOLS[chunk & 7])
+                chunk >>= CELL_BITS
+        return [symbols[r * ncol : (r + 1) * ncol] for r in range(nrow)]
+
+    def level_string(self, index):
+        """Return the level string of a level.
+
+        Args:
+            index (int): Level index.
+
+        Returns:
+            str: The level string.
+        """
+        return "\n".join("".join(row).rstrip() for row in self.grid(index))
+
+    def load(self, index, cls=Sokoban, **kwargs):
+        """Return a new game of a level, built from its cells without a string.
+
+        Args:
+            index (int): Level index.
+            cls (type): Game class to create, `Sokoban` or a subclass.
+            **kwargs: Extra arguments for `from_grid`, such as `undo_limit`.
+
+        Returns:
+            Sokoban: The game.
+        """
+        return cls.from_grid(self.grid(index), **kwargs)
+
+
+def main():
+    """Convert level files into a pack from the command line.
+
+    Run as `python -m sokobanpy.pack SOURCE [SOURCE ...] --output PATH`; see
+    `convert`.
+    """
+    parser = argparse.ArgumentParser(
+        description="Convert .slc and .txt level files into a Sokoban level pack."
+    )
+    parser.add_argument("sources", help="paths to .slc or .txt files", nargs="+")
+    parser.add_argument("--output", help="path to the pack file", required=True)
+    args = parser.parse_args()
+
+    count = convert(args.sources, args.output)
+    print(f"Packed {count} levels into {args.output}")
+
+
+if __name__ == "__main__":
+    main()
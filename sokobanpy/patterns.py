@@ -0,0 +1,253 @@
+"""Per-level databases of deadlocked box pairs, cached on disk
+
+- Author: Quan Lin
+- License: MIT
+
+A database records every pair of cells that two boxes can never leave
+together onto goals, whatever else is on the board and wherever the player
+stands. It depends only on the walls and goals of a level, so it is keyed by
+a hash of them and shared by every search of the level.
+
+A database file holds, all little-endian:
+
+- A header: the magic bytes `SOKD`, the format version (uint16), a reserved
+  uint16, the level key (uint64) and the size of the padded board (uint32).
+- A bit per ordered pair of flat board indices `a < b`, at bit
+  `a * size + b`, packed from the lowest bit of each byte up.
+
+Flat indices are those of `CompactSokoban`.
+"""
+
+from collections import deque
+from pathlib import Path
+import hashlib
+import mmap
+import os
+import struct
+
+from .solver import INF, _Level
+
+MAGIC = b"SOKD"
+VERSION = 1
+SUFFIX = ".sokd"
+
+_HEADER = struct.Struct("<4sHHQI")
+
+
+def level_key(game):
+    """Return the database key of a level.
+
+    Args:
+        game (Sokoban): A game of the level, in any state.
+
+    Returns:
+        int: 64-bit hash of the level size, walls and goals.
+    """
+    width = game.ncol + 2
+    digest = hashlib.blake2b(digest_size=8)
+    digest.update(struct.pack("<II", game.nrow, game.ncol))
+    for positions in (game.walls, game.goals):
+        indices = sorted((p.r + 1) * width + p.c + 1 for p in positions)
+        digest.update(struct.pack(f"<I{len(indices)}I", len(indices), *indices))
+    return int.from_bytes(digest.digest(), "little")
+
+
+def find_deadlocked_pairs(game):
+    """Find the pairs of cells two boxes can never both leave onto goals.
+
+    Every two-box layout that can be solved is found by pulling pairs of boxes
+    back from every pair of goals, with the player starting in every region.
+    A pair of live cells is deadlocked if no layout with boxes on it was
+    found, whichever region the player is in. More boxes only get in the way,
+    so a board with a deadlocked pair can never be solved.
+
+    Args:
+        game (Sokoban): A game of the level, in any state.
+
+    Returns:
+        bytearray: Bitset of the deadlocked pairs, laid out as in a database
+            file.
+    """
+    level = _Level(game)
+    floor = level.floor
+    offsets = level.offsets
+    size = level.size
+    cells = [i for i in range(size) if floor[i]]
+
+    # States are (box_a, box_b, smallest index of the player region), a < b.
+    seen = set()
+    queue = deque()
+
+    def visit(box_a, box_b, player):
+        boxes = (box_a, box_b)
+        reach = level.reach(boxes, player)
+        state = (min(boxes), max(boxes), reach.index(1))
+        if state not in seen:
+            seen.add(state)
+            queue.append((boxes, reach))
+        return reach
+
+    goals = sorted(level.goals)
+    for i, goal_a in enumerate(goals):
+        for goal_b in goals[i + 1 :]:
+            covered = bytearray(size)
+            for player in cells:
+                if player not in (goal_a, goal_b) and not covered[player]:
+                    reach = visit(goal_a, goal_b, player)
+                    for cell in cells:
+                        covered[cell] |= reach[cell]
+
+    while queue:
+        boxes, reach = queue.popleft()
+        for box, other in (boxes, boxes[::-1]):
+            for offset in offsets:
+                # Pull the box one cell along `offset`.
+                player = box + offset
+                new_player = player + offset
+                if reach[player] and floor[new_player] and new_player != other:
+                    visit(player, other, new_player)
+
+    solvable = set((box_a, box_b) for box_a, box_b, _ in seen)
+    live = [i for i in cells if level.distances[i] != INF]
+    bits = bytearray((size * size + 7) // 8)
+    if len(goals) < 2:
+        return bits
+    for i, box_a in enumerate(live):
+        for box_b in live[i + 1 :]:
+            if (box_a, box_b) not in solvable:
+                index = box_a * size + box_b
+                bits[index >> 3] |= 1 << (index & 7)
+    return bits
+
+
+class DeadlockDatabase:
+    """Read-only view of a deadlock database file through a memory map.
+
+    Processes mapping the same file share its pages through the operating
+    system's page cache. Use `open` to find the database of a level in a cache
+    directory, building it on first use.
+
+    Attributes:
+        path (str | os.PathLike): Path of the database file.
+        key (int): Key of the level, from `level_key`.
+        size (int): Number of cells of the padded board.
+    """
+
+    def __init__(self, path):
+        """Initialize a DeadlockDatabase instance by mapping a file.
+
+        Args:
+            path (str | os.PathLike): Path of the database file.
+
+        Raises:
+            ValueError: If the file is not a database of a supported version.
+        """
+        self.path = path
+        with open(path, "rb") as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _, self.key, self.size = (None, None, None, 0, 0)
+        if len(self._mmap) >= _HEADER.size:
+            magic, version, _, self.key, self.size = _HEADER.unpack_from(self._mmap)
+        if (
+            magic != MAGIC
+            or version != VERSION
+            or len(self._mmap) != _HEADER.size + (self.size**2 + 7) // 8
+        ):
+            self.close()
+            raise ValueError(f"{path} is not a version {VERSION} deadlock database")
+
+    def __enter__(self):
+        """Return the database itself."""
+        return self
+
+    def __exit__(self, *exc_info):
+        """Close the database."""
+        self.close()
+
+    @classmethod
+    def build(cls, game, path):
+        """Find the deadlocked pairs of a level and write them to a file.
+
+        The file is written under a temporary name and renamed into place, so
+        processes building the same database at once, or after a build was
+        interrupted, never see a partial one.
+
+        Args:
+            game (Sokoban): A game of the level, in any state.
+            path (str | os.PathLike): Path of the database file to write.
+
+        Returns:
+            DeadlockDatabase: The new database.
+        """
+        size = (game.ncol + 2) * (game.nrow + 2)
+        header = _HEADER.pack(MAGIC, VERSION, 0, level_key(game), size)
+        temp = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(temp, "wb") as file:
+                file.write(header)
+                file.write(find_deadlocked_pairs(game))
+            os.replace(temp, path)
+        except BaseException:
+            if os.path.exists(temp):
+                os.remove(temp)
+            raise
+        return cls(path)
+
+    @classmethod
+    def open(cls, game, directory):
+        """Return the database of a level from a cache directory.
+
+        Args:
+            game (Sokoban): A game of the level, in any state.
+            directory (str | os.PathLike): Directory of database files, named
+                after their level keys; created if missing.
+
+        Returns:
+            DeadlockDatabase: The cached database, built if not found, or
+                rebuilt if the cached file is corrupt or of another level.
+        """
+        directory = Path(directory)
+        key = level_key(game)
+        path = directory / f"{key:016x}{SUFFIX}"
+        if path.exists():
+            try:
+                database = cls(path)
+            except ValueError:
+                database = None
+            if database is not None:
+                if database.key == key:
+                    return database
+                database.close()
+        directory.mkdir(parents=True, exist_ok=True)
+        return cls.build(game, path)
+
+    def close(self):
+        """Release the memory map."""
+        self._mmap.close()
+
+    def is_deadlocked(self, box_a, box_b):
+        """Check whether two boxes on these cells are deadlocked.
+
+        Args:
+            box_a (int): Flat board index of one box.
+            box_b (int): Flat board index of the other box.
+
+        Returns:
+            bool: True if the pair can never be solved.
+        """
+        if box_a > box_b:
+            box_a, box_b = box_b, box_a
+        index = box_a * self.size + box_b
+        return bool(self._mmap[_HEADER.size + (index >> 3)] >> (index & 7) & 1)
+
+    def blocks(self, boxes, box):
+        """Check whether a box forms a deadlocked pair with any other box.
+
+        Args:
+            boxes (Iterable[int]): Flat board indices of all boxes.
+            box (int): Flat board index of the box to check.
+
+        Returns:
+            bool: True if some pair including `box` is deadlocked.
+        """
+        return any(other != box and self.is_deadlocked(box, other) for other in boxes)
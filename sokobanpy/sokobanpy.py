@@ -4,7 +4,7 @@
 - License: MIT
 """
 
-from collections import deque
+from collections import OrderedDict, deque
 
 
 __version__ = "1.3.0"
@@ -18,18 +18,31 @@ DEFAULT_LEVEL_STRING = (
     + "##########\n"
 )
 
+_MASK64 = (1 << 64) - 1
+
+
+def _splitmix64(x):
+    """Return a well-mixed 64-bit integer derived from `x`."""
+    x = (x + 0x9E3779B97F4A7C15) & _MASK64
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & _MASK64
+    return x ^ (x >> 31)
+
 
 class SokobanVector:
     """Represents a position or directional offset on a Sokoban board.
 
     Encapsulates a 2D coordinate (row and column) and supports vector-style
     operations like addition, subtraction, negation, equality, and hashing.
+    Instances are treated as immutable: the hash is computed once on creation.
 
     Attributes:
         r (int): Row index of the position.
         c (int): Column index of the position.
     """
 
+    __slots__ = ("r", "c", "_hash")
+
     def __init__(self, r, c):
         """Initialize a SokobanVector instance.
 
@@ -39,6 +52,7 @@ class SokobanVector:
         """
         self.r = r
         self.c = c
+        self._hash = hash((r, c))
 
     def __repr__(self):
         """Return a human-readable string representation.
@@ -105,7 +119,7 @@ class SokobanVector:
         Returns:
             bool: True if `other` is a SokobanVector with the same r and c.
         """
-        return (
+        return (self is other) or (
             isinstance(other, self.__class__)
             and (self.r == other.r)
             and (self.c == other.c)
@@ -117,7 +131,486 @@ class SokobanVector:
         Returns:
             int: Hash of the (row, column) tuple.
         """
-        return hash((self.r, self.c))
+        return self._hash
+
+
+class SokobanVectorPool:
+    """Canonical SokobanVector instances for every cell of a board size.
+
+    A pool holds exactly one `SokobanVector` per cell of an `nrow` x `ncol`
+    board, plus a neighbour table mapping each direction and cell to the
+    canonical neighbouring cell (or None off the board). Boards look up
+    neighbours instead of allocating new vectors, and equality checks between
+    pooled vectors succeed on identity.
+
+    Pools are shared by every board of the same size; use `get` to obtain one.
+
+    Attributes:
+        nrow (int): Number of rows of the board.
+        ncol (int): Number of columns of the board.
+        cells (list[SokobanVector]): Canonical cells indexed by `r * ncol + c`.
+        neighbours (dict[SokobanVector, dict]): For each unit direction,
+            a dict mapping each cell to its neighbour in that direction.
+        box_keys (dict[SokobanVector, int]): 64-bit Zobrist key of a box on
+            each cell.
+        player_keys (dict[SokobanVector, int]): 64-bit Zobrist key of the
+            player region normalised to each cell.
+    """
+
+    _cache = {}
+
+    def __init__(self, nrow, ncol):
+        """Initialize a pool for an `nrow` x `ncol` board.
+
+        Args:
+            nrow (int): Number of rows of the board.
+            ncol (int): Number of columns of the board.
+        """
+        self.nrow = nrow
+        self.ncol = ncol
+        self.cells = [SokobanVector(r, c) for r in range(nrow) for c in range(ncol)]
+        self.neighbours = {
+            direction: {
+                cell: self.cell(cell.r + direction.r, cell.c + direction.c)
+                for cell in self.cells
+            }
+            for direction in (Sokoban.RIGHT, Sokoban.DOWN, Sokoban.LEFT, Sokoban.UP)
+        }
+        self.box_keys = {cell: _splitmix64(2 * i) for i, cell in enumerate(self.cells)}
+        self.player_keys = {
+            cell: _splitmix64(2 * i + 1) for i, cell in enumerate(self.cells)
+        }
+
+    @classmethod
+    def get(cls, nrow, ncol):
+        """Return the shared pool for a board size, creating it if needed.
+
+        Args:
+            nrow (int): Number of rows of the board.
+            ncol (int): Number of columns of the board.
+
+        Returns:
+            SokobanVectorPool: The pool shared by all boards of this size.
+        """
+        pool = cls._cache.get((nrow, ncol))
+        if pool is None:
+            pool = cls._cache[(nrow, ncol)] = cls(nrow, ncol)
+        return pool
+
+    def cell(self, r, c):
+        """Return the canonical vector of a cell.
+
+        Args:
+            r (int): Row index.
+            c (int): Column index.
+
+        Returns:
+            SokobanVector | None: The canonical vector, or None if off the board.
+        """
+        if (0 <= r < self.nrow) and (0 <= c < self.ncol):
+            return self.cells[r * self.ncol + c]
+        return None
+
+
+class SokobanHistory:
+    """Packed undo history, one byte per move.
+
+    Each byte holds a direction code (the index of the direction in
+    `Sokoban.DIRECTIONS`) in its low two bits and the `PUSH` or `PULL` flag
+    above them.
+    With a `maxlen`, the oldest moves are dropped as new ones are appended,
+    like a bounded `deque`.
+
+    Attributes:
+        maxlen (int | None): Maximum number of moves kept; None for unlimited.
+    """
+
+    DIRECTION_MASK = 3
+    PUSH = 4
+    PULL = 8
+
+    def __init__(self, codes=(), maxlen=None):
+        """Initialize a SokobanHistory instance.
+
+        Args:
+            codes (Iterable[int]): Initial move codes, oldest first.
+            maxlen (int | None): Maximum number of moves kept; None for unlimited.
+        """
+        self.maxlen = maxlen
+        self._data = bytearray()
+        self._start = 0
+        for code in codes:
+            self.append(code)
+
+    def __repr__(self):
+        """Return a human-readable string representation.
+
+        Returns:
+            str: String with the move codes and `maxlen`.
+        """
+        return f"{self.__class__.__name__}({list(self)}, maxlen={self.maxlen})"
+
+    def __len__(self):
+        """Return the number of moves kept."""
+        return len(self._data) - self._start
+
+    def __iter__(self):
+        """Iterate over the move codes, oldest first."""
+        return iter(self._data[self._start :])
+
+    def __getitem__(self, index):
+        """Return the move code at `index`, counting from the oldest move."""
+        return self._data[self._start :][index]
+
+    def append(self, code):
+        """Add a move code, dropping the oldest one if `maxlen` is reached.
+
+        Args:
+            code (int): Move code.
+        """
+        if self.maxlen is not None:
+            if self.maxlen <= 0:
+                return
+            if len(self) >= self.maxlen:
+                self._start += 1
+                # Drop the stale prefix once it is as large as the live part.
+                if self._start >= self.maxlen:
+                    del self._data[: self._start]
+                    self._start = 0
+        self._data.append(code)
+
+    def pop(self):
+        """Remove and return the most recent move code.
+
+        Returns:
+            int: Move code.
+
+        Raises:
+            IndexError: If the history is empty.
+        """
+        if not len(self):
+            raise IndexError("pop from an empty history")
+        return self._data.pop()
+
+    def clear(self):
+        """Remove all move codes."""
+        self._data = bytearray()
+        self._start = 0
+
+    def copy(self):
+        """Return a copy of the history.
+
+        Returns:
+            SokobanHistory: New history with the same move codes and `maxlen`.
+        """
+        history = self.__class__(maxlen=self.maxlen)
+        history._data = self._data[self._start :]
+        return history
+
+
+class LevelTemplate:
+    """Parsed, immutable initial layout of a level.
+
+    Games started from the same template share its walls, goals and dead
+    squares, so starting a game only copies the boxes. Templates parsed from
+    level strings are kept in a bounded least-recently-used cache keyed by the
+    level string; see `get`.
+
+    Attributes:
+        nrow (int): Number of rows in the level.
+        ncol (int): Number of columns in the level.
+        walls (frozenset[SokobanVector]): Positions of walls.
+        goals (frozenset[SokobanVector]): Positions of goals.
+        boxes (frozenset[SokobanVector]): Initial positions of boxes.
+        player (SokobanVector | None): Initial player position.
+        dead_squares (frozenset[SokobanVector]): Positions from which a box can
+            never reach a goal.
+        box_hash (int): XOR of the Zobrist keys of the initial boxes.
+        cache_size (int): Maximum number of templates kept by `get`.
+    """
+
+    __slots__ = (
+        "nrow",
+        "ncol",
+        "walls",
+        "goals",
+        "boxes",
+        "player",
+        "dead_squares",
+        "box_hash",
+        "_derived",
+    )
+
+    cache_size = 256
+    _cache = OrderedDict()
+
+    def __init__(self, grid):
+        """Initialize a LevelTemplate from a 2D list of characters.
+
+        Args:
+            grid (list[list[str]]): 2D array of Sokoban symbols.
+        """
+        nrow = len(grid)
+        ncol = max(len(row) for row in grid)
+        pool = SokobanVectorPool.get(nrow, ncol)
+        walls = set()
+        goals = set()
+        boxes = set()
+        player = None
+
+        for r, row in enumerate(grid):
+            for c, char in enumerate(row):
+                pos = pool.cells[r * ncol + c]
+                if char == Sokoban.WALL:
+                    walls.add(pos)
+                elif char == Sokoban.GOAL:
+                    goals.add(pos)
+                elif char == Sokoban.BOX:
+                    boxes.add(pos)
+                elif char == Sokoban.BOX_IN_GOAL:
+                    goals.add(pos)
+                    boxes.add(pos)
+                elif char == Sokoban.PLAYER:
+                    player = pos
+                elif char == Sokoban.PLAYER_IN_GOAL:
+                    goals.add(pos)
+                    player = pos
+
+        box_hash = 0
+        for box in boxes:
+            box_hash ^= pool.box_keys[box]
+
+        init = object.__setattr__
+        init(self, "nrow", nrow)
+        init(self, "ncol", ncol)
+        init(self, "walls", frozenset(walls))
+        init(self, "goals", frozenset(goals))
+        init(self, "boxes", frozenset(boxes))
+        init(self, "player", player)
+        init(
+            self,
+            "dead_squares",
+            frozenset(Sokoban._find_dead_squares(pool, walls, goals)),
+        )
+        init(self, "box_hash", box_hash)
+        # Engine-specific data derived from the template, such as a flat board.
+        init(self, "_derived", {})
+
+    def __setattr__(self, name, value):
+        """Refuse to change a template."""
+        raise AttributeError(f"{self.__class__.__name__} is immutable")
+
+    def __repr__(self):
+        """Return a short string representation.
+
+        Returns:
+            str: String with the level size and number of boxes.
+        """
+        return (
+            f"{self.__class__.__name__}(nrow={self.nrow}, ncol={self.ncol}, "
+            + f"nbox={len(self.boxes)})"
+        )
+
+    @classmethod
+    def from_string(cls, level_string):
+        """Parse a level string into a new template, bypassing the cache.
+
+        Indentation and lines containing non-Sokoban characters are dropped.
+
+        Args:
+            level_string (str): Multi-line string containing Sokoban characters.
+
+        Returns:
+            LevelTemplate: The new template.
+        """
+        # Remove space on the right and non-sokoban lines.
+        grid = [
+            [char for char in line.rstrip()]
+            for line in level_string.split("\n")
+            if all(char in Sokoban.CHAR_SET for char in line.rstrip())
+        ]
+        # Remove empty rows.
+        grid = [row for row in grid if "".join(row).rstrip()]
+        # Number of indent
+        num_indent = min(len(row) - len("".join(row).lstrip()) for row in grid)
+        # # Dedent
+        grid = [row[num_indent:] for row in grid]
+        return cls(grid)
+
+    @classmethod
+    def get(cls, level_string):
+        """Return the cached template of a level string, parsing it if needed.
+
+        Args:
+            level_string (str): Multi-line string containing Sokoban characters.
+
+        Returns:
+            LevelTemplate: The shared template.
+        """
+        cache = cls._cache
+        template = cache.pop(level_string, None)
+        if template is None:
+            template = cls.from_string(level_string)
+        if cls.cache_size > 0:
+            while len(cache) >= cls.cache_size:
+                del cache[next(iter(cache))]
+            # Re-inserting moves the entry to the most recently used end.
+            cache[level_string] = template
+        return template
+
+    @classmethod
+    def clear_cache(cls):
+        """Drop all cached templates."""
+        cls._cache.clear()
+
+
+class SokobanStats:
+    """Counters and timings collected by a game with stats enabled.
+
+    Created by `Sokoban.enable_stats`, which wraps the instrumented methods of
+    one game; games without stats run the plain methods. Times are in seconds,
+    and the time of `find_path` includes the breadth-first search it runs.
+
+    The hook, if any, is called after every instrumented call as
+    `hook(event, argument, result, elapsed)`, where `event` is one of `EVENTS`.
+
+    Attributes:
+        nmove (int): Number of moves made by `move` and `apply_moves`.
+        npush (int): Number of those moves that pushed a box.
+        nrejected (int): Number of illegal moves refused.
+        nundo (int): Number of moves undone.
+        nfind_path (int): Number of `find_path` calls.
+        nbfs (int): Number of breadth-first searches of the player's region.
+        nbfs_node (int): Number of cells expanded by those searches.
+        time (dict[str, float]): Time spent in each event.
+        hook (Callable | None): Tracing callback.
+    """
+
+    EVENTS = ("move", "apply_moves", "undo", "find_path", "bfs")
+    COUNTERS = (
+        "nmove",
+        "npush",
+        "nrejected",
+        "nundo",
+        "nfind_path",
+        "nbfs",
+        "nbfs_node",
+    )
+
+    def __init__(self, hook=None):
+        """Initialize a SokobanStats instance with zero counts.
+
+        Args:
+            hook (Callable | None): Tracing callback.
+        """
+        self.hook = hook
+        self.reset()
+
+    def __repr__(self):
+        """Return the counters as a string.
+
+        Returns:
+            str: String with every counter.
+        """
+        counters = ", ".join(f"{name}={getattr(self, name)}" for name in self.COUNTERS)
+        return f"{self.__class__.__name__}({counters})"
+
+    def reset(self):
+        """Set all counters and times to zero."""
+        for name in self.COUNTERS:
+            setattr(self, name, 0)
+        self.time = {event: 0.0 for event in self.EVENTS}
+
+    def as_dict(self):
+        """Export the counters and times.
+
+        Returns:
+            dict[str, int | float]: Every counter, and the time of each event
+                under `time_<event>`.
+        """
+        result = {name: getattr(self, name) for name in self.COUNTERS}
+        for event, elapsed in self.time.items():
+            result["time_" + event] = elapsed
+        return result
+
+
+def _instrument(game, stats):
+    """Return wrappers of a game's methods that record into `stats`."""
+    import time
+
+    clock = getattr(time, "perf_counter", time.time)
+    move = game.move
+    apply_moves = game.apply_moves
+    undo = game.undo
+    find_path = game.find_path
+    reachability = game._reachability
+    times = stats.time
+
+    def record(event, argument, result, elapsed):
+        times[event] += elapsed
+        if stats.hook is not None:
+            stats.hook(event, argument, result, elapsed)
+
+    def timed_move(direction):
+        npush = game.npush
+        start = clock()
+        result = move(direction)
+        elapsed = clock() - start
+        if result:
+            stats.nmove += 1
+            stats.npush += game.npush - npush
+        else:
+            stats.nrejected += 1
+        record("move", direction, result, elapsed)
+        return result
+
+    def timed_apply_moves(moves, strict=False):
+        npush = game.npush
+        start = clock()
+        result = apply_moves(moves, strict)
+        elapsed = clock() - start
+        stats.nmove += result
+        stats.npush += game.npush - npush
+        if result < len(moves):
+            stats.nrejected += 1
+        record("apply_moves", moves, result, elapsed)
+        return result
+
+    def timed_undo():
+        start = clock()
+        result = undo()
+        elapsed = clock() - start
+        stats.nundo += result
+        record("undo", None, result, elapsed)
+        return result
+
+    def timed_find_path(target_pos):
+        start = clock()
+        result = find_path(target_pos)
+        elapsed = clock() - start
+        stats.nfind_path += 1
+        record("find_path", target_pos, result, elapsed)
+        return result
+
+    def timed_reachability(rooted=False):
+        cached = game._reach
+        start = clock()
+        result = reachability(rooted)
+        elapsed = clock() - start
+        # A new map means a search ran, which expanded every cell it holds.
+        if result is not cached:
+            stats.nbfs += 1
+            stats.nbfs_node += len(result)
+            record("bfs", rooted, len(result), elapsed)
+        return result
+
+    return {
+        "move": timed_move,
+        "apply_moves": timed_apply_moves,
+        "undo": timed_undo,
+        "find_path": timed_find_path,
+        "_reachability": timed_reachability,
+    }
 
 
 class Sokoban:
@@ -129,15 +622,21 @@ class Sokoban:
 
     Attributes:
         player (SokobanVector): Current player position.
-        walls (set[SokobanVector]): Positions of walls.
-        goals (set[SokobanVector]): Positions of goals.
+        walls (frozenset[SokobanVector]): Positions of walls, shared with the
+            level's `LevelTemplate`.
+        goals (frozenset[SokobanVector]): Positions of goals, shared likewise.
         boxes (set[SokobanVector]): Positions of boxes.
+        dead_squares (frozenset[SokobanVector]): Positions from which a box can
+            never reach a goal, computed once per level template.
         nrow (int): Number of rows in the level.
         ncol (int): Number of columns in the level.
         nmove (int): Number of moves made.
-        npush (int): Number of box pushes made.
-        history (deque): Move history for undo.
+        npush (int): Number of box pushes made, counting pulls.
+        history (SokobanHistory): Packed move history for undo.
         undo_limit (int | None): Maximum undo history size.
+        state_hash (int): 64-bit Zobrist hash of the boxes and the player region.
+        stats (SokobanStats | None): Counters and timings, or None unless
+            enabled with `enable_stats`.
     """
 
     SPACE = " "
@@ -154,6 +653,12 @@ class Sokoban:
     LEFT = -RIGHT
     UP = -DOWN
     DIRECTION_SET = {RIGHT, DOWN, LEFT, UP}
+    DIRECTIONS = (RIGHT, DOWN, LEFT, UP)
+    _DIRECTION_CODES = {direction: code for code, direction in enumerate(DIRECTIONS)}
+    LURD = {"l": LEFT, "u": UP, "r": RIGHT, "d": DOWN}
+
+    stats = None
+    _INSTRUMENTED = ("move", "apply_moves", "undo", "find_path", "_reachability")
 
     def __init__(self, level_string=DEFAULT_LEVEL_STRING, undo_limit=None):
         """Initialize Sokoban from a level string.
@@ -165,74 +670,197 @@ class Sokoban:
             undo_limit (int | None): Maximum number of moves to store for undo; None for unlimited.
         """
         self.undo_limit = undo_limit
-        self._from_string(level_string)
+        self._from_template(LevelTemplate.get(level_string))
+
+    @classmethod
+    def from_template(cls, template, undo_limit=None):
+        """Create a game from a parsed level template.
+
+        The game shares the template's walls, goals and dead squares.
+
+        Args:
+            template (LevelTemplate): Initial layout of the level.
+            undo_limit (int | None): Maximum number of moves to store for undo; None for unlimited.
+
+        Returns:
+            Sokoban: The new game.
+        """
+        game = cls.__new__(cls)
+        game.undo_limit = undo_limit
+        game._from_template(template)
+        return game
+
+    @classmethod
+    def from_grid(cls, grid, undo_limit=None):
+        """Create a game from a 2D list of characters, skipping string parsing.
+
+        Args:
+            grid (list[list[str]]): 2D array of Sokoban symbols, one row per
+                board row, with no indentation to remove.
+            undo_limit (int | None): Maximum number of moves to store for undo; None for unlimited.
+
+        Returns:
+            Sokoban: The new game.
+        """
+        return cls.from_template(LevelTemplate(grid), undo_limit)
 
     def __str__(self):
-        """Return a string representation of the current board."""
-        grid = self.to_grid()
-        return "\n".join(["".join(line) for line in grid])
+        """Return a string representation of the current board.
+
+        Rows that did not change since the last call are reused as they are.
+        """
+        self._render()
+        return "\n".join(self._rows)
+
+    def _render(self):
+        """Bring the render buffer up to date.
+
+        The buffer is painted in full on first use. After that, `move` and
+        `undo` record the cells they change in `_dirty`, and only those cells
+        and their row strings are repainted.
+        """
+        if self._grid is None:
+            self._grid = self._paint_grid()
+            self._rows = ["".join(row) for row in self._grid]
+        elif self._dirty:
+            dirty_rows = set()
+            for pos in self._dirty:
+                self._grid[pos.r][pos.c] = self._paint_cell(pos)
+                dirty_rows.add(pos.r)
+            for r in dirty_rows:
+                self._rows[r] = "".join(self._grid[r])
+        self._dirty.clear()
 
     def _reset(self):
         """Clear all board elements and undo history."""
+        self._grid = None
+        self._rows = []
+        self._dirty = set()
+        self._neighbours = {}
+        self._box_keys = {}
+        self._player_keys = {}
+        self._box_hash = 0
+        self._region_key = None
+        self._reach = None
+        self._reach_root = None
         self.player = None
         self.walls = set()
         self.goals = set()
         self.boxes = set()
+        self.dead_squares = set()
         self.nrow = 0
         self.ncol = 0
         self.nmove = 0
         self.npush = 0
-        self.history = deque((), self.undo_limit)
+        self.history = SokobanHistory((), self.undo_limit)
 
-    def _from_grid(self, grid):
-        """Load board state from a 2D list of characters.
+    def _from_template(self, template):
+        """Load the initial board state of a level template.
 
         Args:
-            grid (list[list[str]]): 2D array of Sokoban symbols.
+            template (LevelTemplate): Initial layout of the level.
         """
         self._reset()
 
-        for r, row in enumerate(grid):
-            for c, char in enumerate(row):
-                pos = SokobanVector(r, c)
-                if char == self.WALL:
-                    self.walls.add(pos)
-                elif char == self.GOAL:
-                    self.goals.add(pos)
-                elif char == self.BOX:
-                    self.boxes.add(pos)
-                elif char == self.BOX_IN_GOAL:
-                    self.goals.add(pos)
-                    self.boxes.add(pos)
-                elif char == self.PLAYER:
-                    self.player = pos
-                elif char == self.PLAYER_IN_GOAL:
-                    self.goals.add(pos)
-                    self.player = pos
-
-        self.nrow = len(grid)
-        self.ncol = max(len(row) for row in grid)
-
-    def _from_string(self, level_string):
-        """Parse and load a level from a Sokoban level string.
+        self.nrow = template.nrow
+        self.ncol = template.ncol
+        pool = SokobanVectorPool.get(self.nrow, self.ncol)
+        self._neighbours = pool.neighbours
+        self._box_keys = pool.box_keys
+        self._player_keys = pool.player_keys
+
+        self.walls = template.walls
+        self.goals = template.goals
+        self.dead_squares = template.dead_squares
+        self.boxes = set(template.boxes)
+        self.player = template.player
+        self._box_hash = template.box_hash
+
+    @property
+    def state_hash(self):
+        """int: 64-bit Zobrist hash of the boxes and the player region.
+
+        Two states hash equal when they have the same boxes and the player can
+        walk from one player position to the other. The box part is updated
+        in O(1) by `move` and `undo`; the player region is normalised to its
+        first cell only after a push, and cached until the next one.
+        """
+        if self._region_key is None:
+            if self.player is None:
+                self._region_key = 0
+            else:
+                first = min(self._reachability(), key=lambda pos: (pos.r, pos.c))
+                self._region_key = self._player_keys[first]
+        return self._box_hash ^ self._region_key
+
+    def _reachability(self, rooted=False):
+        """Return the cells the player can walk to, with BFS parent pointers.
+
+        The map sends each reachable position to the position it is entered
+        from, and the player position to None. It is cached until the next
+        push, as walking never changes the region.
 
         Args:
-            level_string (str): Multi-line string containing Sokoban characters.
+            rooted (bool): Rebuild the map if the player has moved since, so
+                that parent pointers lead back to the current player position.
+
+        Returns:
+            dict[SokobanVector, SokobanVector | None]: The reachability map.
         """
-        # Remove space on the right and non-sokoban lines.
-        grid = [
-            [char for char in line.rstrip()]
-            for line in level_string.split("\n")
-            if all(char in self.CHAR_SET for char in line.rstrip())
-        ]
-        # Remove empty rows.
-        grid = [row for row in grid if "".join(row).rstrip()]
-        # Number of indent
-        num_indent = min(len(row) - len("".join(row).lstrip()) for row in grid)
-        # # Dedent
-        grid = [row[num_indent:] for row in grid]
-        # Initialize from the prepared grid
-        self._from_grid(grid)
+        if (self._reach is None) or (rooted and (self._reach_root != self.player)):
+            parents = {self.player: None}
+            queue = deque([self.player])
+
+            while queue:
+                curr_pos = queue.popleft()
+                for step in self._neighbours.values():
+                    new_pos = step[curr_pos]
+                    if (
+                        (new_pos is not None)
+                        and (new_pos not in parents)
+                        and (new_pos not in self.walls)
+                        and (new_pos not in self.boxes)
+                    ):
+                        parents[new_pos] = curr_pos
+                        queue.append(new_pos)
+
+            self._reach = parents
+            self._reach_root = self.player
+
+        return self._reach
+
+    @staticmethod
+    def _find_dead_squares(pool, walls, goals):
+        """Find the floor cells from which a box can never reach a goal.
+
+        Pulls a box backwards from every goal in one sweep; every floor cell the
+        box can be pulled to is live, and all others are dead.
+
+        Args:
+            pool (SokobanVectorPool): Cell pool of the board.
+            walls (set[SokobanVector]): Positions of walls.
+            goals (set[SokobanVector]): Positions of goals.
+
+        Returns:
+            set[SokobanVector]: Positions of dead squares.
+        """
+        live = set(goals)
+        queue = deque(goals)
+
+        while queue:
+            box = queue.popleft()
+            for step in pool.neighbours.values():
+                new_box = step[box]
+                if (new_box is None) or (new_box in walls) or (new_box in live):
+                    continue
+                new_player = step[new_box]
+                if (new_player is not None) and (new_player not in walls):
+                    live.add(new_box)
+                    queue.append(new_box)
+
+        return {
+            cell for cell in pool.cells if (cell not in walls) and (cell not in live)
+        }
 
     def to_grid(self):
         """Render the current game state as a 2D grid of characters.
@@ -240,6 +868,11 @@ class Sokoban:
         Returns:
             list[list[str]]: 2D array representing the board layout.
         """
+        self._render()
+        return [row[:] for row in self._grid]
+
+    def _paint_grid(self):
+        """Paint every cell of the board into a new grid."""
         grid = [[self.SPACE for c in range(self.ncol)] for r in range(self.nrow)]
 
         for wall in self.walls:
@@ -262,6 +895,19 @@ class Sokoban:
 
         return grid
 
+    def _paint_cell(self, position):
+        """Return the character of a single cell."""
+        if position == self.player:
+            return self.PLAYER_IN_GOAL if position in self.goals else self.PLAYER
+        elif position in self.boxes:
+            return self.BOX_IN_GOAL if position in self.goals else self.BOX
+        elif position in self.walls:
+            return self.WALL
+        elif position in self.goals:
+            return self.GOAL
+        else:
+            return self.SPACE
+
     def covers(self, position):
         """Check if a position is within board bounds.
 
@@ -277,24 +923,24 @@ class Sokoban:
         """Return whether the player can move in the given direction.
 
         Args:
-            direction (SokobanVector): Direction vector.
+            direction (SokobanVector): One of the four unit directions.
 
         Returns:
             bool: True if move is legal; False otherwise.
         """
-        if self.player is None:
+        step = self._neighbours.get(direction)
+        if (self.player is None) or (step is None):
             return False
 
-        new_player = self.player + direction
-        new_box = new_player + direction
+        new_player = step.get(self.player)
 
-        if (new_player in self.walls) or (not self.covers(new_player)):
+        if (new_player is None) or (new_player in self.walls):
             return False
         elif new_player in self.boxes:
-            if (new_box in (self.boxes | self.walls)) or (not self.covers(new_box)):
-                return False
-            else:
-                return True
+            new_box = step[new_player]
+            return not (
+                (new_box is None) or (new_box in self.walls) or (new_box in self.boxes)
+            )
         else:
             return True
 
@@ -302,7 +948,7 @@ class Sokoban:
         """Move the player in a direction, pushing a box if necessary.
 
         Args:
-            direction (SokobanVector): Direction vector.
+            direction (SokobanVector): One of the four unit directions.
 
         Returns:
             bool: True if move executed; False if illegal.
@@ -310,18 +956,27 @@ class Sokoban:
         if not self.can_move(direction):
             return False
 
+        step = self._neighbours[direction]
+        code = self._DIRECTION_CODES[direction]
         old_player = self.player
-        self.player = self.player + direction
+        self.player = step[self.player]
         self.nmove += 1
 
         if self.player in self.boxes:
             self.boxes.discard(self.player)
-            new_box = self.player + direction
+            new_box = step[self.player]
             self.boxes.add(new_box)
+            self._box_hash ^= self._box_keys[self.player] ^ self._box_keys[new_box]
+            self._region_key = None
+            self._reach = None
             self.npush += 1
-            self.history.append((old_player, self.player, new_box))
+            self.history.append(code | SokobanHistory.PUSH)
+            if self._grid is not None:
+                self._dirty.update((old_player, self.player, new_box))
         else:
-            self.history.append((old_player, self.player, None))
+            self.history.append(code)
+            if self._grid is not None:
+                self._dirty.update((old_player, self.player))
 
         return True
 
@@ -334,61 +989,1314 @@ class Sokoban:
         if not self.history:
             return False
 
-        old_player, new_player, new_box = self.history.pop()
+        code = self.history.pop()
+        direction = self.DIRECTIONS[code & SokobanHistory.DIRECTION_MASK]
+        new_player = self.player
+        old_player = self._neighbours[-direction][new_player]
         self.player = old_player
         self.nmove -= 1
+        if self._grid is not None:
+            self._dirty.update((old_player, new_player))
 
-        if new_box:
+        if code & SokobanHistory.PUSH:
+            new_box = self._neighbours[direction][new_player]
             self.boxes.discard(new_box)
             self.boxes.add(new_player)
+            self._box_hash ^= self._box_keys[new_box] ^ self._box_keys[new_player]
+            self._region_key = None
+            self._reach = None
             self.npush -= 1
+            if self._grid is not None:
+                self._dirty.add(new_box)
+        elif code & SokobanHistory.PULL:
+            box = self._neighbours[-direction][old_player]
+            self.boxes.discard(old_player)
+            self.boxes.add(box)
+            self._box_hash ^= self._box_keys[old_player] ^ self._box_keys[box]
+            self._region_key = None
+            self._reach = None
+            self.npush -= 1
+            if self._grid is not None:
+                self._dirty.add(box)
 
         return True
 
-    def is_solved(self):
-        """Check if all boxes are on goal positions.
+    def pull(self, direction):
+        """Move the player in a direction, pulling the box behind it along.
+
+        The box on the cell opposite to `direction`, if any, follows the
+        player onto the cell it leaves. Pulls are pushes played backwards, for
+        searching from a solved board towards the start; they count in
+        `npush` and are undone by `undo`.
+
+        Args:
+            direction (SokobanVector): One of the four unit directions.
 
         Returns:
-            bool: True if the puzzle is solved; False otherwise.
+            bool: True if move executed; False if illegal.
         """
-        return self.goals == self.boxes
+        step = self._neighbours.get(direction)
+        if (self.player is None) or (step is None):
+            return False
 
-    def find_path(self, target_pos):
-        """Find a path of empty spaces from the player to target using BFS.
+        old_player = self.player
+        new_player = step.get(old_player)
+        if (
+            (new_player is None)
+            or (new_player in self.walls)
+            or (new_player in self.boxes)
+        ):
+            return False
+
+        code = self._DIRECTION_CODES[direction]
+        box = self._neighbours[-direction].get(old_player)
+        self.player = new_player
+        self.nmove += 1
+
+        if box in self.boxes:
+            self.boxes.discard(box)
+            self.boxes.add(old_player)
+            self._box_hash ^= self._box_keys[box] ^ self._box_keys[old_player]
+            self._region_key = None
+            self._reach = None
+            self.npush += 1
+            self.history.append(code | SokobanHistory.PULL)
+            if self._grid is not None:
+                self._dirty.update((box, old_player, new_player))
+        else:
+            self.history.append(code)
+            if self._grid is not None:
+                self._dirty.update((old_player, new_player))
+
+        return True
+
+    def apply_moves(self, moves, strict=False):
+        """Execute a sequence of moves in LURD notation.
+
+        Letters `l`, `u`, `r` and `d` move the player left, up, right and down.
+        Pushes are written in upper case. Unless `strict`, case is ignored, as
+        pushes follow from the board. The whole sequence runs in one loop
+        without the per-call overhead of `move`, and stops at the first
+        illegal move.
 
         Args:
-            target_pos (SokobanVector): Destination position.
+            moves (str): Moves in LURD notation.
+            strict (bool): Also treat a move as illegal if its case does not
+                match whether it pushes a box, to verify recorded solutions.
 
         Returns:
-            list[SokobanVector] | None: Sequence of positions to move through, or None if unreachable.
+            int: Number of moves executed; equal to `len(moves)` unless the
+                move at that index is illegal.
+
+        Raises:
+            ValueError: If `moves` contains a character other than LURD letters.
         """
+        codes = self._encode(moves, strict)
         if self.player is None:
-            return None
+            return 0
+
+        # Codes of upper case moves carry the push flag when strict.
+        steps = [self._neighbours[direction] for direction in self.DIRECTIONS] * 2
+        walls = self.walls
+        boxes = self.boxes
+        box_keys = self._box_keys
+        append = self.history.append
+        dirty = None if self._grid is None else self._dirty
+        player = self.player
+        box_hash = self._box_hash
+        nmove = npush = 0
+
+        for code in codes:
+            step = steps[code]
+            new_player = step.get(player)
+            if (new_player is None) or (new_player in walls):
+                break
+            if new_player in boxes:
+                new_box = step[new_player]
+                if (new_box is None) or (new_box in walls) or (new_box in boxes):
+                    break
+                if strict and not code & SokobanHistory.PUSH:
+                    break
+                boxes.discard(new_player)
+                boxes.add(new_box)
+                box_hash ^= box_keys[new_player] ^ box_keys[new_box]
+                npush += 1
+                append(code | SokobanHistory.PUSH)
+                if dirty is not None:
+                    dirty.add(new_box)
+            elif code & SokobanHistory.PUSH:
+                break
+            else:
+                append(code)
+            if dirty is not None:
+                dirty.add(player)
+                dirty.add(new_player)
+            player = new_player
+            nmove += 1
+
+        self.player = player
+        self.nmove += nmove
+        if npush:
+            self.npush += npush
+            self._box_hash = box_hash
+            self._region_key = None
+            self._reach = None
+
+        return nmove
+
+    def _decode(self, moves):
+        """Return the directions of moves in LURD notation."""
+        try:
+            return [self.LURD[char] for char in moves.lower()]
+        except KeyError as error:
+            raise ValueError(f"invalid LURD move: {error.args[0]!r}") from None
+
+    def _encode(self, moves, strict=False):
+        """Return the history codes of moves in LURD notation.
+
+        With `strict`, the codes of upper case moves carry the push flag.
+        """
+        codes = [self._DIRECTION_CODES[direction] for direction in self._decode(moves)]
+        if strict:
+            codes = [
+                code | SokobanHistory.PUSH if char.isupper() else code
+                for code, char in zip(codes, moves)
+            ]
+        return codes
 
-        if not self.covers(target_pos):
-            return None
+    def to_lurd(self):
+        """Return the moves in the undo history in LURD notation.
 
-        grid = self.to_grid()
-        if grid[target_pos.r][target_pos.c] not in (self.SPACE, self.GOAL):
-            return None
+        Pushes are written in upper case. With an `undo_limit`, only the most
+        recent moves are kept in the history.
 
-        queue = deque([(self.player, [])], self.nrow + self.ncol)
-        visited = set()
+        Returns:
+            str: Moves in LURD notation.
 
-        while queue:
-            curr_pos, curr_path = queue.popleft()
-            if curr_pos == target_pos:
-                return curr_path
+        Raises:
+            ValueError: If the history holds a pull, which LURD cannot express.
+        """
+        if any(code & SokobanHistory.PULL for code in self.history):
+            raise ValueError("pulls have no LURD notation")
+        chars = {direction: char for char, direction in self.LURD.items()}
+        chars = [chars[direction] for direction in self.DIRECTIONS]
+        return "".join(
+            (
+                chars[code & SokobanHistory.DIRECTION_MASK].upper()
+                if code & SokobanHistory.PUSH
+                else chars[code & SokobanHistory.DIRECTION_MASK]
+            )
+            for code in self.history
+        )
 
-            for direction in self.DIRECTION_SET:
-                new_pos = curr_pos + direction
-                if (
-                    self.covers(new_pos)
-                    and (grid[new_pos.r][new_pos.c] in (self.SPACE, self.GOAL))
-                    and (new_pos not in visited)
-                ):
-                    new_path = curr_path + [new_pos]
-                    queue.append((new_pos, new_path))
-                    visited.add(new_pos)
+    def snapshot(self):
+        """Capture the current state, to be brought back with `restore`.
 
-        return None
+        Only the player, the boxes, the counters and the history are copied;
+        walls and goals never change.
+
+        Returns:
+            tuple: Opaque snapshot, valid for this game and its clones.
+        """
+        return (
+            self.player,
+            frozenset(self.boxes),
+            self.nmove,
+            self.npush,
+            self._box_hash,
+            self.history.copy(),
+        )
+
+    def restore(self, snapshot):
+        """Bring back a state captured by `snapshot`.
+
+        Args:
+            snapshot (tuple): Snapshot of this game or one of its clones.
+        """
+        player, boxes, nmove, npush, box_hash, history = snapshot
+
+        if self._grid is not None:
+            self._dirty.update(self.boxes.symmetric_difference(boxes))
+            self._dirty.update(pos for pos in (self.player, player) if pos is not None)
+
+        self.player = player
+        self.boxes = set(boxes)
+        self.nmove = nmove
+        self.npush = npush
+        self._box_hash = box_hash
+        self._region_key = None
+        self._reach = None
+        self.history = history.copy()
+
+    def clone(self, share_static=True):
+        """Return an independent copy of the game.
+
+        Args:
+            share_static (bool): Share the walls, goals and dead squares with
+                this game instead of copying them. They are never modified by
+                the game itself.
+
+        Returns:
+            Sokoban: A game in the same state, with its own boxes and history.
+        """
+        game = self.__class__.__new__(self.__class__)
+        game.__dict__.update(self.__dict__)
+        if self.stats is not None:
+            game.disable_stats()
+        game.boxes = set(self.boxes)
+        game.history = self.history.copy()
+        game._grid = None
+        game._rows = []
+        game._dirty = set()
+
+        if not share_static:
+            game.walls = set(self.walls)
+            game.goals = set(self.goals)
+            game.dead_squares = set(self.dead_squares)
+
+        return game
+
+    def enable_stats(self, hook=None):
+        """Start counting and timing moves, undos and path searches.
+
+        The counted methods are replaced on this game only by wrappers that
+        record into a new `SokobanStats`, so games without stats, including
+        clones of this one, pay nothing for it.
+
+        Args:
+            hook (Callable | None): Tracing callback; see `SokobanStats`.
+
+        Returns:
+            SokobanStats: The new stats, also available as `stats`.
+        """
+        self.disable_stats()
+        self.stats = SokobanStats(hook)
+        self.__dict__.update(_instrument(self, self.stats))
+        return self.stats
+
+    def disable_stats(self):
+        """Stop counting and restore the plain methods.
+
+        Returns:
+            SokobanStats | None: The stats collected so far, or None if they
+                were not enabled.
+        """
+        stats = self.stats
+        if stats is not None:
+            for name in self._INSTRUMENTED:
+                del self.__dict__[name]
+            del self.__dict__["stats"]
+        return stats
+
+    def is_solved(self):
+        """Check if all boxes are on goal positions.
+
+        Returns:
+            bool: True if the puzzle is solved; False otherwise.
+        """
+        return self.goals == self.boxes
+
+    def is_deadlocked(self, position=None):
+        """Check whether a box can no longer reach a goal.
+
+        Detects boxes on dead squares, freeze deadlocks and corral deadlocks.
+        A freeze deadlock is a set of boxes that can be pushed neither
+        horizontally nor vertically, held by walls or by other frozen boxes,
+        with at least one of them off a goal. A corral deadlock is a region
+        the player cannot reach, fenced in by boxes that can never be pushed,
+        with a goal inside or a fencing box off a goal; see
+        `_is_corral_deadlocked`.
+
+        Args:
+            position (SokobanVector | None): Only check the box at this position
+                and the corrals it fences, which is enough right after pushing
+                it; None to check all boxes.
+
+        Returns:
+            bool: True if the game is deadlocked; False otherwise.
+        """
+        boxes = self.boxes if position is None else {position} & self.boxes
+
+        for box in boxes:
+            if box in self.dead_squares:
+                return True
+            frozen = []
+            if self._is_frozen(box, set(), frozen):
+                if not self.goals.issuperset(frozen):
+                    return True
+
+        return self._is_corral_deadlocked(boxes)
+
+    def _is_frozen(self, box, checked, frozen):
+        """Check whether a box can be pushed along neither axis.
+
+        Boxes in `checked` are being examined further up the recursion and are
+        treated as walls. Boxes found frozen are appended to `frozen`.
+        """
+        mark = len(frozen)
+        checked.add(box)
+        result = self._is_blocked(
+            box, self.RIGHT, self.LEFT, checked, frozen
+        ) and self._is_blocked(box, self.DOWN, self.UP, checked, frozen)
+        checked.discard(box)
+
+        if result:
+            frozen.append(box)
+        else:
+            del frozen[mark:]
+        return result
+
+    def _is_blocked(self, box, direction_a, direction_b, checked, frozen):
+        """Check whether a box can be pushed along neither of two directions."""
+        side_a = self._neighbours[direction_a][box]
+        side_b = self._neighbours[direction_b][box]
+
+        for side in (side_a, side_b):
+            if (side is None) or (side in self.walls) or (side in checked):
+                return True
+        if (side_a in self.dead_squares) and (side_b in self.dead_squares):
+            return True
+        return any(
+            (side in self.boxes) and self._is_frozen(side, checked, frozen)
+            for side in (side_a, side_b)
+        )
+
+    def _is_corral_deadlocked(self, boxes):
+        """Check whether a box fences in a corral that can never be opened.
+
+        A corral is a region the player cannot reach, fenced in by walls and
+        boxes. It has to be opened if it holds a goal or one of its fencing
+        boxes is off a goal. It never can be if every push of every fencing
+        box needs the player inside the corral, on a wall or on another
+        fencing box, or sends the box onto a wall, another fencing box or a
+        dead square, as then none of the fencing boxes ever moves.
+
+        Only such fences that cannot move at all are found; a corral whose
+        boxes can be pushed but never far enough to open it is missed.
+
+        Args:
+            boxes (Iterable[SokobanVector]): Boxes whose corrals are checked.
+
+        Returns:
+            bool: True if some corral can never be opened.
+        """
+        if self.player is None:
+            return False
+
+        steps = [self._neighbours[direction] for direction in self.DIRECTIONS]
+        walls = self.walls
+        reach = self._reachability()
+        seen = set()
+
+        for box in boxes:
+            for step in steps:
+                cell = step[box]
+                if (
+                    (cell is None)
+                    or (cell in walls)
+                    or (cell in self.boxes)
+                    or (cell in reach)
+                    or (cell in seen)
+                ):
+                    continue
+
+                corral = {cell}
+                fence = set()
+                stack = [cell]
+                while stack:
+                    curr = stack.pop()
+                    for step_b in steps:
+                        new = step_b[curr]
+                        if (new is None) or (new in walls) or (new in corral):
+                            continue
+                        if new in self.boxes:
+                            fence.add(new)
+                        else:
+                            corral.add(new)
+                            stack.append(new)
+                seen.update(corral)
+
+                if corral.isdisjoint(self.goals) and self.goals.issuperset(fence):
+                    continue
+                if not any(
+                    self._can_open(fence_box, steps[d], steps[d - 2], corral, fence)
+                    for fence_box in fence
+                    for d in range(4)
+                ):
+                    return True
+
+        return False
+
+    def _can_open(self, box, step, back, corral, fence):
+        """Check whether a fencing box may someday be pushed along `step`."""
+        player = back[box]
+        target = step[box]
+        return not (
+            (player is None)
+            or (player in self.walls)
+            or (player in corral)
+            or (player in fence)
+            or (target is None)
+            or (target in self.walls)
+            or (target in fence)
+            or (target in self.dead_squares)
+        )
+
+    def solve(self, max_nodes=None, time_limit=None, jobs=1, optimize=None):
+        """Solve the level from the current state with `sokobanpy.solver`.
+
+        Args:
+            max_nodes (int | None): Maximum number of states to expand; None for unlimited.
+            time_limit (float | None): Maximum search time in seconds; None for unlimited.
+            jobs (int | None): Number of worker processes; None for one per CPU.
+            optimize (str | None): Metric to minimise: `"pushes"`, `"moves"` or
+                `"pushes_then_moves"`; None for any solution.
+
+        Returns:
+            list[SokobanVector] | None: Directions to replay through `move`, or None if no solution was found.
+        """
+        from .solver import solve
+
+        return solve(self, max_nodes, time_limit, jobs, optimize=optimize).moves
+
+    def reachable(self, position):
+        """Check whether the player can walk to a position without pushing.
+
+        Args:
+            position (SokobanVector): Position to check.
+
+        Returns:
+            bool: True if position is the player's or reachable; False otherwise.
+        """
+        if self.player is None:
+            return False
+
+        return position in self._reachability()
+
+    def find_path(self, target_pos):
+        """Find a shortest path of empty spaces from the player to target.
+
+        Uses the cached reachability map, so repeated queries from the same
+        player position cost only the length of the returned path.
+
+        Args:
+            target_pos (SokobanVector): Destination position.
+
+        Returns:
+            list[SokobanVector] | None: Sequence of positions to move through, or None if unreachable.
+        """
+        if (self.player is None) or (target_pos == self.player):
+            return None
+
+        parents = self._reachability(rooted=True)
+        if target_pos not in parents:
+            return None
+
+        path = []
+        curr_pos = target_pos
+        while curr_pos != self.player:
+            path.append(curr_pos)
+            curr_pos = parents[curr_pos]
+        path.reverse()
+
+        return path
+
+
+class CompactSokoban(Sokoban):
+    """Sokoban on a flat array board, for fast simulation.
+
+    Offers the same API as `Sokoban`, but stores the board as a flat `bytearray`
+    of cell flags instead of sets of `SokobanVector`. The board is padded with a
+    one-cell border of walls, so the cell at row `r` and column `c` lives at
+    index `(r + 1) * width + (c + 1)` with `width = ncol + 2`, and moves never
+    need bounds checks. Directions are turned into integer index offsets.
+
+    `player`, `walls`, `goals` and `boxes` are read-only views computed from the
+    flat board on access. Use `move`, `can_move` and `is_solved` in hot loops.
+
+    Attributes:
+        dead_squares (set[SokobanVector]): Positions from which a box can never
+            reach a goal, computed once when the level is loaded.
+        nrow (int): Number of rows in the level.
+        ncol (int): Number of columns in the level.
+        nmove (int): Number of moves made.
+        npush (int): Number of box pushes made.
+        history (SokobanHistory): Packed move history for undo.
+        undo_limit (int | None): Maximum undo history size.
+        state_hash (int): 64-bit Zobrist hash of the boxes and the player region.
+    """
+
+    _WALL_FLAG = 1
+    _GOAL_FLAG = 2
+    _BOX_FLAG = 4
+    _DEAD_FLAG = 8
+    _BLOCKED_FLAGS = _WALL_FLAG | _BOX_FLAG
+
+    _layouts = {}
+
+    @property
+    def player(self):
+        """SokobanVector | None: Current player position."""
+        if self._player < 0:
+            return None
+        return self._vector(self._player)
+
+    @property
+    def walls(self):
+        """set[SokobanVector]: Positions of walls."""
+        return self._positions(self._WALL_FLAG)
+
+    @property
+    def goals(self):
+        """set[SokobanVector]: Positions of goals."""
+        return self._positions(self._GOAL_FLAG)
+
+    @property
+    def boxes(self):
+        """set[SokobanVector]: Positions of boxes."""
+        return self._positions(self._BOX_FLAG)
+
+    def _index(self, position):
+        """Return the flat board index of an on-board position."""
+        return (position.r + 1) * self._width + position.c + 1
+
+    def _vector(self, index):
+        """Return the canonical position of a flat board index."""
+        r, c = divmod(index, self._width)
+        return self._cells[(r - 1) * self.ncol + c - 1]
+
+    def _positions(self, flag):
+        """Return the positions of all on-board cells having `flag` set."""
+        board = self._board
+        width = self._width
+        return {
+            cell
+            for cell in self._cells
+            if board[(cell.r + 1) * width + cell.c + 1] & flag
+        }
+
+    @classmethod
+    def _layout(cls, pool):
+        """Return the flat tables shared by all boards of the pool's size.
+
+        Args:
+            pool (SokobanVectorPool): Pool of the board size.
+
+        Returns:
+            tuple: Direction offsets, `(offset, code)` steps by direction, and
+                the box and player Zobrist keys by board index.
+        """
+        layout = cls._layouts.get((pool.nrow, pool.ncol))
+        if layout is None:
+            width = pool.ncol + 2
+            offsets = {
+                cls.RIGHT: 1,
+                cls.DOWN: width,
+                cls.LEFT: -1,
+                cls.UP: -width,
+            }
+            steps = {
+                direction: (offset, cls._DIRECTION_CODES[direction])
+                for direction, offset in offsets.items()
+            }
+            box_keys = [0] * (width * (pool.nrow + 2))
+            player_keys = [0] * (width * (pool.nrow + 2))
+            for cell in pool.cells:
+                index = (cell.r + 1) * width + cell.c + 1
+                box_keys[index] = pool.box_keys[cell]
+                player_keys[index] = pool.player_keys[cell]
+            layout = cls._layouts[(pool.nrow, pool.ncol)] = (
+                offsets,
+                steps,
+                box_keys,
+                player_keys,
+            )
+        return layout
+
+    def _reset(self):
+        """Clear all board elements and undo history."""
+        self._grid = None
+        self._rows = []
+        self._dirty = set()
+        self._board = bytearray()
+        self._cells = []
+        self._box_keys = []
+        self._player_keys = []
+        self._box_hash = 0
+        self._region_key = None
+        self._reach = None
+        self._reach_root = -1
+        self.dead_squares = set()
+        self._width = 0
+        self._player = -1
+        self._offsets = {}
+        self._steps = {}
+        self._ngoal = 0
+        self._nbox = 0
+        self._nbox_in_goal = 0
+        self.nrow = 0
+        self.ncol = 0
+        self.nmove = 0
+        self.npush = 0
+        self.history = SokobanHistory((), self.undo_limit)
+
+    def _from_template(self, template):
+        """Load the initial board state of a level template.
+
+        The flat board of a template is built once and copied by every game
+        started from it.
+
+        Args:
+            template (LevelTemplate): Initial layout of the level.
+        """
+        self._reset()
+
+        self.nrow = template.nrow
+        self.ncol = template.ncol
+        pool = SokobanVectorPool.get(self.nrow, self.ncol)
+        self._cells = pool.cells
+        self._width = self.ncol + 2
+        layout = self._layout(pool)
+        self._offsets, self._steps, self._box_keys, self._player_keys = layout
+        self.dead_squares = template.dead_squares
+
+        initial = template._derived.get(CompactSokoban)
+        if initial is None:
+            initial = template._derived[CompactSokoban] = self._build_board(template)
+        board, self._player, self._ngoal, self._nbox, self._nbox_in_goal = initial
+        self._board = bytearray(board)
+        self._box_hash = template.box_hash
+
+    def _build_board(self, template):
+        """Return the initial flat board of a template and its counts.
+
+        Args:
+            template (LevelTemplate): Initial layout of the level.
+
+        Returns:
+            tuple: The board bytes, the player index, and the numbers of
+                goals, boxes and boxes on goals.
+        """
+        width = self._width
+        board = bytearray(width * (self.nrow + 2))
+
+        # Pad the board with a border of walls.
+        for c in range(width):
+            board[c] = self._WALL_FLAG
+            board[-1 - c] = self._WALL_FLAG
+        for r in range(1, self.nrow + 1):
+            board[r * width] = self._WALL_FLAG
+            board[r * width + width - 1] = self._WALL_FLAG
+
+        for positions, flag in (
+            (template.walls, self._WALL_FLAG),
+            (template.goals, self._GOAL_FLAG),
+            (template.boxes, self._BOX_FLAG),
+            (template.dead_squares, self._DEAD_FLAG),
+        ):
+            for position in positions:
+                board[self._index(position)] |= flag
+
+        player = -1 if template.player is None else self._index(template.player)
+        nbox_in_goal = len(template.boxes & template.goals)
+        return (
+            bytes(board),
+            player,
+            len(template.goals),
+            len(template.boxes),
+            nbox_in_goal,
+        )
+
+    @property
+    def state_hash(self):
+        """int: 64-bit Zobrist hash of the boxes and the player region.
+
+        Equal to `Sokoban.state_hash` for the same state.
+        """
+        if self._region_key is None:
+            if self._player < 0:
+                self._region_key = 0
+            else:
+                self._region_key = self._player_keys[min(self._reachability())]
+        return self._box_hash ^ self._region_key
+
+    def _reachability(self, rooted=False):
+        """Return the board indices the player can walk to, with BFS parents.
+
+        See `Sokoban._reachability`; keys and values are board indices.
+        """
+        if (self._reach is None) or (rooted and (self._reach_root != self._player)):
+            board = self._board
+            blocked = self._WALL_FLAG | self._BOX_FLAG
+            offsets = tuple(self._offsets.values())
+            parents = {self._player: None}
+            queue = deque([self._player])
+
+            while queue:
+                curr = queue.popleft()
+                for offset in offsets:
+                    new = curr + offset
+                    if (not board[new] & blocked) and (new not in parents):
+                        parents[new] = curr
+                        queue.append(new)
+
+            self._reach = parents
+            self._reach_root = self._player
+
+        return self._reach
+
+    def _paint_grid(self):
+        """Paint every cell of the board into a new grid."""
+        chars = {
+            0: self.SPACE,
+            self._WALL_FLAG: self.WALL,
+            self._GOAL_FLAG: self.GOAL,
+            self._BOX_FLAG: self.BOX,
+            self._BOX_FLAG | self._GOAL_FLAG: self.BOX_IN_GOAL,
+        }
+        board = self._board
+        width = self._width
+        grid = [
+            [
+                chars[board[(r + 1) * width + c + 1] & ~self._DEAD_FLAG]
+                for c in range(self.ncol)
+            ]
+            for r in range(self.nrow)
+        ]
+
+        if self._player >= 0:
+            player = self._vector(self._player)
+            if board[self._player] & self._GOAL_FLAG:
+                grid[player.r][player.c] = self.PLAYER_IN_GOAL
+            else:
+                grid[player.r][player.c] = self.PLAYER
+
+        return grid
+
+    def _paint_cell(self, position):
+        """Return the character of a single cell."""
+        index = self._index(position)
+        flags = self._board[index]
+        if index == self._player:
+            if flags & self._GOAL_FLAG:
+                return self.PLAYER_IN_GOAL
+            return self.PLAYER
+        elif flags & self._BOX_FLAG:
+            if flags & self._GOAL_FLAG:
+                return self.BOX_IN_GOAL
+            return self.BOX
+        elif flags & self._WALL_FLAG:
+            return self.WALL
+        elif flags & self._GOAL_FLAG:
+            return self.GOAL
+        else:
+            return self.SPACE
+
+    def can_move(self, direction):
+        """Return whether the player can move in the given direction.
+
+        Args:
+            direction (SokobanVector): One of the four unit directions.
+
+        Returns:
+            bool: True if move is legal; False otherwise.
+        """
+        offset = self._offsets.get(direction)
+        if (offset is None) or (self._player < 0):
+            return False
+
+        board = self._board
+        new_player = self._player + offset
+        if board[new_player] & self._WALL_FLAG:
+            return False
+        elif board[new_player] & self._BOX_FLAG:
+            return not board[new_player + offset] & (self._WALL_FLAG | self._BOX_FLAG)
+        else:
+            return True
+
+    def move(self, direction):
+        """Move the player in a direction, pushing a box if necessary.
+
+        Args:
+            direction (SokobanVector): One of the four unit directions.
+
+        Returns:
+            bool: True if move executed; False if illegal.
+        """
+        step = self._steps.get(direction)
+        player = self._player
+        if (step is None) or (player < 0):
+            return False
+
+        board = self._board
+        offset, code = step
+        new_player = player + offset
+        cell = board[new_player]
+        if cell & self._WALL_FLAG:
+            return False
+
+        if cell & self._BOX_FLAG:
+            new_box = new_player + offset
+            if board[new_box] & self._BLOCKED_FLAGS:
+                return False
+            board[new_player] = cell & ~self._BOX_FLAG
+            board[new_box] |= self._BOX_FLAG
+            self._box_hash ^= self._box_keys[new_player] ^ self._box_keys[new_box]
+            self._region_key = None
+            self._reach = None
+            if board[new_box] & self._GOAL_FLAG:
+                self._nbox_in_goal += 1
+            if cell & self._GOAL_FLAG:
+                self._nbox_in_goal -= 1
+            self.npush += 1
+            self.history.append(code | SokobanHistory.PUSH)
+            if self._grid is not None:
+                self._dirty.add(self._vector(new_box))
+        else:
+            self.history.append(code)
+
+        self._player = new_player
+        self.nmove += 1
+        if self._grid is not None:
+            self._dirty.add(self._vector(player))
+            self._dirty.add(self._vector(new_player))
+
+        return True
+
+    def undo(self):
+        """Undo the last move, restoring previous positions.
+
+        Returns:
+            bool: True if an undo was performed; False if no history.
+        """
+        if not self.history:
+            return False
+
+        board = self._board
+        code = self.history.pop()
+        offset = self._offsets[self.DIRECTIONS[code & SokobanHistory.DIRECTION_MASK]]
+
+        if code & SokobanHistory.PUSH:
+            new_box = self._player + offset
+            board[new_box] &= ~self._BOX_FLAG
+            board[self._player] |= self._BOX_FLAG
+            self._box_hash ^= self._box_keys[new_box] ^ self._box_keys[self._player]
+            self._region_key = None
+            self._reach = None
+            if board[new_box] & self._GOAL_FLAG:
+                self._nbox_in_goal -= 1
+            if board[self._player] & self._GOAL_FLAG:
+                self._nbox_in_goal += 1
+            self.npush -= 1
+            if self._grid is not None:
+                self._dirty.add(self._vector(new_box))
+        elif code & SokobanHistory.PULL:
+            new_box = self._player - offset
+            box = new_box - offset
+            board[new_box] &= ~self._BOX_FLAG
+            board[box] |= self._BOX_FLAG
+            self._box_hash ^= self._box_keys[new_box] ^ self._box_keys[box]
+            self._region_key = None
+            self._reach = None
+            if board[new_box] & self._GOAL_FLAG:
+                self._nbox_in_goal -= 1
+            if board[box] & self._GOAL_FLAG:
+                self._nbox_in_goal += 1
+            self.npush -= 1
+            if self._grid is not None:
+                self._dirty.add(self._vector(box))
+
+        if self._grid is not None:
+            self._dirty.add(self._vector(self._player))
+            self._dirty.add(self._vector(self._player - offset))
+
+        self._player -= offset
+        self.nmove -= 1
+
+        return True
+
+    def pull(self, direction):
+        """Move the player in a direction, pulling the box behind it along.
+
+        See `Sokoban.pull`.
+
+        Args:
+            direction (SokobanVector): One of the four unit directions.
+
+        Returns:
+            bool: True if move executed; False if illegal.
+        """
+        step = self._steps.get(direction)
+        player = self._player
+        if (step is None) or (player < 0):
+            return False
+
+        board = self._board
+        offset, code = step
+        new_player = player + offset
+        if board[new_player] & self._BLOCKED_FLAGS:
+            return False
+
+        box = player - offset
+        cell = board[box]
+        if cell & self._BOX_FLAG:
+            board[box] = cell & ~self._BOX_FLAG
+            board[player] |= self._BOX_FLAG
+            self._box_hash ^= self._box_keys[box] ^ self._box_keys[player]
+            self._region_key = None
+            self._reach = None
+            if board[player] & self._GOAL_FLAG:
+                self._nbox_in_goal += 1
+            if cell & self._GOAL_FLAG:
+                self._nbox_in_goal -= 1
+            self.npush += 1
+            self.history.append(code | SokobanHistory.PULL)
+            if self._grid is not None:
+                self._dirty.add(self._vector(box))
+        else:
+            self.history.append(code)
+
+        self._player = new_player
+        self.nmove += 1
+        if self._grid is not None:
+            self._dirty.add(self._vector(player))
+            self._dirty.add(self._vector(new_player))
+
+        return True
+
+    def apply_moves(self, moves, strict=False):
+        """Execute a sequence of moves in LURD notation.
+
+        See `Sokoban.apply_moves`.
+
+        Args:
+            moves (str): Moves in LURD notation.
+            strict (bool): Also treat a move as illegal if its case does not
+                match whether it pushes a box.
+
+        Returns:
+            int: Number of moves executed; equal to `len(moves)` unless the
+                move at that index is illegal.
+
+        Raises:
+            ValueError: If `moves` contains a character other than LURD letters.
+        """
+        codes = self._encode(moves, strict)
+        if self._player < 0:
+            return 0
+
+        offsets = [self._offsets[direction] for direction in self.DIRECTIONS] * 2
+        board = self._board
+        wall_flag = self._WALL_FLAG
+        box_flag = self._BOX_FLAG
+        goal_flag = self._GOAL_FLAG
+        blocked = wall_flag | box_flag
+        box_keys = self._box_keys
+        append = self.history.append
+        dirty = None if self._grid is None else []
+        player = self._player
+        box_hash = self._box_hash
+        nbox_in_goal = self._nbox_in_goal
+        nmove = npush = 0
+
+        for code in codes:
+            offset = offsets[code]
+            new_player = player + offset
+            flags = board[new_player]
+            if flags & wall_flag:
+                break
+            if flags & box_flag:
+                new_box = new_player + offset
+                if board[new_box] & blocked:
+                    break
+                if strict and not code & SokobanHistory.PUSH:
+                    break
+                board[new_player] = flags & ~box_flag
+                board[new_box] |= box_flag
+                box_hash ^= box_keys[new_player] ^ box_keys[new_box]
+                if flags & goal_flag:
+                    nbox_in_goal -= 1
+                if board[new_box] & goal_flag:
+                    nbox_in_goal += 1
+                npush += 1
+                append(code | SokobanHistory.PUSH)
+                if dirty is not None:
+                    dirty.append(new_box)
+            elif code & SokobanHistory.PUSH:
+                break
+            else:
+                append(code)
+            if dirty is not None:
+                dirty.append(player)
+                dirty.append(new_player)
+            player = new_player
+            nmove += 1
+
+        self._player = player
+        self.nmove += nmove
+        if npush:
+            self.npush += npush
+            self._nbox_in_goal = nbox_in_goal
+            self._box_hash = box_hash
+            self._region_key = None
+            self._reach = None
+        if dirty:
+            self._dirty.update(self._vector(index) for index in dirty)
+
+        return nmove
+
+    def snapshot(self):
+        """Capture the current state, to be brought back with `restore`.
+
+        See `Sokoban.snapshot`.
+
+        Returns:
+            tuple: Opaque snapshot, valid for this game and its clones.
+        """
+        return (
+            self._player,
+            bytes(self._board),
+            self.nmove,
+            self.npush,
+            self._nbox_in_goal,
+            self._box_hash,
+            self.history.copy(),
+        )
+
+    def restore(self, snapshot):
+        """Bring back a state captured by `snapshot`.
+
+        Args:
+            snapshot (tuple): Snapshot of this game or one of its clones.
+        """
+        player, board, nmove, npush, nbox_in_goal, box_hash, history = snapshot
+
+        self._player = player
+        self._board[:] = board
+        self.nmove = nmove
+        self.npush = npush
+        self._nbox_in_goal = nbox_in_goal
+        self._box_hash = box_hash
+        self._region_key = None
+        self._reach = None
+        self._grid = None
+        self.history = history.copy()
+
+    def clone(self, share_static=True):
+        """Return an independent copy of the game.
+
+        Args:
+            share_static (bool): Share the Zobrist key tables with this game
+                instead of copying them. Walls and goals live in the flat
+                board, which is always copied.
+
+        Returns:
+            CompactSokoban: A game in the same state, with its own board and history.
+        """
+        game = self.__class__.__new__(self.__class__)
+        game.__dict__.update(self.__dict__)
+        if self.stats is not None:
+            game.disable_stats()
+        game._board = bytearray(self._board)
+        game.history = self.history.copy()
+        game._grid = None
+        game._rows = []
+        game._dirty = set()
+
+        if not share_static:
+            game._box_keys = list(self._box_keys)
+            game._player_keys = list(self._player_keys)
+            game.dead_squares = set(self.dead_squares)
+
+        return game
+
+    def is_solved(self):
+        """Check if all boxes are on goal positions.
+
+        Returns:
+            bool: True if the puzzle is solved; False otherwise.
+        """
+        return self._nbox == self._ngoal == self._nbox_in_goal
+
+    def is_deadlocked(self, position=None):
+        """Check whether a box can no longer reach a goal.
+
+        Detects boxes on dead squares, freeze deadlocks and corral deadlocks.
+        A freeze deadlock is a set of boxes that can be pushed neither
+        horizontally nor vertically, held by walls or by other frozen boxes,
+        with at least one of them off a goal. A corral deadlock is a region
+        the player cannot reach, fenced in by boxes that can never be pushed,
+        with a goal inside or a fencing box off a goal; see
+        `_is_corral_deadlocked`.
+
+        Args:
+            position (SokobanVector | None): Only check the box at this position
+                and the corrals it fences, which is enough right after pushing
+                it; None to check all boxes.
+
+        Returns:
+            bool: True if the game is deadlocked; False otherwise.
+        """
+        board = self._board
+        if position is None:
+            boxes = [i for i in range(len(board)) if board[i] & self._BOX_FLAG]
+        elif self.covers(position) and board[self._index(position)] & self._BOX_FLAG:
+            boxes = [self._index(position)]
+        else:
+            boxes = []
+
+        for box in boxes:
+            if board[box] & self._DEAD_FLAG:
+                return True
+            frozen = []
+            if self._is_frozen(box, set(), frozen):
+                if not all(board[i] & self._GOAL_FLAG for i in frozen):
+                    return True
+
+        return self._is_corral_deadlocked(boxes)
+
+    def _is_frozen(self, box, checked, frozen):
+        """Check whether a box can be pushed along neither axis.
+
+        Boxes in `checked` are being examined further up the recursion and are
+        treated as walls. Boxes found frozen are appended to `frozen`.
+        """
+        mark = len(frozen)
+        checked.add(box)
+        result = self._is_blocked(box, 1, checked, frozen) and self._is_blocked(
+            box, self._width, checked, frozen
+        )
+        checked.discard(box)
+
+        if result:
+            frozen.append(box)
+        else:
+            del frozen[mark:]
+        return result
+
+    def _is_blocked(self, box, offset, checked, frozen):
+        """Check whether a box can be pushed along neither way of an axis."""
+        board = self._board
+        side_a = box + offset
+        side_b = box - offset
+
+        for side in (side_a, side_b):
+            if (board[side] & self._WALL_FLAG) or (side in checked):
+                return True
+        if board[side_a] & board[side_b] & self._DEAD_FLAG:
+            return True
+        return any(
+            (board[side] & self._BOX_FLAG) and self._is_frozen(side, checked, frozen)
+            for side in (side_a, side_b)
+        )
+
+    def _is_corral_deadlocked(self, boxes):
+        """Check whether a box fences in a corral that can never be opened.
+
+        See `Sokoban._is_corral_deadlocked`; boxes are board indices.
+        """
+        if self._player < 0:
+            return False
+
+        board = self._board
+        offsets = tuple(self._offsets.values())
+        reach = self._reachability()
+        seen = set()
+
+        for box in boxes:
+            for offset in offsets:
+                cell = box + offset
+                if (
+                    (board[cell] & self._BLOCKED_FLAGS)
+                    or (cell in reach)
+                    or (cell in seen)
+                ):
+                    continue
+
+                corral = {cell}
+                fence = set()
+                stack = [cell]
+                while stack:
+                    curr = stack.pop()
+                    for offset_b in offsets:
+                        new = curr + offset_b
+                        if (board[new] & self._WALL_FLAG) or (new in corral):
+                            continue
+                        if board[new] & self._BOX_FLAG:
+                            fence.add(new)
+                        else:
+                            corral.add(new)
+                            stack.append(new)
+                seen.update(corral)
+
+                if not any(board[i] & self._GOAL_FLAG for i in corral) and all(
+                    board[i] & self._GOAL_FLAG for i in fence
+                ):
+                    continue
+                if not any(
+                    self._can_open(fence_box, offset_b, corral, fence)
+                    for fence_box in fence
+                    for offset_b in offsets
+                ):
+                    return True
+
+        return False
+
+    def _can_open(self, box, offset, corral, fence):
+        """Check whether a fencing box may someday be pushed along `offset`."""
+        board = self._board
+        player = box - offset
+        target = box + offset
+        return not (
+            (board[player] & self._WALL_FLAG)
+            or (player in corral)
+            or (player in fence)
+            or (board[target] & (self._WALL_FLAG | self._DEAD_FLAG))
+            or (target in fence)
+        )
+
+    def reachable(self, position):
+        """Check whether the player can walk to a position without pushing.
+
+        Args:
+            position (SokobanVector): Position to check.
+
+        Returns:
+            bool: True if position is the player's or reachable; False otherwise.
+        """
+        if (self._player < 0) or (not self.covers(position)):
+            return False
+
+        return self._index(position) in self._reachability()
+
+    def find_path(self, target_pos):
+        """Find a shortest path of empty spaces from the player to target.
+
+        Uses the cached reachability map, so repeated queries from the same
+        player position cost only the length of the returned path.
+
+        Args:
+            target_pos (SokobanVector): Destination position.
+
+        Returns:
+            list[SokobanVector] | None: Sequence of positions to move through, or None if unreachable.
+        """
+        if (self._player < 0) or (not self.covers(target_pos)):
+            return None
+
+        target = self._index(target_pos)
+        if target == self._player:
+            return None
+
+        parents = self._reachability(rooted=True)
+        if target not in parents:
+            return None
+
+        path = []
+        curr = target
+        while curr != self._player:
+            path.append(self._vector(curr))
+            curr = parents[curr]
+        path.reverse()
+
+        return path
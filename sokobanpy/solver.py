@@ -0,0 +1,1730 @@
+"""Push-based Sokoban solver
+
+- Author: Quan Lin
+- License: MIT
+"""
+
+from array import array
+from collections import deque
+import heapq
+import time
+
+from .sokobanpy import SokobanVectorPool, Sokoban, CompactSokoban
+
+INF = float("inf")
+
+
+class SolverResult:
+    """Outcome of a solver run.
+
+    Attributes:
+        status (str): One of `SOLVED`, `UNSOLVABLE` or `LIMIT`.
+        moves (list[SokobanVector] | None): Directions that solve the level
+            when replayed through `Sokoban.move`, or None if not solved.
+        nodes (int): Number of search states expanded.
+        elapsed (float): Wall-clock time spent searching, in seconds.
+        npush (int | None): Number of pushes in the solution, or None if not
+            solved.
+        optimize (str | None): Metric the search minimised, one of the
+            `Solver` modes, or None if it did not minimise any.
+        optimal (bool): Whether the solution is proven optimal for `optimize`.
+        lower_bound (int | tuple[int, int] | None): Proven lower bound on the
+            optimal cost for `optimize`, equal to the cost of the solution when
+            it is optimal; a `(pushes, moves)` pair for `PUSHES_THEN_MOVES`.
+            None if unsolvable or nothing was proven.
+    """
+
+    SOLVED = "solved"
+    UNSOLVABLE = "unsolvable"
+    LIMIT = "limit"
+
+    def __init__(
+        self,
+        status,
+        moves=None,
+        nodes=0,
+        elapsed=0.0,
+        npush=None,
+        optimize=None,
+        optimal=False,
+        lower_bound=None,
+    ):
+        """Initialize a SolverResult instance.
+
+        Args:
+            status (str): One of `SOLVED`, `UNSOLVABLE` or `LIMIT`.
+            moves (list[SokobanVector] | None): Solution directions.
+            nodes (int): Number of search states expanded.
+            elapsed (float): Wall-clock time spent searching, in seconds.
+            npush (int | None): Number of pushes in the solution.
+            optimize (str | None): Metric the search minimised.
+            optimal (bool): Whether the solution is proven optimal.
+            lower_bound (int | tuple[int, int] | None): Proven lower bound on
+                the optimal cost.
+        """
+        self.status = status
+        self.moves = moves
+        self.nodes = nodes
+        self.elapsed = elapsed
+        self.npush = npush
+        self.optimize = optimize
+        self.optimal = optimal
+        self.lower_bound = lower_bound
+
+    def __repr__(self):
+        """Return a human-readable string representation.
+
+        Returns:
+            str: String with the status, solution length and node count.
+        """
+        nmove = None if self.moves is None else len(self.moves)
+        return (
+            f"{self.__class__.__name__}(status={self.status!r}, "
+            + f"nmove={nmove}, npush={self.npush}, nodes={self.nodes})"
+        )
+
+
+class _Level:
+    """Static analysis of a Sokoban board on a flat padded array.
+
+    Cells are indexed like in `CompactSokoban`: the cell at row `r` and column
+    `c` lives at `(r + 1) * width + (c + 1)`, with a border of walls around it.
+
+    With `macros`, the walls and goals are also searched for the places where
+    `macro` chains pushes together:
+
+    - A tunnel is a run of cells walled in on both sides, along which a box
+      pushed in can only be pushed on. `tunnels[d][cell]` flags a cell that
+      is not a goal, with walls beside it and beside the cell behind it
+      across `offsets[d]`.
+    - The goal room is the smallest set of cells holding every goal that the
+      rest of the board reaches through a single `entrance` cell.
+      `room_order` lists its goals in an order they can be filled in from the
+      entrance, each past the boxes already parked on the goals before it.
+    """
+
+    DIRECTIONS = (Sokoban.RIGHT, Sokoban.DOWN, Sokoban.LEFT, Sokoban.UP)
+
+    def __init__(self, game, deadlocks=None, macros=False):
+        self.nrow = game.nrow
+        self.ncol = game.ncol
+        self.width = width = game.ncol + 2
+        self.size = width * (game.nrow + 2)
+        self.offsets = (1, width, -1, -width)
+        self.deadlocks = deadlocks
+
+        self.floor = bytearray(self.size)
+        for r in range(game.nrow):
+            for c in range(game.ncol):
+                self.floor[(r + 1) * width + c + 1] = 1
+        walls = game.walls
+        for wall in walls:
+            self.floor[self.index(wall)] = 0
+
+        pool = SokobanVectorPool.get(game.nrow, game.ncol)
+        self.box_keys = [0] * self.size
+        self.player_keys = [0] * self.size
+        for cell in pool.cells:
+            self.box_keys[self.index(cell)] = pool.box_keys[cell]
+            self.player_keys[self.index(cell)] = pool.player_keys[cell]
+
+        self.goals = frozenset(self.index(goal) for goal in game.goals)
+        self.goal_distances = {goal: self._pull_distances(goal) for goal in self.goals}
+        # Push distance of every cell to each goal, in a fixed goal order.
+        self.goal_order = tuple(sorted(self.goals))
+        columns = [self.goal_distances[goal] for goal in self.goal_order]
+        self.goal_costs = [
+            tuple(column[i] for column in columns) for i in range(self.size)
+        ]
+        self.distances = [
+            min((dist[i] for dist in self.goal_distances.values()), default=INF)
+            for i in range(self.size)
+        ]
+
+        self.tunnels = None
+        self.room = bytearray(self.size)
+        self.entrance = None
+        self.room_order = ()
+        if macros:
+            self.tunnels = self._find_tunnels()
+            if game.player is not None:
+                self._find_goal_room(self.index(game.player))
+
+    def index(self, position):
+        """Return the flat index of a position."""
+        return (position.r + 1) * self.width + position.c + 1
+
+    def _pull_distances(self, goal):
+        """Return the number of pushes from every cell to `goal`, ignoring boxes."""
+        floor = self.floor
+        dist = [INF] * self.size
+        dist[goal] = 0
+        queue = deque([goal])
+        while queue:
+            box = queue.popleft()
+            for offset in self.offsets:
+                # Pull the box one cell along `offset`.
+                new_box = box + offset
+                if floor[new_box] and floor[new_box + offset]:
+                    if dist[new_box] == INF:
+                        dist[new_box] = dist[box] + 1
+                        queue.append(new_box)
+        return dist
+
+    def _push_distances(self, start):
+        """Return the number of pushes from `start` to every cell, ignoring boxes."""
+        floor = self.floor
+        dist = [INF] * self.size
+        dist[start] = 0
+        queue = deque([start])
+        while queue:
+            box = queue.popleft()
+            for offset in self.offsets:
+                new_box = box + offset
+                if floor[new_box] and floor[box - offset]:
+                    if dist[new_box] == INF:
+                        dist[new_box] = dist[box] + 1
+                        queue.append(new_box)
+        return dist
+
+    def _find_tunnels(self):
+        """Return the tunnel flags of every cell, one bytearray per direction."""
+        floor = self.floor
+        offsets = self.offsets
+        tunnels = tuple(bytearray(self.size) for _ in offsets)
+        for d, offset in enumerate(offsets):
+            side = offsets[(d + 1) % 4]
+            for cell in range(self.size):
+                behind = cell - offset
+                if (
+                    floor[cell]
+                    and cell not in self.goals
+                    and not (floor[cell + side] or floor[cell - side])
+                    and not (floor[behind + side] or floor[behind - side])
+                ):
+                    tunnels[d][cell] = 1
+        return tunnels
+
+    def _find_goal_room(self, player):
+        """Set `room`, `entrance` and `room_order` if the goals share a room."""
+        floor = self.floor
+        offsets = self.offsets
+        area = self.reach((), player)
+        cells = [i for i in range(self.size) if area[i]]
+        if not self.goals or not self.goals.issubset(cells):
+            return
+
+        best = None
+        first_goal = min(self.goals)
+        for entrance in cells:
+            if entrance in self.goals:
+                continue
+            # The cells left reachable from a goal with the entrance walled up.
+            room = self.reach((entrance,), first_goal)
+            size = sum(room)
+            if size < len(cells) - 1 and all(room[goal] for goal in self.goals):
+                if best is None or size < best[0]:
+                    best = (size, entrance, room)
+        if best is None:
+            return
+        _, entrance, room = best
+
+        # Fill the room backwards: the goal filled last is one a box can still
+        # be pushed onto when every other goal holds a box.
+        starts = [
+            entrance - offset
+            for offset in offsets
+            if floor[entrance - offset]
+            and not room[entrance - offset]
+            and room[entrance + offset]
+        ]
+        self.room = room
+        remaining = set(self.goals)
+        order = []
+        while remaining:
+            for goal in sorted(remaining):
+                others = frozenset(remaining.difference((goal,)))
+                if any(
+                    self._push_path(others, entrance, start, goal) is not None
+                    for start in starts
+                ):
+                    break
+            else:
+                self.room = bytearray(self.size)
+                return
+            order.append(goal)
+            remaining.discard(goal)
+        order.reverse()
+        self.entrance = entrance
+        self.room_order = tuple(order)
+
+    def _push_path(self, others, box, player, target):
+        """Return the fewest pushes taking one box into the room to `target`.
+
+        Other boxes stay put. Pushes are `(box, d)` pairs, and None is
+        returned if the box cannot get there.
+        """
+        room = self.room
+        parents = {(box, player): None}
+        queue = deque([(box, player)])
+        while queue:
+            state = queue.popleft()
+            box, player = state
+            if box == target:
+                pushes = []
+                while parents[state] is not None:
+                    state, push = parents[state]
+                    pushes.append(push)
+                pushes.reverse()
+                return pushes
+            reach = self.reach(others.union((box,)), player)
+            for d, offset in enumerate(self.offsets):
+                new_box = box + offset
+                new_state = (new_box, box)
+                if (
+                    reach[box - offset]
+                    and room[new_box]
+                    and new_box not in others
+                    and new_state not in parents
+                ):
+                    parents[new_state] = (state, (box, d))
+                    queue.append(new_state)
+        return None
+
+    def macro(self, boxes, box, d):
+        """Return the pushes that follow on from a push, as one macro push.
+
+        A box pushed into a tunnel is pushed on until it leaves it. A box
+        pushed onto the goal room entrance, or out of a tunnel onto it, is
+        parked on the next goal of `room_order`, if the room holds boxes on
+        exactly the goals before it.
+
+        Args:
+            boxes (frozenset[int]): Boxes after the push.
+            box (int): Cell the box was pushed to.
+            d (int): Index of the push direction in `offsets`.
+
+        Returns:
+            list[tuple[int, int]]: The further `(box, d)` pushes, possibly none.
+        """
+        floor = self.floor
+        distances = self.distances
+        offset = self.offsets[d]
+        tunnel = self.tunnels[d]
+        others = boxes.difference((box,))
+        pushes = []
+        while tunnel[box] and box != self.entrance:
+            new_box = box + offset
+            if not floor[new_box] or new_box in others or distances[new_box] == INF:
+                break
+            pushes.append((box, d))
+            box = new_box
+
+        player = box - offset
+        order = self.room_order
+        if box == self.entrance and not self.room[player]:
+            filled = set(other for other in others if self.room[other])
+            if len(filled) < len(order) and filled.issubset(order[: len(filled)]):
+                path = self._push_path(others, box, player, order[len(filled)])
+                if path is not None:
+                    pushes.extend(path)
+        return pushes
+
+    def is_deadlocked(self, boxes, box):
+        """Return whether `box` is frozen together with a box off a goal."""
+        frozen = []
+        if self._is_frozen(boxes, box, set(), frozen):
+            return not self.goals.issuperset(frozen)
+        return False
+
+    def _is_frozen(self, boxes, box, checked, frozen):
+        """Return whether `box` can be pushed along neither axis.
+
+        See `Sokoban.is_deadlocked` for the rules.
+        """
+        mark = len(frozen)
+        checked.add(box)
+        result = self._is_blocked(boxes, box, 1, checked, frozen) and self._is_blocked(
+            boxes, box, self.width, checked, frozen
+        )
+        checked.discard(box)
+
+        if result:
+            frozen.append(box)
+        else:
+            del frozen[mark:]
+        return result
+
+    def _is_blocked(self, boxes, box, offset, checked, frozen):
+        """Return whether `box` can be pushed along neither way of an axis."""
+        side_a = box + offset
+        side_b = box - offset
+
+        for side in (side_a, side_b):
+            if (not self.floor[side]) or (side in checked):
+                return True
+        if self.distances[side_a] == self.distances[side_b] == INF:
+            return True
+        return any(
+            (side in boxes) and self._is_frozen(boxes, side, checked, frozen)
+            for side in (side_a, side_b)
+        )
+
+    def successors(self, boxes, box_hash, h, reach):
+        """Yield the pushes available in a state, skipping deadlocking ones.
+
+        Each push is yielded as `(new_boxes, new_box_hash, new_h, box, d)`,
+        where `d` indexes `offsets`.
+        """
+        floor = self.floor
+        distances = self.distances
+        box_keys = self.box_keys
+        deadlocks = self.deadlocks
+        for box in boxes:
+            for d, offset in enumerate(self.offsets):
+                new_box = box + offset
+                if (
+                    reach[box - offset]
+                    and floor[new_box]
+                    and new_box not in boxes
+                    and distances[new_box] != INF
+                ):
+                    new_boxes = boxes.difference((box,)).union((new_box,))
+                    if self.is_deadlocked(new_boxes, new_box) or (
+                        deadlocks is not None and deadlocks.blocks(new_boxes, new_box)
+                    ):
+                        continue
+                    yield (
+                        new_boxes,
+                        box_hash ^ box_keys[box] ^ box_keys[new_box],
+                        h - distances[box] + distances[new_box],
+                        box,
+                        d,
+                    )
+
+    def predecessors(self, boxes, box_hash, reach):
+        """Yield the pulls available in a state, as the pushes they undo.
+
+        Each pull is yielded as `(new_boxes, new_box_hash, player, box, d)`:
+        from the new layout, with the player at `player`, pushing the box at
+        `box` along `offsets[d]` gives `boxes` back.
+        """
+        floor = self.floor
+        box_keys = self.box_keys
+        for new_box in boxes:
+            for d, offset in enumerate(self.offsets):
+                box = new_box - offset
+                player = box - offset
+                if reach[box] and floor[player] and player not in boxes:
+                    yield (
+                        boxes.difference((new_box,)).union((box,)),
+                        box_hash ^ box_keys[new_box] ^ box_keys[box],
+                        player,
+                        box,
+                        d,
+                    )
+
+    def reach(self, boxes, player):
+        """Return the cells reachable by the player, as a bytearray of flags."""
+        floor = self.floor
+        offsets = self.offsets
+        visited = bytearray(self.size)
+        visited[player] = 1
+        stack = [player]
+        while stack:
+            curr = stack.pop()
+            for offset in offsets:
+                new = curr + offset
+                if floor[new] and not visited[new] and new not in boxes:
+                    visited[new] = 1
+                    stack.append(new)
+        return visited
+
+    def walk_distances(self, boxes, player):
+        """Return the cells reachable by the player and the walk to each.
+
+        Returns:
+            tuple[bytearray, list[int]]: Reachability flags like `reach`, and
+                the number of moves to every cell, -1 where unreachable.
+        """
+        floor = self.floor
+        offsets = self.offsets
+        visited = bytearray(self.size)
+        visited[player] = 1
+        dist = [-1] * self.size
+        dist[player] = 0
+        queue = deque([player])
+        while queue:
+            curr = queue.popleft()
+            for offset in offsets:
+                new = curr + offset
+                if floor[new] and not visited[new] and new not in boxes:
+                    visited[new] = 1
+                    dist[new] = dist[curr] + 1
+                    queue.append(new)
+        return visited, dist
+
+    def walk(self, boxes, start, target):
+        """Return the direction indices of a shortest walk, or None."""
+        if start == target:
+            return []
+        floor = self.floor
+        parents = {start: None}
+        queue = deque([start])
+        while queue:
+            curr = queue.popleft()
+            for d, offset in enumerate(self.offsets):
+                new = curr + offset
+                if floor[new] and new not in parents and new not in boxes:
+                    parents[new] = (curr, d)
+                    if new == target:
+                        path = []
+                        while parents[new] is not None:
+                            new, d = parents[new]
+                            path.append(d)
+                        path.reverse()
+                        return path
+                    queue.append(new)
+        return None
+
+
+class _GoalMatching:
+    """Minimum-cost assignment of boxes to goals, updated one push at a time.
+
+    The cost of assigning a box to a goal is its push distance to that goal,
+    from `_Level.goal_distances`, and the cost of the assignment is a lower
+    bound on the pushes left. It never drops by more than one per push, so it
+    is a consistent heuristic like the nearest-goal sum it improves on.
+
+    The assignment is kept with the dual potentials of the Hungarian method.
+    After a push only the row of the pushed box changes: its goal is freed, its
+    potential is lowered until its reduced costs are non-negative again, and
+    one shortest augmenting path reassigns it, in O(n^2) time instead of the
+    O(n^3) of a full assignment.
+
+    Other cost tables can stand in for the goal distances, such as the push
+    distances from the start cells that a backward search is bound for.
+
+    Rows and columns are numbered from 1, as column 0 is the root of the
+    augmenting path searches.
+
+    Attributes:
+        boxes (list[int]): Flat index of the box of each row, from row 1.
+        cost (int | float): Cost of the assignment, or `INF` if some box
+            cannot be assigned a goal it can reach, a deadlock.
+    """
+
+    __slots__ = ("_costs", "_big", "boxes", "_u", "_v", "_row", "cost")
+
+    def __init__(self, level, boxes, costs=None):
+        """Assign boxes to the goals of a level.
+
+        Args:
+            level (_Level): The level.
+            boxes (Iterable[int]): Flat indices of the boxes, as many as goals.
+            costs (list[tuple[int | float, ...]] | None): Cost of every cell
+                to each target, laid out like `_Level.goal_costs`; None for the
+                goal costs.
+        """
+        self._costs = level.goal_costs if costs is None else costs
+        # Finite stand-in for INF, larger than any feasible assignment.
+        self._big = level.size * (len(level.goal_order) + 1)
+        self.boxes = [0] + list(boxes)
+        n = len(self.boxes) - 1
+        self._u = [0] * (n + 1)
+        self._v = [0] * (n + 1)
+        self._row = [0] * (n + 1)
+        for i in range(1, n + 1):
+            self._augment(i)
+        self._update_cost()
+
+    def push(self, box, new_box):
+        """Return the assignment after a box is pushed.
+
+        Args:
+            box (int): Flat index of the pushed box.
+            new_box (int): Flat index the box is pushed to.
+
+        Returns:
+            _GoalMatching: The new assignment; this one is unchanged.
+        """
+        matching = _GoalMatching.__new__(_GoalMatching)
+        matching._costs = self._costs
+        matching._big = self._big
+        boxes = matching.boxes = self.boxes[:]
+        u = matching._u = self._u[:]
+        v = matching._v = self._v[:]
+        row = matching._row = self._row[:]
+
+        i = boxes.index(box)
+        boxes[i] = new_box
+        row[row.index(i, 1)] = 0
+        big = self._big
+        u[i] = min(
+            (big if cost == INF else cost) - v[j]
+            for j, cost in enumerate(self._costs[new_box], 1)
+        )
+        matching._augment(i)
+        matching._update_cost()
+        return matching
+
+    def _augment(self, i):
+        """Assign row `i`, the only unassigned row, along a shortest path."""
+        costs = self._costs
+        boxes = self.boxes
+        big = self._big
+        u = self._u
+        v = self._v
+        row = self._row
+        n = len(row) - 1
+        row[0] = i
+        min_reduced = [INF] * (n + 1)
+        way = [0] * (n + 1)
+        used = [False] * (n + 1)
+        j0 = 0
+        while row[j0]:
+            used[j0] = True
+            i0 = row[j0]
+            box_costs = costs[boxes[i0]]
+            delta = INF
+            j1 = 0
+            for j in range(1, n + 1):
+                if not used[j]:
+                    cost = box_costs[j - 1]
+                    reduced = (big if cost == INF else cost) - u[i0] - v[j]
+                    if reduced < min_reduced[j]:
+                        min_reduced[j] = reduced
+                        way[j] = j0
+                    if min_reduced[j] < delta:
+                        delta = min_reduced[j]
+                        j1 = j
+            for j in range(n + 1):
+                if used[j]:
+                    u[row[j]] += delta
+                    v[j] -= delta
+                else:
+                    min_reduced[j] -= delta
+            j0 = j1
+        while j0:
+            j1 = way[j0]
+            row[j0] = row[j1]
+            j0 = j1
+
+    def _update_cost(self):
+        """Sum the costs of the assigned pairs into `cost`."""
+        costs = self._costs
+        boxes = self.boxes
+        row = self._row
+        cost = sum(costs[boxes[row[j]]][j - 1] for j in range(1, len(row)))
+        self.cost = INF if cost >= self._big else cost
+
+
+class TranspositionTable:
+    """Fixed-size table of visited search states with a hard byte budget.
+
+    Entries are Zobrist keys with the best `g` (cost from the root, an
+    unsigned 64-bit integer) each state was reached at, stored in flat arrays with open addressing: a key is looked
+    for in `probe` consecutive slots from its home slot. When all of them are
+    taken, one entry is evicted according to `policy`:
+
+    - `DEPTH` evicts the deepest entry, keeping states close to the root,
+      which are the most expensive to search again.
+    - `AGE` evicts the entry stored longest ago.
+
+    An evicted state is only forgotten, so a search may expand it again but
+    never gives a wrong answer. The search slows down as more states are
+    forgotten, though, and a table far smaller than the state space of a
+    level can make it re-expand states almost without end; bound such
+    searches with `max_nodes` or `time_limit`.
+
+    The depth of a state is taken to be its `g`, so one array holds both.
+
+    Attributes:
+        policy (str): Replacement policy, `DEPTH` or `AGE`.
+        probe (int): Number of slots searched for a key.
+        capacity (int): Number of slots, a power of two.
+        nbytes (int): Memory used by the slots in bytes.
+        evictions (int): Number of entries evicted so far.
+    """
+
+    DEPTH = "depth"
+    AGE = "age"
+    ENTRY_SIZE = 20
+
+    def __init__(self, max_bytes=64 * 2**20, policy=DEPTH, probe=8):
+        """Initialize a TranspositionTable instance.
+
+        Args:
+            max_bytes (int): Memory budget of the slots in bytes.
+            policy (str): Replacement policy, `DEPTH` or `AGE`.
+            probe (int): Number of slots searched for a key.
+
+        Raises:
+            ValueError: If the policy is unknown or `max_bytes` cannot hold
+                `probe` entries.
+        """
+        if policy not in (self.DEPTH, self.AGE):
+            raise ValueError(f"unknown replacement policy {policy!r}")
+        if max_bytes < probe * self.ENTRY_SIZE:
+            raise ValueError(
+                f"max_bytes must be at least {probe * self.ENTRY_SIZE} for probe={probe}"
+            )
+        self.policy = policy
+        self.probe = probe
+        capacity = 1
+        while capacity * 2 * self.ENTRY_SIZE <= max_bytes:
+            capacity *= 2
+        if capacity < probe:
+            raise ValueError(f"probe={probe} does not fit in {capacity} slots")
+        self.capacity = capacity
+        self.nbytes = capacity * self.ENTRY_SIZE
+        self.evictions = 0
+        self._mask = capacity - 1
+        self._keys = array("Q", bytes(8 * capacity))
+        self._g = array("Q", bytes(8 * capacity))
+        self._age = array("I", bytes(4 * capacity))
+        self._clock = 0
+        self._len = 0
+
+    def __len__(self):
+        """Return the number of stored states."""
+        return self._len
+
+    def __contains__(self, key):
+        """Return whether a state is stored."""
+        return self.get(key) is not None
+
+    def _find(self, key):
+        """Return the slot holding `key`, or -1."""
+        keys = self._keys
+        mask = self._mask
+        for i in range(key, key + self.probe):
+            k = keys[i & mask]
+            if k == key:
+                return i & mask
+            if not k:
+                break
+        return -1
+
+    def get(self, key, default=None):
+        """Return the best `g` stored for a state.
+
+        Args:
+            key (int): 64-bit Zobrist key of the state.
+            default: Value returned when the state is not stored.
+
+        Returns:
+            int: The stored `g`, or `default`.
+        """
+        slot = self._find(key or 1)
+        return default if slot < 0 else self._g[slot]
+
+    def visit(self, key, g):
+        """Record that a state is reached at depth `g`.
+
+        Args:
+            key (int): 64-bit Zobrist key of the state.
+            g (int): Cost the state is reached at, below 2**64.
+
+        Returns:
+            bool: True if the state is new or reached at a smaller cost than
+                before, in which case it is stored; False otherwise.
+        """
+        # Key 0 marks empty slots.
+        key = key or 1
+        keys = self._keys
+        ages = self._age
+        gs = self._g
+        mask = self._mask
+        self._clock = (self._clock + 1) & 0xFFFFFFFF
+        by_depth = self.policy == self.DEPTH
+        victim = -1
+        for i in range(key, key + self.probe):
+            slot = i & mask
+            k = keys[slot]
+            if k == key:
+                if gs[slot] <= g:
+                    return False
+                break
+            if not k:
+                self._len += 1
+                break
+            if (
+                victim < 0
+                or (by_depth and gs[slot] > gs[victim])
+                or (not by_depth and ages[slot] < ages[victim])
+            ):
+                victim = slot
+        else:
+            slot = victim
+            self.evictions += 1
+        keys[slot] = key
+        gs[slot] = g
+        ages[slot] = self._clock
+        return True
+
+    def clear(self):
+        """Remove all states."""
+        capacity = self.capacity
+        self._keys = array("Q", bytes(8 * capacity))
+        self._g = array("Q", bytes(8 * capacity))
+        self._age = array("I", bytes(4 * capacity))
+        self._clock = 0
+        self._len = 0
+        self.evictions = 0
+
+
+class Solver:
+    """A* search over box pushes.
+
+    Each transition is a single box push; the player walks between pushes are
+    filled in when the solution is emitted. The heuristic is the push cost of
+    the best assignment of boxes to distinct goals, updated incrementally
+    after each push, or the cheaper sum of each box's push distance to its
+    nearest goal. Pushes onto dead squares, pushes that freeze boxes off goals
+    and pushes after which no assignment exists are pruned, as are pushes that
+    complete a pair found in `deadlocks`.
+
+    The solution is optimal for the metric chosen by `optimize`:
+
+    - `PUSHES` minimises `npush`. States are box layouts plus the region the
+      player can reach, normalised to its smallest cell index, so that walking
+      around never creates new states.
+    - `MOVES` minimises `nmove`. States keep the exact player position, and
+      each push costs the walk to it plus one move.
+    - `PUSHES_THEN_MOVES` minimises `npush`, then `nmove` among the solutions
+      with the fewest pushes, with the states of `MOVES`.
+
+    Both heuristics never overestimate either metric, as every push moves one
+    box by one cell and is itself a move, and they drop by at most one per
+    push. The first solution taken from the open list is therefore optimal,
+    and when a limit stops the search the smallest cost left in the open list
+    is a lower bound on the optimal one.
+
+    With `macros`, a push into a tunnel carries the box through it, and a push
+    onto the entrance of the goal room parks the box on the next goal the
+    room is filled in with, each as one transition that costs all its pushes.
+    This cuts the branching on levels with long corridors or a goal room, but
+    the transitions left out may be needed by the best solution, so the
+    solution is no longer proven optimal, and running out of states no
+    longer proves the level unsolvable: the search then stops with `LIMIT`.
+    Macros only count pushes.
+
+    Attributes:
+        game (Sokoban): The game to solve, searched from its current state.
+        max_nodes (int | None): Maximum number of states to expand.
+        time_limit (float | None): Maximum search time in seconds.
+        max_bytes (int | None): Memory budget of the visited states.
+        optimize (str): Metric to minimise, `PUSHES`, `MOVES` or
+            `PUSHES_THEN_MOVES`.
+        matching (bool): Whether the heuristic is the box-to-goal assignment.
+        deadlocks (DeadlockDatabase | None): Deadlocked box pairs of the level.
+        macros (bool): Whether tunnel and goal room pushes are chained.
+        table_policy (str): Replacement policy of the `TranspositionTable`
+            used with `max_bytes`.
+    """
+
+    PUSHES = "pushes"
+    MOVES = "moves"
+    PUSHES_THEN_MOVES = "pushes_then_moves"
+
+    def __init__(
+        self,
+        game,
+        max_nodes=None,
+        time_limit=None,
+        max_bytes=None,
+        optimize=PUSHES,
+        matching=True,
+        deadlocks=None,
+        macros=False,
+        table_policy=TranspositionTable.DEPTH,
+    ):
+        """Initialize a Solver instance.
+
+        Args:
+            game (Sokoban): The game to solve, searched from its current state.
+            max_nodes (int | None): Maximum number of states to expand; None for unlimited.
+            time_limit (float | None): Maximum search time in seconds; None for unlimited.
+            max_bytes (int | None): Keep visited states in a `TranspositionTable`
+                of this many bytes instead of an unbounded set; None for a set.
+                The open list is not bounded by it: use `max_nodes` to cap the
+                total memory of a search.
+            optimize (str): Metric to minimise, `PUSHES`, `MOVES` or
+                `PUSHES_THEN_MOVES`.
+            matching (bool): Use the minimum-cost assignment of boxes to goals
+                as the heuristic; False for the nearest-goal sum.
+            deadlocks (DeadlockDatabase | None): Deadlocked box pairs of the
+                level, from `sokobanpy.patterns`, to prune pushes with.
+            macros (bool): Push boxes through tunnels and into the goal room
+                as single transitions; needs `optimize` to be `PUSHES`.
+            table_policy (str): Replacement policy of the `TranspositionTable`
+                kept with `max_bytes`, `TranspositionTable.DEPTH` or `AGE`.
+
+        Raises:
+            ValueError: If `optimize` is not one of the modes, or is not
+                `PUSHES` with `macros`, `table_policy` is unknown, or
+                `deadlocks` belongs to another level.
+        """
+        if optimize not in (self.PUSHES, self.MOVES, self.PUSHES_THEN_MOVES):
+            raise ValueError(f"unknown optimization mode {optimize!r}")
+        if table_policy not in (TranspositionTable.DEPTH, TranspositionTable.AGE):
+            raise ValueError(f"unknown replacement policy {table_policy!r}")
+        if macros and optimize != self.PUSHES:
+            raise ValueError("macro pushes only count pushes")
+        if deadlocks is not None:
+            from .patterns import level_key
+
+            if deadlocks.key != level_key(game):
+                raise ValueError(f"{deadlocks.path} is not a database of this level")
+        self.game = game
+        self.max_nodes = max_nodes
+        self.time_limit = time_limit
+        self.max_bytes = max_bytes
+        self.optimize = optimize
+        self.matching = matching
+        self.deadlocks = deadlocks
+        self.macros = macros
+        self.table_policy = table_policy
+
+    def _cost(self, pushes, moves, h):
+        """Return the A* priority of a state from its costs and heuristic."""
+        if self.optimize == self.PUSHES:
+            return pushes + h
+        if self.optimize == self.MOVES:
+            return moves + h
+        return (pushes + h, moves + h)
+
+    def _table_cost(self, pushes, moves):
+        """Return the cost of a state as one integer, ordered like `_cost`."""
+        if self.optimize == self.PUSHES:
+            return pushes
+        if self.optimize == self.MOVES:
+            return moves
+        return pushes << 32 | moves
+
+    def solve(self):
+        """Search for a solution.
+
+        Returns:
+            SolverResult: The outcome of the search.
+        """
+        start_time = time.monotonic()
+        game = self.game
+        level = _Level(game, self.deadlocks, self.macros)
+        goals = level.goals
+        distances = level.distances
+        box_keys = level.box_keys
+
+        if game.player is None:
+            return SolverResult(SolverResult.UNSOLVABLE)
+
+        boxes = frozenset(level.index(box) for box in game.boxes)
+        player = level.index(game.player)
+        if len(boxes) != len(goals):
+            return SolverResult(SolverResult.UNSOLVABLE)
+
+        matching = _GoalMatching(level, boxes) if self.matching else None
+        h = sum(distances[box] for box in boxes) if matching is None else matching.cost
+        if h == INF:
+            return SolverResult(SolverResult.UNSOLVABLE)
+
+        box_hash = 0
+        for box in boxes:
+            box_hash ^= box_keys[box]
+
+        # Heap entries are (f, h, tie, pushes, moves, node) and nodes are
+        # (boxes, box_hash, player, parent_node, pushes, matching) with
+        # pushes = ((box, direction), ...), more than one for a macro.
+        # States are keyed by their Zobrist hash, as in `Sokoban.state_hash`,
+        # with the exact player position when moves are counted.
+        count_moves = self.optimize != self.PUSHES
+        offsets = level.offsets
+        tie = 0
+        heap = [
+            (
+                self._cost(0, 0, h),
+                h,
+                tie,
+                0,
+                0,
+                (boxes, box_hash, player, None, None, matching),
+            )
+        ]
+        closed = set()
+        table = None
+        if self.max_bytes is not None:
+            table = TranspositionTable(self.max_bytes, self.table_policy)
+        nodes = 0
+
+        while heap:
+            f, h, _, npush, nmove, node = heapq.heappop(heap)
+            boxes, box_hash, player, _, _, matching = node
+            if count_moves:
+                reach, walks = level.walk_distances(boxes, player)
+                key = box_hash ^ level.player_keys[player]
+            else:
+                reach = level.reach(boxes, player)
+                key = box_hash ^ level.player_keys[reach.index(1)]
+            if table is None:
+                if key in closed:
+                    continue
+                closed.add(key)
+            # States are taken in order of cost, so one already visited at a
+            # cost no larger has been expanded already.
+            elif not table.visit(key, self._table_cost(npush, nmove)):
+                continue
+
+            if h == 0:
+                pushes = []
+                while node[4] is not None:
+                    pushes.extend(reversed(node[4]))
+                    node = node[3]
+                pushes.reverse()
+                moves = self._emit(level, game, pushes)
+                elapsed = time.monotonic() - start_time
+                return SolverResult(
+                    SolverResult.SOLVED,
+                    moves,
+                    nodes,
+                    elapsed,
+                    npush,
+                    None if self.macros else self.optimize,
+                    not self.macros,
+                    None if self.macros else f,
+                )
+
+            if (self.max_nodes is not None and nodes >= self.max_nodes) or (
+                self.time_limit is not None
+                and time.monotonic() - start_time >= self.time_limit
+            ):
+                elapsed = time.monotonic() - start_time
+                return SolverResult(
+                    SolverResult.LIMIT,
+                    None,
+                    nodes,
+                    elapsed,
+                    optimize=None if self.macros else self.optimize,
+                    lower_bound=None if self.macros else f,
+                )
+            nodes += 1
+
+            for new_boxes, new_hash, new_h, box, d in level.successors(
+                boxes, box_hash, h, reach
+            ):
+                new_box = box + offsets[d]
+                pushes = ((box, d),)
+                if self.macros:
+                    chain = level.macro(new_boxes, new_box, d)
+                    if chain:
+                        last_box, last_d = chain[-1]
+                        end = last_box + offsets[last_d]
+                        new_boxes = new_boxes.difference((new_box,)).union((end,))
+                        new_hash ^= box_keys[new_box] ^ box_keys[end]
+                        new_h += distances[end] - distances[new_box]
+                        if level.is_deadlocked(new_boxes, end) or (
+                            self.deadlocks is not None
+                            and self.deadlocks.blocks(new_boxes, end)
+                        ):
+                            continue
+                        pushes += tuple(chain)
+                        new_box = end
+                new_matching = None
+                if matching is not None:
+                    new_matching = matching.push(box, new_box)
+                    new_h = new_matching.cost
+                    # No assignment of boxes to reachable goals: a deadlock.
+                    if new_h == INF:
+                        continue
+                new_nmove = nmove + walks[box - offsets[d]] + 1 if count_moves else 0
+                new_npush = npush + len(pushes)
+                tie += 1
+                heapq.heappush(
+                    heap,
+                    (
+                        self._cost(new_npush, new_nmove, new_h),
+                        new_h,
+                        tie,
+                        new_npush,
+                        new_nmove,
+                        (
+                            new_boxes,
+                            new_hash,
+                            pushes[-1][0],
+                            node,
+                            pushes,
+                            new_matching,
+                        ),
+                    ),
+                )
+
+        elapsed = time.monotonic() - start_time
+        # Macros leave pushes out, so running out of states proves nothing.
+        return SolverResult(
+            SolverResult.LIMIT if self.macros else SolverResult.UNSOLVABLE,
+            None,
+            nodes,
+            elapsed,
+            optimize=None if self.macros else self.optimize,
+        )
+
+    @staticmethod
+    def _emit(level, game, pushes):
+        """Expand a list of `(box, direction index)` pushes into player directions."""
+        boxes = set(level.index(box) for box in game.boxes)
+        player = level.index(game.player)
+        moves = []
+        for box, d in pushes:
+            offset = level.offsets[d]
+            walk = level.walk(boxes, player, box - offset)
+            moves.extend(level.DIRECTIONS[step] for step in walk)
+            moves.append(level.DIRECTIONS[d])
+            boxes.discard(box)
+            boxes.add(box + offset)
+            player = box
+        return moves
+
+
+class ParallelSolver(Solver):
+    """Hash-distributed A* over box pushes across worker processes.
+
+    Every state is owned by one worker, chosen by the Zobrist hash of its
+    boxes. A worker expands the best states of its own open list and sends the
+    successors it does not own to their owners in batches, so both the
+    frontier and the closed set are partitioned and no locks are needed
+    around them. The pruning and heuristic are those of `Solver`; as the
+    workers advance independently, the first solution found is returned and
+    it may need a few more pushes than an optimal one.
+
+    Attributes:
+        game (Sokoban): The game to solve, searched from its current state.
+        jobs (int): Number of worker processes.
+        max_nodes (int | None): Maximum number of states to expand, in total.
+        time_limit (float | None): Maximum search time in seconds.
+        deadlocks (DeadlockDatabase | None): Deadlocked box pairs of the level.
+    """
+
+    def __init__(
+        self, game, jobs=None, max_nodes=None, time_limit=None, deadlocks=None
+    ):
+        """Initialize a ParallelSolver instance.
+
+        Args:
+            game (Sokoban): The game to solve, searched from its current state.
+            jobs (int | None): Number of worker processes; None for one per CPU.
+            max_nodes (int | None): Maximum number of states to expand; None for unlimited.
+            time_limit (float | None): Maximum search time in seconds; None for unlimited.
+            deadlocks (DeadlockDatabase | None): Deadlocked box pairs of the
+                level, mapped again by every worker from its file.
+        """
+        import os
+
+        super().__init__(game, max_nodes, time_limit, deadlocks=deadlocks)
+        self.jobs = jobs or os.cpu_count() or 1
+
+    def solve(self):
+        """Search for a solution.
+
+        Returns:
+            SolverResult: The outcome of the search.
+        """
+        import multiprocessing
+        import queue
+
+        start_time = time.monotonic()
+        game = self.game
+        jobs = self.jobs
+        level = _Level(game, self.deadlocks)
+
+        if game.player is None:
+            return SolverResult(SolverResult.UNSOLVABLE)
+        boxes = frozenset(level.index(box) for box in game.boxes)
+        if len(boxes) != len(level.goals):
+            return SolverResult(SolverResult.UNSOLVABLE)
+        h = _GoalMatching(level, boxes).cost
+        if h == INF:
+            return SolverResult(SolverResult.UNSOLVABLE)
+        box_hash = 0
+        for box in boxes:
+            box_hash ^= level.box_keys[box]
+
+        context = multiprocessing.get_context()
+        inboxes = [context.Queue() for _ in range(jobs)]
+        results = context.Queue()
+        # Number of states generated but not yet expanded or discarded.
+        outstanding = context.Value("q", 1)
+        idle = context.Array("b", jobs, lock=False)
+        expanded = context.Array("q", jobs, lock=False)
+        deadlocks_path = None if self.deadlocks is None else self.deadlocks.path
+        workers = [
+            context.Process(
+                target=_parallel_worker,
+                args=(
+                    rank,
+                    str(game),
+                    deadlocks_path,
+                    inboxes,
+                    results,
+                    outstanding,
+                    idle,
+                    expanded,
+                ),
+                daemon=True,
+            )
+            for rank in range(jobs)
+        ]
+        for worker in workers:
+            worker.start()
+        root = (0, boxes, box_hash, level.index(game.player), None, None, None)
+        inboxes[box_hash % jobs].put(("nodes", [(h, root)]))
+
+        status = None
+        while status is None:
+            try:
+                message = results.get(timeout=0.01)
+            except queue.Empty:
+                message = None
+            nodes = sum(expanded)
+            if message is not None and message[0] == "solved":
+                status = SolverResult.SOLVED
+            # Flags are read before the counter: a worker only leaves idle
+            # on receiving states, which the counter covers until they and
+            # all their successors are expanded.
+            elif all(idle) and outstanding.value == 0:
+                status = SolverResult.UNSOLVABLE
+            elif (self.max_nodes is not None and nodes >= self.max_nodes) or (
+                self.time_limit is not None
+                and time.monotonic() - start_time >= self.time_limit
+            ):
+                status = SolverResult.LIMIT
+            elif not all(worker.is_alive() for worker in workers):
+                status = SolverResult.LIMIT
+        for inbox in inboxes:
+            inbox.put(("stop",))
+
+        moves = None
+        if status == SolverResult.SOLVED:
+            # Follow the parent links back to the root, asking each owner.
+            _, owner, key = message
+            pushes = []
+            while True:
+                inboxes[owner].put(("trace", key))
+                message = results.get()
+                while message[0] != "trace":
+                    message = results.get()
+                _, parent, push = message
+                if parent is None:
+                    break
+                pushes.append(push)
+                owner, key = parent
+            pushes.reverse()
+            moves = self._emit(level, game, pushes)
+
+        for inbox in inboxes:
+            inbox.put(("exit",))
+        for worker in workers:
+            worker.join(1.0)
+            if worker.is_alive():
+                worker.terminate()
+
+        elapsed = time.monotonic() - start_time
+        npush = None if moves is None else len(pushes)
+        return SolverResult(status, moves, sum(expanded), elapsed, npush)
+
+
+def _parallel_worker(
+    rank, level_string, deadlocks_path, inboxes, results, outstanding, idle, expanded
+):
+    """Run one worker of `ParallelSolver` until told to exit.
+
+    Nodes are `(g, boxes, box_hash, player, parent, push, matching)`, where
+    `parent` is `(owner, key)` of the state the push was made from. Nodes sent
+    to other workers carry no matching, which is rebuilt on expansion rather
+    than pickled with its distance tables. `outstanding` only
+    changes when the worker flushes its outboxes, and always before it sends
+    them, so it can only drop to zero once every worker is out of states.
+    """
+    import queue
+
+    deadlocks = None
+    if deadlocks_path is not None:
+        from .patterns import DeadlockDatabase
+
+        deadlocks = DeadlockDatabase(deadlocks_path)
+    level = _Level(Sokoban(level_string), deadlocks)
+    jobs = len(inboxes)
+    inbox = inboxes[rank]
+    for other in inboxes + [results]:
+        other.cancel_join_thread()
+    outboxes = [[] for _ in range(jobs)]
+    heap = []
+    closed = {}
+    tie = 0
+    delta = 0
+    nodes = 0
+
+    def flush():
+        nonlocal delta
+        if delta:
+            with outstanding.get_lock():
+                outstanding.value += delta
+            delta = 0
+        for owner, batch in enumerate(outboxes):
+            if batch:
+                inboxes[owner].put(("nodes", batch))
+                outboxes[owner] = []
+        expanded[rank] = nodes
+
+    solved = False
+    while not solved:
+        if heap:
+            try:
+                message = inbox.get_nowait()
+            except queue.Empty:
+                message = None
+        else:
+            flush()
+            idle[rank] = 1
+            message = inbox.get()
+        if message is not None:
+            if message[0] != "nodes":
+                break
+            idle[rank] = 0
+            for h, node in message[1]:
+                tie += 1
+                heapq.heappush(heap, (node[0] + h, h, tie, node))
+            continue
+
+        for _ in range(64):
+            if not heap:
+                break
+            _, h, _, node = heapq.heappop(heap)
+            delta -= 1
+            g, boxes, box_hash, player, parent, push, matching = node
+            reach = level.reach(boxes, player)
+            key = box_hash ^ level.player_keys[reach.index(1)]
+            seen = closed.get(key)
+            if seen is not None and seen[0] <= g:
+                continue
+            closed[key] = (g, parent, push)
+
+            if h == 0:
+                results.put(("solved", rank, key))
+                solved = True
+                break
+            nodes += 1
+            if matching is None:
+                matching = _GoalMatching(level, boxes)
+
+            for new_boxes, new_hash, _, box, d in level.successors(
+                boxes, box_hash, h, reach
+            ):
+                new_matching = matching.push(box, box + level.offsets[d])
+                new_h = new_matching.cost
+                if new_h == INF:
+                    continue
+                link = (rank, key)
+                delta += 1
+                owner = new_hash % jobs
+                if owner == rank:
+                    child = (g + 1, new_boxes, new_hash, box, link, (box, d))
+                    tie += 1
+                    heapq.heappush(
+                        heap, (g + 1 + new_h, new_h, tie, child + (new_matching,))
+                    )
+                else:
+                    child = (g + 1, new_boxes, new_hash, box, link, (box, d), None)
+                    outboxes[owner].append((new_h, child))
+        flush()
+
+    # Answer parent lookups for the solution trace.
+    while True:
+        message = inbox.get()
+        if message[0] == "trace":
+            _, parent, push = closed[message[1]]
+            results.put(("trace", parent, push))
+        elif message[0] == "exit":
+            return
+
+
+class BidirectionalSolver(Solver):
+    """Best-first search from both ends, meeting in the middle.
+
+    The forward search pushes boxes from the start, with the pruning and
+    heuristic of `Solver`. The backward search pulls boxes off the goals, from
+    every region the player can end in, guided by the best assignment of
+    boxes to the start cells they must be pulled back to. Both key states by
+    their box layout and normalised player region, as `Solver` does for
+    `PUSHES`, and the side with the smaller open list is expanded next. The
+    search stops as soon as a state taken from one open list was already
+    expanded by the other side: the forward pushes to it, then the pushes
+    undone by the backward pulls from it, solve the level.
+
+    Each side only has to search about half as deep, which pays off on long
+    levels where the boxes travel far between few choices. The solution is
+    not proven optimal.
+
+    Attributes:
+        game (Sokoban): The game to solve, searched from its current state.
+        max_nodes (int | None): Maximum number of states to expand, in total.
+        time_limit (float | None): Maximum search time in seconds.
+        deadlocks (DeadlockDatabase | None): Deadlocked box pairs of the level,
+            pruned by the forward search.
+    """
+
+    def __init__(self, game, max_nodes=None, time_limit=None, deadlocks=None):
+        """Initialize a BidirectionalSolver instance.
+
+        Args:
+            game (Sokoban): The game to solve, searched from its current state.
+            max_nodes (int | None): Maximum number of states to expand; None for unlimited.
+            time_limit (float | None): Maximum search time in seconds; None for unlimited.
+            deadlocks (DeadlockDatabase | None): Deadlocked box pairs of the
+                level, from `sokobanpy.patterns`.
+
+        Raises:
+            ValueError: If `deadlocks` belongs to another level.
+        """
+        super().__init__(game, max_nodes, time_limit, deadlocks=deadlocks)
+
+    def solve(self):
+        """Search for a solution.
+
+        Returns:
+            SolverResult: The outcome of the search.
+        """
+        start_time = time.monotonic()
+        game = self.game
+        level = _Level(game, self.deadlocks)
+        goals = level.goals
+        box_keys = level.box_keys
+        offsets = level.offsets
+
+        if game.player is None:
+            return SolverResult(SolverResult.UNSOLVABLE)
+
+        boxes = frozenset(level.index(box) for box in game.boxes)
+        player = level.index(game.player)
+        if len(boxes) != len(goals):
+            return SolverResult(SolverResult.UNSOLVABLE)
+
+        # The backward search matches boxes to the start cells instead of goals.
+        columns = [level._push_distances(start) for start in sorted(boxes)]
+        start_costs = [
+            tuple(column[i] for column in columns) for i in range(level.size)
+        ]
+        matching = _GoalMatching(level, boxes)
+        back_matching = _GoalMatching(level, goals, start_costs)
+        if matching.cost == INF or back_matching.cost == INF:
+            return SolverResult(SolverResult.UNSOLVABLE)
+
+        box_hash = 0
+        for box in boxes:
+            box_hash ^= box_keys[box]
+        goal_hash = 0
+        for goal in goals:
+            goal_hash ^= box_keys[goal]
+
+        # Heap entries are (f, h, tie, pushes, node) and nodes are
+        # (boxes, box_hash, player, parent_node, push, matching) with
+        # push = (box, direction). A backward node's push takes its state to
+        # its parent's.
+        h = matching.cost
+        forward = [(h, h, 0, 0, (boxes, box_hash, player, None, None, matching))]
+        backward = []
+        h = back_matching.cost
+        tie = 0
+        # One root per region the player can end in, within walking distance
+        # of the start when no box is in the way.
+        area = level.reach((), player)
+        covered = bytearray(level.size)
+        for cell in range(level.size):
+            if area[cell] and cell not in goals and not covered[cell]:
+                reach = level.reach(goals, cell)
+                for i in range(level.size):
+                    covered[i] |= reach[i]
+                tie += 1
+                backward.append(
+                    (h, h, tie, 0, (goals, goal_hash, cell, None, None, back_matching))
+                )
+
+        heaps = (forward, backward)
+        closed = ({}, {})
+        nodes = 0
+
+        # The forward side goes first, so the start state is expanded before
+        # the backward side can reach it.
+        while forward and backward:
+            side = 0 if len(forward) <= len(backward) else 1
+            f, h, _, npush, node = heapq.heappop(heaps[side])
+            boxes, box_hash, player, _, _, matching = node
+            reach = level.reach(boxes, player)
+            key = box_hash ^ level.player_keys[reach.index(1)]
+            if key in closed[side]:
+                continue
+            closed[side][key] = node
+
+            if (side == 0 and h == 0) or key in closed[1 - side]:
+                ends = (node, closed[1].get(key))
+                if side == 1:
+                    ends = (closed[0][key], node)
+                pushes = []
+                node = ends[0]
+                while node[4] is not None:
+                    pushes.append(node[4])
+                    node = node[3]
+                pushes.reverse()
+                node = ends[1]
+                while node is not None and node[4] is not None:
+                    pushes.append(node[4])
+                    node = node[3]
+                moves = self._emit(level, game, pushes)
+                elapsed = time.monotonic() - start_time
+                return SolverResult(
+                    SolverResult.SOLVED, moves, nodes, elapsed, len(pushes)
+                )
+
+            if (self.max_nodes is not None and nodes >= self.max_nodes) or (
+                self.time_limit is not None
+                and time.monotonic() - start_time >= self.time_limit
+            ):
+                elapsed = time.monotonic() - start_time
+                return SolverResult(SolverResult.LIMIT, None, nodes, elapsed)
+            nodes += 1
+
+            if side == 0:
+                for new_boxes, new_hash, _, box, d in level.successors(
+                    boxes, box_hash, h, reach
+                ):
+                    new_matching = matching.push(box, box + offsets[d])
+                    new_h = new_matching.cost
+                    if new_h == INF:
+                        continue
+                    tie += 1
+                    heapq.heappush(
+                        forward,
+                        (
+                            npush + 1 + new_h,
+                            new_h,
+                            tie,
+                            npush + 1,
+                            (new_boxes, new_hash, box, node, (box, d), new_matching),
+                        ),
+                    )
+            else:
+                for new_boxes, new_hash, new_player, box, d in level.predecessors(
+                    boxes, box_hash, reach
+                ):
+                    new_matching = matching.push(box + offsets[d], box)
+                    new_h = new_matching.cost
+                    # No start cell can be reached from here.
+                    if new_h == INF:
+                        continue
+                    tie += 1
+                    heapq.heappush(
+                        backward,
+                        (
+                            npush + 1 + new_h,
+                            new_h,
+                            tie,
+                            npush + 1,
+                            (
+                                new_boxes,
+                                new_hash,
+                                new_player,
+                                node,
+                                (box, d),
+                                new_matching,
+                            ),
+                        ),
+                    )
+
+        elapsed = time.monotonic() - start_time
+        return SolverResult(SolverResult.UNSOLVABLE, None, nodes, elapsed)
+
+
+def solve(
+    game,
+    max_nodes=None,
+    time_limit=None,
+    jobs=1,
+    max_bytes=None,
+    optimize=None,
+    deadlocks=None,
+    bidirectional=False,
+    macros=False,
+    table_policy=TranspositionTable.DEPTH,
+):
+    """Solve a Sokoban game from its current state.
+
+    Args:
+        game (Sokoban): The game to solve.
+        max_nodes (int | None): Maximum number of states to expand; None for unlimited.
+        time_limit (float | None): Maximum search time in seconds; None for unlimited.
+        jobs (int | None): Number of worker processes; 1 searches in this
+            process with `Solver`, more or None use `ParallelSolver`.
+        max_bytes (int | None): Memory budget of the visited states of `Solver`;
+            None for unbounded.
+        optimize (str | None): Metric the solution must be optimal for, one of
+            the `Solver` modes; None for any solution, which is push-optimal
+            when `jobs` is 1.
+        deadlocks (DeadlockDatabase | None): Deadlocked box pairs of the level,
+            from `sokobanpy.patterns`.
+        bidirectional (bool): Search from both the start and the goals with
+            `BidirectionalSolver`, in this process.
+        macros (bool): Push boxes through tunnels and into the goal room as
+            single transitions of `Solver`, which then proves nothing optimal.
+        table_policy (str): Replacement policy of the visited states of
+            `Solver` with `max_bytes`, `TranspositionTable.DEPTH` or `AGE`.
+
+    Returns:
+        SolverResult: The outcome of the search.
+
+    Raises:
+        ValueError: If `optimize` is unknown, or given with `jobs` other than 1,
+            `bidirectional` or `macros`, as none of them proves optimality; or
+            if `bidirectional` or `macros` is given with `jobs` other than 1,
+            or both are given.
+    """
+    if macros:
+        if optimize is not None:
+            raise ValueError("optimal solutions need macros=False")
+        if jobs != 1 or bidirectional:
+            raise ValueError("macro pushes need jobs=1 and bidirectional=False")
+        return Solver(
+            game,
+            max_nodes,
+            time_limit,
+            max_bytes,
+            deadlocks=deadlocks,
+            macros=True,
+            table_policy=table_policy,
+        ).solve()
+    if bidirectional:
+        if optimize is not None:
+            raise ValueError("optimal solutions need bidirectional=False")
+        if jobs != 1:
+            raise ValueError("bidirectional search needs jobs=1")
+        return BidirectionalSolver(game, max_nodes, time_limit, deadlocks).solve()
+    if jobs == 1:
+        return Solver(
+            game,
+            max_nodes,
+            time_limit,
+            max_bytes,
+            optimize or Solver.PUSHES,
+            deadlocks=deadlocks,
+            table_policy=table_policy,
+        ).solve()
+    if optimize is not None:
+        raise ValueError("optimal solutions need jobs=1")
+    return ParallelSolver(game, jobs, max_nodes, time_limit, deadlocks).solve()
+
+
+def _limit_memory(memory_limit):
+    """Cap the address space of a worker process, where supported."""
+    try:
+        import resource
+    except ImportError:
+        return
+    resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+
+
+def _solve_level(level_string, max_nodes, time_limit, optimize, deadlock_dir):
+    """Solve one level in a worker process."""
+    try:
+        game = CompactSokoban(level_string)
+        if deadlock_dir is None:
+            return solve(game, max_nodes, time_limit, optimize=optimize)
+
+        from .patterns import DeadlockDatabase
+
+        with DeadlockDatabase.open(game, deadlock_dir) as deadlocks:
+            return solve(
+                game, max_nodes, time_limit, optimize=optimize, deadlocks=deadlocks
+            )
+    except MemoryError:
+        return SolverResult(SolverResult.LIMIT)
+
+
+def solve_collection(
+    path,
+    jobs=None,
+    time_limit=None,
+    max_nodes=None,
+    memory_limit=None,
+    optimize=None,
+    deadlock_dir=None,
+):
+    """Solve every level of an `.slc` collection across worker processes.
+
+    Results are yielded as soon as each level finishes, so they come out of
+    order. At most `jobs` levels are in flight at a time. If a worker dies, for
+    example killed for running out of memory, the pool is replaced; the levels
+    that were in flight are retried one at a time in a pool of their own, and
+    a level that kills its worker again is reported as `LIMIT`.
+
+    Args:
+        path (str | os.PathLike): Path of the collection file.
+        jobs (int | None): Number of worker processes; None for one per CPU.
+        time_limit (float | None): Maximum search time per level in seconds.
+        max_nodes (int | None): Maximum number of states expanded per level.
+        memory_limit (int | None): Maximum address space per worker in bytes,
+            enforced on platforms with the `resource` module; None for no limit.
+        optimize (str | None): Metric each solution must be optimal for; see
+            `solve`.
+        deadlock_dir (str | os.PathLike | None): Cache directory of deadlock
+            databases, from `sokobanpy.patterns`; each level's database is
+            built there on first use and mapped by later runs. None to solve
+            without them.
+
+    Yields:
+        tuple[int, SolverResult]: Index of the level in the collection and
+            the outcome of its search.
+    """
+    from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+    from concurrent.futures.process import BrokenProcessPool
+    import os
+
+    from .collections import SokobanCollection
+
+    levels = SokobanCollection(path)
+    jobs = jobs or os.cpu_count() or 1
+    initializer = None if memory_limit is None else _limit_memory
+    initargs = () if memory_limit is None else (memory_limit,)
+
+    def run(indices, workers):
+        # Yield (index, result) pairs and return the indices lost to broken pools.
+        pending = list(reversed(indices))
+        lost = []
+        while pending:
+            with ProcessPoolExecutor(
+                workers, initializer=initializer, initargs=initargs
+            ) as pool:
+                futures = {}
+                while pending or futures:
+                    while pending and len(futures) < workers:
+                        index = pending.pop()
+                        future = pool.submit(
+                            _solve_level,
+                            levels.level_string(index),
+                            max_nodes,
+                            time_limit,
+                            optimize,
+                            deadlock_dir,
+                        )
+                        futures[future] = index
+                    done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                    try:
+                        for future in done:
+                            result = future.result()
+                            yield futures.pop(future), result
+                    except BrokenProcessPool:
+                        lost.extend(futures.values())
+                        break
+        return lost
+
+    lost = yield from run(range(len(levels)), jobs)
+    for index in sorted(lost):
+        if (yield from run([index], 1)):
+            yield index, SolverResult(SolverResult.LIMIT)
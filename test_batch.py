@@ -0,0 +1,45 @@
+import random
+
+import pytest
+
+from sokobanpy import Sokoban
+
+np = pytest.importorskip("numpy")
+
+from sokobanpy.batch import SokobanBatch
+
+from test_sokobanpy import LEVEL_STRING
+
+
+def test_SokobanBatch():
+    small = "#####\n#@$.#\n#####"
+    batch = SokobanBatch([LEVEL_STRING, small, Sokoban()])
+    games = [Sokoban(LEVEL_STRING), Sokoban(small), Sokoban()]
+    assert batch.n == 3
+    assert batch.nrow == games[0].nrow and batch.ncol == games[0].ncol
+    for i, game in enumerate(games):
+        assert str(batch.to_sokoban(i)) == str(game)
+
+    # The small level is solved by a single push to the right.
+    moved, pushed, solved, reward = batch.step([0, 0, 0])
+    assert list(solved) == [False, True, False]
+    assert pushed[1] and reward[1] == pytest.approx(-0.1 + 1.0 + 10.0)
+
+    rng = random.Random(0)
+    batch = SokobanBatch.from_level(LEVEL_STRING, 16)
+    games = [Sokoban(LEVEL_STRING) for _ in range(16)]
+    for _ in range(300):
+        actions = [rng.randrange(4) for _ in games]
+        moved, pushed, solved, _ = batch.step(actions)
+        for i, game in enumerate(games):
+            npush = game.npush
+            assert moved[i] == game.move(Sokoban.DIRECTIONS[actions[i]])
+            assert pushed[i] == (game.npush > npush)
+            assert solved[i] == game.is_solved()
+    for i, game in enumerate(games):
+        copy = batch.to_sokoban(i)
+        assert str(copy) == str(game)
+        assert (copy.nmove, copy.npush) == (game.nmove, game.npush)
+
+    with pytest.raises(ValueError):
+        SokobanBatch([])
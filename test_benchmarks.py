@@ -0,0 +1,29 @@
+import json
+
+from benchmarks.run import BENCHMARKS, compare, run_benchmarks
+
+
+def test_benchmarks():
+    names = [name for name, _ in BENCHMARKS]
+    assert len(names) == len(set(names))
+
+    report = run_benchmarks(["parse", "move_undo", "find_path"], repeat=1, min_time=0)
+    assert set(report["results"]) == {
+        "parse",
+        "move_undo[Sokoban]",
+        "move_undo[CompactSokoban]",
+        "find_path_small[Sokoban]",
+        "find_path_small[CompactSokoban]",
+        "find_path_large[Sokoban]",
+        "find_path_large[CompactSokoban]",
+    }
+    assert all(result["ops_per_sec"] > 0 for result in report["results"].values())
+    assert json.loads(json.dumps(report)) == report
+
+    slower = json.loads(json.dumps(report))
+    slower["results"]["parse"]["ops_per_sec"] *= 2
+    del slower["results"]["move_undo[Sokoban]"]
+    rows = {row[0]: row for row in compare(slower, report, threshold=0.1)}
+    assert "move_undo[Sokoban]" not in rows
+    assert rows["parse"][3] == 0.5 and rows["parse"][4]
+    assert not rows["find_path_small[Sokoban]"][4]
@@ -0,0 +1,37 @@
+from pathlib import Path
+
+import pytest
+
+from sokobanpy import CompactSokoban
+from sokobanpy.collections import SokobanCollection
+
+from test_solver import COLLECTION_PATH, load_levels
+
+
+def test_SokobanCollection(tmp_path):
+    for name in ("0Beginner.slc", "Novoban.slc"):
+        collection = SokobanCollection(COLLECTION_PATH / name)
+        level_strings = load_levels(name)
+        assert collection.title == Path(name).stem
+        assert len(collection) == len(level_strings)
+        for i, level_string in enumerate(level_strings):
+            assert collection.level_string(i) == level_string
+            assert collection.level_string(collection.ids[i]) == level_string
+
+    game = collection.load(-1, CompactSokoban, undo_limit=8)
+    assert isinstance(game, CompactSokoban) and game.undo_limit == 8
+    assert str(game) == str(collection[collection.ids[-1]])
+    assert len(list(collection)) == len(collection)
+    with pytest.raises(KeyError):
+        collection.level_string("no such level")
+
+    path = tmp_path / "broken.slc"
+    path.write_text(
+        '<?xml version="1.0" encoding="utf-8"?>\n<SokobanLevels>'
+        + '<LevelCollection><Level Id="a"><L>#####</L><L>#@$.#</L>'
+        + '<L>#####</L></Level><Level Id="b"/></LevelCollection></SokobanLevels>'
+    )
+    collection = SokobanCollection(path)
+    assert collection.ids == ["a", "b"]
+    assert collection.level_string("b") == ""
+    assert collection["a"].is_solved() is False
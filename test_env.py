@@ -0,0 +1,66 @@
+import random
+
+import pytest
+
+from sokobanpy import Sokoban
+
+np = pytest.importorskip("numpy")
+
+from sokobanpy.env import SokobanEnv
+
+from test_sokobanpy import LEVEL_STRING
+
+
+def expected_observation(game):
+    chars = (
+        {Sokoban.WALL},
+        {Sokoban.GOAL, Sokoban.BOX_IN_GOAL, Sokoban.PLAYER_IN_GOAL},
+        {Sokoban.BOX, Sokoban.BOX_IN_GOAL},
+        {Sokoban.PLAYER, Sokoban.PLAYER_IN_GOAL},
+    )
+    grid = game.to_grid()
+    return np.array(
+        [[[char in channel for char in row] for row in grid] for channel in chars],
+        dtype=np.uint8,
+    )
+
+
+def test_SokobanEnv():
+    env = SokobanEnv(LEVEL_STRING, max_steps=200)
+    observation, info = env.reset()
+    assert observation.shape == (4, env.game.nrow, env.game.ncol)
+    assert (observation == expected_observation(env.game)).all()
+    assert env.board.shape == (env.game.nrow + 2, env.game.ncol + 2)
+    assert info["nbox_in_goal"] == 0 and not info["solved"]
+
+    rng = random.Random(0)
+    for nstep in range(1, 201):
+        new_observation, _, terminated, truncated, _ = env.step(rng.randrange(4))
+        assert new_observation is observation
+        assert not terminated
+        assert truncated == (nstep == 200)
+    assert (observation == expected_observation(env.game)).all()
+    assert len(env.game.history) == 0
+
+    env.reset("#####\n#@$.#\n#####")
+    observation, reward, terminated, truncated, info = env.step(0)
+    assert terminated and not truncated and info["pushed"]
+    assert reward == pytest.approx(-0.1 + 1.0 + 10.0)
+    assert (observation == expected_observation(env.game)).all()
+
+    # A level solved from the start ends on the first step, even without a push.
+    _, info = env.reset("#####\n#@ *#\n#####")
+    assert info["solved"]
+    _, reward, terminated, truncated, info = env.step(2)
+    assert terminated and not truncated and info["solved"] and not info["moved"]
+    assert reward == pytest.approx(-0.1 + 10.0)
+
+    env = SokobanEnv(undo_limit=None)
+    observation, _ = env.reset(seed=0, options={"level_string": LEVEL_STRING})
+    assert env.step(3)[4]["moved"]
+    assert env.game.undo()
+    assert env.refresh() is observation
+    assert (observation == expected_observation(env.game)).all()
+
+    with pytest.raises(ValueError):
+        env.reset("#####\n# $.#\n#####")
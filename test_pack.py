@@ -0,0 +1,40 @@
+from pathlib import Path
+
+import pytest
+
+from sokobanpy import Sokoban, CompactSokoban
+from sokobanpy.pack import SokobanPack, convert
+
+from test_solver import COLLECTION_PATH, load_levels
+
+TXT_LEVELS_PATH = Path(__file__).parent / "examples" / "example03" / "levels"
+
+
+def test_SokobanPack(tmp_path):
+    path = tmp_path / "levels.pack"
+    txt_paths = sorted(TXT_LEVELS_PATH.glob("*.txt"))[:3]
+    level_strings = load_levels("Novoban.slc") + [
+        txt_path.read_text() for txt_path in txt_paths
+    ]
+    assert convert([COLLECTION_PATH / "Novoban.slc"] + txt_paths, path) == len(
+        level_strings
+    )
+
+    with SokobanPack(path) as pack:
+        assert len(pack) == len(level_strings)
+        for i, level_string in enumerate(level_strings):
+            game = pack[i]
+            expected = Sokoban(level_string)
+            assert str(game) == str(expected)
+            assert game.dead_squares == expected.dead_squares
+            assert str(Sokoban(pack.level_string(i))) == str(expected)
+
+        game = pack.load(-1, CompactSokoban, undo_limit=4)
+        assert isinstance(game, CompactSokoban) and game.undo_limit == 4
+        assert str(game) == str(Sokoban(level_strings[-1]))
+        with pytest.raises(IndexError):
+            pack.grid(len(level_strings))
+
+    path.write_bytes(b"not a pack")
+    with pytest.raises(ValueError):
+        SokobanPack(path)
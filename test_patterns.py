@@ -0,0 +1,109 @@
+from collections import deque
+
+import pytest
+
+from sokobanpy import Sokoban, CompactSokoban, Solver, solve, solve_collection
+from sokobanpy.patterns import DeadlockDatabase, find_deadlocked_pairs, level_key
+from sokobanpy.solver import INF, _Level
+
+from test_solver import COLLECTION_PATH, load_levels
+
+
+def solvable_pair(level, box_a, box_b):
+    # Push the two boxes forward from every player position.
+    floor = [i for i in range(level.size) if level.floor[i]]
+    queue = deque(
+        (frozenset((box_a, box_b)), player)
+        for player in floor
+        if player not in (box_a, box_b)
+    )
+    seen = set()
+    while queue:
+        boxes, player = queue.popleft()
+        reach = level.reach(boxes, player)
+        if (boxes, reach.index(1)) in seen:
+            continue
+        seen.add((boxes, reach.index(1)))
+        if boxes <= level.goals:
+            return True
+        for box in boxes:
+            for offset in level.offsets:
+                new_box = box + offset
+                if reach[box - offset] and level.floor[new_box]:
+                    if new_box not in boxes:
+                        queue.append((boxes - {box} | {new_box}, box))
+    return False
+
+
+def test_find_deadlocked_pairs():
+    ndeadlocked = 0
+    for level_string in load_levels("Novoban.slc")[5:8]:
+        level = _Level(Sokoban(level_string))
+        bits = find_deadlocked_pairs(Sokoban(level_string))
+        live = [i for i in range(level.size) if level.distances[i] != INF]
+        for i, box_a in enumerate(live):
+            for box_b in live[i + 1 :]:
+                index = box_a * level.size + box_b
+                deadlocked = bool(bits[index >> 3] >> (index & 7) & 1)
+                assert deadlocked != solvable_pair(level, box_a, box_b)
+                ndeadlocked += deadlocked
+    assert ndeadlocked
+
+
+def test_DeadlockDatabase(tmp_path):
+    level_strings = load_levels("Novoban.slc")
+    game = Sokoban(level_strings[15])
+    assert level_key(game) == level_key(CompactSokoban(level_strings[15]))
+    game.move(Sokoban.UP)
+    assert level_key(game) == level_key(CompactSokoban(level_strings[15]))
+    assert level_key(game) != level_key(Sokoban(level_strings[16]))
+
+    with DeadlockDatabase.open(game, tmp_path / "cache") as deadlocks:
+        assert deadlocks.key == level_key(game)
+        path = deadlocks.path
+        mtime = path.stat().st_mtime_ns
+        level = _Level(game)
+        pairs = [
+            (box_a, box_b)
+            for box_a in range(level.size)
+            for box_b in range(level.size)
+            if deadlocks.is_deadlocked(box_a, box_b)
+        ]
+        assert pairs and all((b, a) in pairs for a, b in pairs)
+
+        result = solve(Sokoban(level_strings[15]), deadlocks=deadlocks)
+        plain = Solver(Sokoban(level_strings[15])).solve()
+        assert result.npush == plain.npush and result.nodes < plain.nodes
+        with pytest.raises(ValueError):
+            Solver(Sokoban(level_strings[16]), deadlocks=deadlocks)
+
+    with DeadlockDatabase.open(game, tmp_path / "cache") as deadlocks:
+        assert deadlocks.path == path and path.stat().st_mtime_ns == mtime
+
+    # A truncated cache file, as from an interrupted write, is rebuilt.
+    data = path.read_bytes()
+    path.write_bytes(data[: len(data) // 2])
+    with pytest.raises(ValueError):
+        DeadlockDatabase(path)
+    with DeadlockDatabase.open(game, tmp_path / "cache") as deadlocks:
+        assert deadlocks.key == level_key(game)
+    assert path.read_bytes() == data
+    assert not list(path.parent.glob("*.tmp"))
+
+    path.write_bytes(b"")
+    with DeadlockDatabase.open(game, tmp_path / "cache") as deadlocks:
+        assert deadlocks.is_deadlocked(*pairs[0])
+
+    path.write_bytes(b"not a database")
+    with pytest.raises(ValueError):
+        DeadlockDatabase(path)
+
+    results = dict(
+        solve_collection(
+            COLLECTION_PATH / "0Beginner.slc",
+            jobs=2,
+            deadlock_dir=tmp_path / "collection",
+        )
+    )
+    assert all(result.status == "solved" for result in results.values())
+    assert len(list((tmp_path / "collection").glob("*.sokd"))) == len(results)
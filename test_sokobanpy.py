@@ -1,4 +1,31 @@
-from sokobanpy import SokobanVector, Sokoban
+import random
+
+import pytest
+
+from sokobanpy import (
+    SokobanVector,
+    SokobanVectorPool,
+    SokobanHistory,
+    SokobanStats,
+    LevelTemplate,
+    Sokoban,
+    CompactSokoban,
+)
+
+LEVEL_STRING = (
+    ""
+    + "    #####\n"
+    + "    #   #\n"
+    + "    #$  #\n"
+    + "  ###  $##\n"
+    + "  #  $ $ #\n"
+    + "### # ## #   ######\n"
+    + "#   # ## #####  ..#\n"
+    + "# $  $          ..#\n"
+    + "##### ### #@##  ..#\n"
+    + "    #     #########\n"
+    + "    #######\n"
+)
 
 
 def test_SokobanVector():
@@ -16,6 +43,27 @@ def test_SokobanVector():
     assert hash(sv5) == hash((-40, -80))
 
 
+def test_SokobanVectorPool():
+    pool = SokobanVectorPool.get(5, 10)
+
+    assert SokobanVectorPool.get(5, 10) is pool
+    assert len(pool.cells) == 50
+    assert pool.cell(2, 3) == SokobanVector(2, 3)
+    assert pool.cell(2, 3) is pool.cells[23]
+    assert pool.cell(5, 0) is None and pool.cell(0, -1) is None
+    assert pool.neighbours[Sokoban.RIGHT][pool.cell(2, 3)] is pool.cell(2, 4)
+    assert pool.neighbours[Sokoban.UP][pool.cell(0, 3)] is None
+
+    game = Sokoban()
+    player = game.player
+    game.move(Sokoban.LEFT)
+    game.move(Sokoban.RIGHT)
+
+    assert game.player is player is pool.cell(2, 6)
+    assert all(box is pool.cell(box.r, box.c) for box in game.boxes)
+    assert CompactSokoban().player is player
+
+
 def test_Sockban():
     game = Sokoban(undo_limit=5)
 
@@ -93,3 +141,515 @@ def test_Sockban():
     assert game.nrow == 5 and game.ncol == 10
     assert game.nmove == 9 and game.npush == 3
     assert len(game.history) == 9
+
+
+def test_CompactSokoban():
+    game = CompactSokoban(undo_limit=5)
+    reference = Sokoban(undo_limit=5)
+
+    assert str(game) == str(reference)
+    assert game.to_grid() == reference.to_grid()
+    assert game.player == reference.player
+    assert game.walls == reference.walls
+    assert game.goals == reference.goals
+    assert game.boxes == reference.boxes
+    assert all(game.can_move(direction) for direction in Sokoban.DIRECTION_SET)
+    assert not game.can_move(SokobanVector(0, 2))
+
+    for position in game.find_path(SokobanVector(1, 1)):
+        game.move(position - game.player)
+
+    assert game.player == SokobanVector(1, 1)
+    assert not game.can_move(Sokoban.LEFT)
+    assert not game.can_move(Sokoban.UP)
+    assert len(game.history) == 5
+
+    while game.undo():
+        pass
+
+    assert len(game.history) == 0
+    assert game.find_path(SokobanVector(2, 3)) is None
+    assert game.find_path(SokobanVector(0, 0)) is None
+
+    game = CompactSokoban()
+
+    for position in game.find_path(SokobanVector(2, 2)):
+        game.move(position - game.player)
+
+    assert not game.is_solved()
+
+    for i in range(3):
+        game.move(Sokoban.RIGHT)
+
+    assert game.is_solved()
+    assert game.nrow == 5 and game.ncol == 10
+    assert game.nmove == 9 and game.npush == 3
+
+
+def test_CompactSokoban_random_walk():
+    rng = random.Random(0)
+    directions = [Sokoban.RIGHT, Sokoban.DOWN, Sokoban.LEFT, Sokoban.UP]
+    game = CompactSokoban(LEVEL_STRING)
+    reference = Sokoban(LEVEL_STRING)
+
+    for i in range(2000):
+        if rng.random() < 0.2:
+            assert game.undo() == reference.undo()
+        else:
+            direction = rng.choice(directions)
+            assert game.can_move(direction) == reference.can_move(direction)
+            assert game.move(direction) == reference.move(direction)
+        assert game.player == reference.player
+        assert game.nmove == reference.nmove
+        assert game.npush == reference.npush
+        assert game.is_solved() == reference.is_solved()
+
+    assert str(game) == str(reference)
+    assert game.boxes == reference.boxes
+
+
+def test_CompactSokoban_shared_layout():
+    rng = random.Random(0)
+    directions = [rng.choice(Sokoban.DIRECTIONS) for _ in range(2000)]
+
+    # Without undo history both engines still make the same moves.
+    game = CompactSokoban(LEVEL_STRING, undo_limit=0)
+    reference = Sokoban(LEVEL_STRING, undo_limit=0)
+    for direction in directions:
+        assert game.move(direction) == reference.move(direction)
+    assert not game.undo() and not reference.undo()
+    assert str(game) == str(reference)
+    assert (game.nmove, game.npush) == (reference.nmove, reference.npush)
+
+    # Boards of one size share their direction and Zobrist tables.
+    a, b = CompactSokoban(LEVEL_STRING), CompactSokoban(LEVEL_STRING)
+    assert a._box_keys is b._box_keys and a._steps is b._steps
+
+
+def test_deadlock():
+    for cls in (Sokoban, CompactSokoban):
+        game = cls("######\n#    #\n# $  #\n#  . #\n#@   #\n######\n")
+
+        assert len(game.dead_squares) == 12
+        assert SokobanVector(1, 1) in game.dead_squares
+        assert SokobanVector(2, 2) not in game.dead_squares
+        assert not game.is_deadlocked()
+
+        game.move(Sokoban.UP)
+        game.move(Sokoban.RIGHT)
+        game.move(Sokoban.UP)
+
+        assert game.boxes == {SokobanVector(1, 2)}
+        assert game.is_deadlocked()
+        assert game.is_deadlocked(SokobanVector(1, 2))
+        assert not game.is_deadlocked(SokobanVector(2, 2))
+
+        game.undo()
+
+        assert not game.is_deadlocked()
+
+        game = cls("#######\n#     #\n# $$  #\n# $$  #\n#  .. #\n#@ .. #\n#######\n")
+
+        assert game.is_deadlocked()
+        assert game.is_deadlocked(SokobanVector(2, 3))
+
+        game = cls("#######\n#     #\n# **  #\n# **  #\n#     #\n#@    #\n#######\n")
+
+        assert not game.is_deadlocked()
+
+        game = cls("#######\n#     #\n# *$  #\n# **  #\n#  .  #\n#@    #\n#######\n")
+
+        assert game.is_deadlocked()
+
+        # The box fences in a corral and can only be pushed into it, onto a
+        # dead square, though it is not frozen.
+        game = cls("#######\n#  #* #\n## $ ##\n# #   #\n#.  @##\n#######\n")
+
+        assert game.is_deadlocked()
+        assert game.is_deadlocked(SokobanVector(2, 3))
+        assert not game.is_deadlocked(SokobanVector(1, 4))
+
+        # A corral with a goal is fine while its box can be pushed in.
+        game = cls("#####\n#.$ #\n## @#\n#####\n")
+
+        assert not game.is_deadlocked()
+
+
+def test_state_hash():
+    game = Sokoban(LEVEL_STRING)
+    compact = CompactSokoban(LEVEL_STRING)
+    start_hash = game.state_hash
+
+    assert compact.state_hash == start_hash
+    assert 0 <= start_hash < 2**64
+
+    for direction in (Sokoban.UP, Sokoban.LEFT, Sokoban.LEFT, Sokoban.DOWN):
+        game.move(direction)
+        compact.move(direction)
+
+    assert game.npush == 0
+    assert game.state_hash == compact.state_hash == start_hash
+
+    for direction in [Sokoban.UP] + [Sokoban.LEFT] * 4:
+        game.move(direction)
+        compact.move(direction)
+
+    assert game.npush == 1
+    assert game.state_hash == compact.state_hash != start_hash
+
+    game.undo()
+    compact.undo()
+
+    assert game.state_hash == compact.state_hash == start_hash
+
+    rng = random.Random(1)
+    directions = [Sokoban.RIGHT, Sokoban.DOWN, Sokoban.LEFT, Sokoban.UP]
+    for i in range(500):
+        direction = rng.choice(directions)
+        game.move(direction)
+        compact.move(direction)
+        assert game.state_hash == compact.state_hash
+
+    assert game.state_hash == Sokoban(str(game)).state_hash
+    while game.undo():
+        pass
+    assert game.state_hash == start_hash
+
+
+def test_find_path_open_board():
+    size = 40
+    level_string = "\n".join(
+        ["#" * size]
+        + ["#" + " " * (size - 2) + "#"] * (size // 2 - 1)
+        + ["#" + " " * (size // 2 - 1) + "@" + " " * (size // 2 - 2) + "#"]
+        + ["#" + " " * (size - 2) + "#"] * (size // 2 - 2)
+        + ["#" * size]
+    )
+
+    for cls in (Sokoban, CompactSokoban):
+        game = cls(level_string)
+        start = game.player
+
+        for target in (SokobanVector(1, 1), SokobanVector(size - 2, size - 2)):
+            path = game.find_path(target)
+            assert path[-1] == target
+            assert len(path) == abs(target.r - start.r) + abs(target.c - start.c)
+            assert game.reachable(target)
+
+        assert game.find_path(start) is None
+        assert game.find_path(SokobanVector(0, 0)) is None
+        assert game.find_path(SokobanVector(-1, 0)) is None
+        assert not game.reachable(SokobanVector(0, 0))
+        assert not game.reachable(SokobanVector(size, size))
+
+
+def test_reachable():
+    for cls in (Sokoban, CompactSokoban):
+        game = cls("#######\n#@$ . #\n#######\n")
+
+        assert game.reachable(game.player)
+        assert not game.reachable(SokobanVector(1, 2))
+        assert not game.reachable(SokobanVector(1, 3))
+        assert game.find_path(SokobanVector(1, 3)) is None
+
+        game.move(Sokoban.RIGHT)
+
+        assert game.reachable(SokobanVector(1, 1))
+        assert not game.reachable(SokobanVector(1, 4))
+
+        game.undo()
+
+        assert not game.reachable(SokobanVector(1, 3))
+
+        game = cls("#######\n#  @  #\n#     #\n#######\n")
+
+        path = game.find_path(SokobanVector(2, 1))
+        for position in path:
+            game.move(position - game.player)
+
+        assert game.player == SokobanVector(2, 1)
+        assert len(game.find_path(SokobanVector(1, 5))) == 5
+        assert game.find_path(SokobanVector(1, 5))[-1] == SokobanVector(1, 5)
+
+
+def test_incremental_rendering():
+    rng = random.Random(2)
+    directions = [Sokoban.RIGHT, Sokoban.DOWN, Sokoban.LEFT, Sokoban.UP]
+
+    for cls in (Sokoban, CompactSokoban):
+        game = cls(LEVEL_STRING)
+        text = str(game)
+        grid = game.to_grid()
+        grid[0][0] = "X"
+
+        assert game.to_grid() != grid
+        assert str(game) == text
+
+        for i in range(1000):
+            if rng.random() < 0.2:
+                game.undo()
+            else:
+                game.move(rng.choice(directions))
+            if i % 3 == 0:
+                painted = game._paint_grid()
+                assert game.to_grid() == painted
+                assert str(game) == "\n".join("".join(row) for row in painted)
+
+
+def test_lurd():
+    rng = random.Random(3)
+
+    for cls in (Sokoban, CompactSokoban):
+        game = cls()
+
+        assert game.apply_moves("ulllldRRR") == 9
+        assert game.is_solved()
+        assert game.nmove == 9 and game.npush == 3
+        assert game.to_lurd() == "ulllldRRR"
+
+        # Strict replay rejects moves whose case disagrees with the board.
+        game = cls()
+
+        assert game.apply_moves("ulllldRRR", strict=True) == 9
+        assert game.is_solved()
+        game = cls()
+        assert game.apply_moves("ulllldRrR", strict=True) == 7
+        assert game.nmove == 7 and game.npush == 1
+        assert game.to_lurd() == "ulllldR"
+        game = cls()
+        assert game.apply_moves("uLllldRRR", strict=True) == 1
+        assert game.apply_moves("lllldrrr") == 8 and game.npush == 3
+
+        game = cls()
+
+        assert game.apply_moves("uuLl") == 1
+        assert game.nmove == 1 and game.to_lurd() == "u"
+        assert game.apply_moves("") == 0
+
+        try:
+            game.apply_moves("lx")
+        except ValueError:
+            pass
+        else:
+            assert False
+        assert game.nmove == 1
+
+        reference = cls(LEVEL_STRING)
+        str(reference)
+        moves = ""
+        while len(moves) < 3000:
+            char = rng.choice("lurd")
+            if reference.move(Sokoban.LURD[char]):
+                moves += char
+        game = cls(LEVEL_STRING)
+        str(game)
+
+        assert game.apply_moves(moves + "u" * 20) >= len(moves)
+        assert game.nmove >= reference.nmove
+        while game.nmove > reference.nmove:
+            game.undo()
+        assert game.npush == reference.npush
+        assert game.state_hash == reference.state_hash
+        assert str(game) == str(reference)
+        assert game.to_lurd() == reference.to_lurd()
+        assert game.to_lurd().lower() == moves
+
+        while game.undo():
+            pass
+
+        assert str(game) == str(cls(LEVEL_STRING))
+
+
+def test_SokobanHistory():
+    history = SokobanHistory([1, 2, 3])
+
+    assert len(history) == 3 and list(history) == [1, 2, 3]
+    assert history[-1] == 3 and history[0] == 1
+    assert history.pop() == 3
+    assert repr(history) == "SokobanHistory([1, 2], maxlen=None)"
+
+    history = SokobanHistory(maxlen=3)
+    for code in range(10):
+        history.append(code)
+        assert len(history) == min(code + 1, 3)
+
+    assert list(history) == [7, 8, 9]
+    assert [history.pop() for i in range(3)] == [9, 8, 7]
+    assert not history
+
+    try:
+        history.pop()
+    except IndexError:
+        pass
+    else:
+        assert False
+
+    history = SokobanHistory([1, 2, 3], maxlen=0)
+
+    assert len(history) == 0
+
+    for cls in (Sokoban, CompactSokoban):
+        game = cls(undo_limit=5)
+        for i in range(100):
+            game.move(Sokoban.LEFT if i % 2 else Sokoban.RIGHT)
+
+        assert len(game.history) == 5
+        assert game.to_lurd() == "lrlrl"
+
+        game = cls(undo_limit=0)
+
+        assert game.move(Sokoban.LEFT)
+        assert len(game.history) == 0
+        assert not game.undo()
+
+
+def test_LevelTemplate():
+    LevelTemplate.clear_cache()
+    template = LevelTemplate.get(LEVEL_STRING)
+    assert LevelTemplate.get(LEVEL_STRING) is template
+    assert (template.nrow, template.ncol, len(template.boxes)) == (11, 19, 6)
+    try:
+        template.player = None
+        assert False
+    except AttributeError:
+        pass
+
+    for cls in (Sokoban, CompactSokoban):
+        game_a = cls(LEVEL_STRING)
+        game_b = cls.from_template(template, undo_limit=10)
+        assert str(game_a) == str(game_b) == str(cls.from_grid(game_a.to_grid()))
+        assert game_a.state_hash == game_b.state_hash
+        assert game_a.dead_squares is game_b.dead_squares is template.dead_squares
+        assert game_b.history.maxlen == 10
+        game_b.move(Sokoban.UP)
+        assert str(game_a) != str(game_b)
+    assert Sokoban(LEVEL_STRING).walls is template.walls
+
+    cache_size = LevelTemplate.cache_size
+    LevelTemplate.cache_size = 2
+    try:
+        LevelTemplate.get("#@#")
+        LevelTemplate.get(LEVEL_STRING)
+        LevelTemplate.get("#@ #")
+        assert LevelTemplate.get(LEVEL_STRING) is template
+        assert list(LevelTemplate._cache) == ["#@ #", LEVEL_STRING]
+    finally:
+        LevelTemplate.cache_size = cache_size
+        LevelTemplate.clear_cache()
+
+
+def test_stats():
+    for cls in (Sokoban, CompactSokoban):
+        game = cls()
+        assert game.stats is None and game.disable_stats() is None
+        events = []
+        stats = game.enable_stats(lambda *args: events.append(args[0]))
+        assert isinstance(stats, SokobanStats) and game.stats is stats
+
+        assert game.move(Sokoban.UP)
+        assert game.apply_moves("lllldRRR") == 8 and game.is_solved()
+        assert game.apply_moves("uu") == 1 and game.undo()
+        assert game.find_path(SokobanVector(1, 1)) is not None
+        assert game.find_path(SokobanVector(1, 1)) is not None
+        assert game.clone().stats is None
+
+        assert (stats.nmove, stats.npush, stats.nrejected, stats.nundo) == (10, 3, 1, 1)
+        assert stats.nfind_path == 2
+        assert stats.nbfs >= 1 and stats.nbfs_node >= stats.nbfs
+        assert events[:4] == ["move", "apply_moves", "apply_moves", "undo"]
+        assert events.count("find_path") == 2 and "bfs" in events
+        exported = stats.as_dict()
+        assert exported["nmove"] == stats.nmove
+        assert exported["time_find_path"] >= exported["time_bfs"] > 0
+
+        assert game.disable_stats() is stats
+        assert game.stats is None and "move" not in game.__dict__
+        game.move(Sokoban.UP)
+        assert stats.nmove == 10
+        stats.reset()
+        assert not any(stats.as_dict().values())
+
+
+def test_pull():
+    rng = random.Random(5)
+
+    for cls in (Sokoban, CompactSokoban):
+        game = cls("#######\n#     #\n# $@  #\n#  .  #\n#######")
+        text = str(game)
+        state_hash = game.state_hash
+
+        assert game.pull(Sokoban.RIGHT)
+        assert game.boxes == {SokobanVector(2, 3)} and game.npush == 1
+        assert game.history[-1] == SokobanHistory.PULL
+        assert not game.pull(Sokoban.LEFT)
+        assert game.pull(Sokoban.UP) and game.npush == 1
+        assert game.undo() and game.undo()
+        assert str(game) == text and game.state_hash == state_hash
+        assert (game.nmove, game.npush) == (0, 0)
+
+        game = cls(LEVEL_STRING)
+        text = str(game)
+        state_hash = game.state_hash
+        for _ in range(300):
+            direction = rng.choice(Sokoban.DIRECTIONS)
+            if rng.random() < 0.5:
+                game.pull(direction)
+            else:
+                game.move(direction)
+        assert str(game) == str(cls.from_grid(game.to_grid()))
+        if any(code & SokobanHistory.PULL for code in game.history):
+            with pytest.raises(ValueError):
+                game.to_lurd()
+        while game.undo():
+            pass
+        assert str(game) == text and game.state_hash == state_hash
+        assert (game.nmove, game.npush) == (0, 0)
+
+
+def test_snapshot_and_clone():
+    rng = random.Random(4)
+
+    for cls in (Sokoban, CompactSokoban):
+        game = cls(LEVEL_STRING)
+        game.apply_moves("ullluuuLUllDlldd")
+        text = str(game)
+        state_hash = game.state_hash
+        lurd = game.to_lurd()
+        snapshot = game.snapshot()
+
+        for i in range(2):
+            for j in range(200):
+                if not game.move(rng.choice(list(Sokoban.DIRECTIONS))):
+                    game.undo()
+            str(game)
+            game.restore(snapshot)
+
+            assert str(game) == text
+            assert game.state_hash == state_hash
+            assert game.to_lurd() == lurd
+            assert (game.nmove, game.npush) == (16, 3)
+
+        game.undo()
+
+        assert game.nmove == 15
+
+        clone = game.clone()
+
+        assert str(clone) == str(game)
+        assert clone.state_hash == game.state_hash
+        assert clone.to_lurd() == game.to_lurd()
+
+        clone.apply_moves("rrdd")
+        clone.restore(snapshot)
+
+        assert str(clone) == text
+        assert clone.is_solved() == game.is_solved()
+        assert game.nmove == 15 and len(game.history) == 15
+
+        assert clone.walls == game.walls
+        assert game.clone(share_static=False).dead_squares == game.dead_squares
+
+    game = Sokoban()
+
+    assert game.clone().walls is game.walls
+    assert game.clone(share_static=False).walls is not game.walls
@@ -0,0 +1,337 @@
+from pathlib import Path
+from xml.etree import ElementTree
+import heapq
+import itertools
+import random
+
+import pytest
+
+from sokobanpy import (
+    SokobanVector,
+    Sokoban,
+    CompactSokoban,
+    SolverResult,
+    Solver,
+    BidirectionalSolver,
+    TranspositionTable,
+    solve,
+    solve_collection,
+)
+from sokobanpy.solver import _Level
+
+COLLECTION_PATH = Path(__file__).parent / "examples" / "example04" / "level_collections"
+LEVEL_STRING = (
+    ""
+    + "    #####\n"
+    + "    #   #\n"
+    + "    #$  #\n"
+    + "  ###  $##\n"
+    + "  #  $ $ #\n"
+    + "### # ## #   ######\n"
+    + "#   # ## #####  ..#\n"
+    + "# $  $          ..#\n"
+    + "##### ### #@##  ..#\n"
+    + "    #     #########\n"
+    + "    #######\n"
+)
+
+
+def load_levels(name):
+    root = ElementTree.fromstring((COLLECTION_PATH / name).read_text())
+    return [
+        "\n".join(line.text for line in level.findall("./L"))
+        for level in root.findall("./LevelCollection/Level")
+    ]
+
+
+def replay(game, moves):
+    for direction in moves:
+        assert game.move(direction)
+    return game
+
+
+def test_solve():
+    game = Sokoban()
+    moves = game.solve()
+
+    assert replay(game, moves).is_solved()
+    assert game.npush == 3
+
+    for level_string in load_levels("0Beginner.slc"):
+        game = Sokoban(level_string)
+        result = solve(game)
+
+        assert result.status == SolverResult.SOLVED
+        assert replay(game, result.moves).is_solved()
+        assert replay(CompactSokoban(level_string), result.moves).is_solved()
+
+
+def test_solve_unsolvable_and_limit():
+    game = Sokoban("#####\n#@$.#\n#####\n")
+    game.move(Sokoban.RIGHT)
+    game.move(Sokoban.RIGHT)
+
+    assert game.is_solved()
+    assert game.solve() == []
+
+    game = Sokoban("#####\n#$ .#\n#@  #\n#####\n")
+    assert game.solve() is None
+    assert solve(game).status == SolverResult.UNSOLVABLE
+
+    game = Sokoban(load_levels("0Beginner.slc")[-1])
+    result = solve(game, max_nodes=1)
+
+    assert result.status == SolverResult.LIMIT
+    assert result.moves is None
+
+
+def optimal_costs(level_string, moves_first):
+    # Dijkstra over every player move; costs are (pushes, moves) or the reverse.
+    game = Sokoban(level_string)
+    start = (game.player, frozenset(game.boxes))
+    best = {start: (0, 0)}
+    heap = [((0, 0), 0, start)]
+    tie = 0
+    while heap:
+        cost, _, (player, boxes) = heapq.heappop(heap)
+        if best[(player, boxes)] < cost:
+            continue
+        if boxes == game.goals:
+            return cost
+        for direction in Sokoban.DIRECTIONS:
+            new_player = player + direction
+            new_boxes = boxes
+            push = 0
+            if new_player in game.walls:
+                continue
+            if new_player in boxes:
+                new_box = new_player + direction
+                if new_box in game.walls or new_box in boxes:
+                    continue
+                new_boxes = boxes.difference((new_player,)).union((new_box,))
+                push = 1
+            step = (1, push) if moves_first else (push, 1)
+            new_cost = (cost[0] + step[0], cost[1] + step[1])
+            state = (new_player, new_boxes)
+            if state not in best or new_cost < best[state]:
+                best[state] = new_cost
+                tie += 1
+                heapq.heappush(heap, (new_cost, tie, state))
+
+
+def test_solve_optimize():
+    levels = load_levels("0Beginner.slc")[10:] + [
+        "#######\n## @###\n# .$  #\n#   $ #\n#   . #\n#######",
+        "#######\n#  @ .#\n#   $ #\n#   ###\n#     #\n#######",
+    ]
+    for level_string in levels:
+        pushes, moves = optimal_costs(level_string, moves_first=False)
+        fewest_moves = optimal_costs(level_string, moves_first=True)[0]
+
+        for optimize, cost in (
+            (Solver.PUSHES, pushes),
+            (Solver.MOVES, fewest_moves),
+            (Solver.PUSHES_THEN_MOVES, (pushes, moves)),
+        ):
+            game = CompactSokoban(level_string)
+            result = solve(game, optimize=optimize)
+            assert result.optimal and result.optimize == optimize
+            assert result.lower_bound == cost
+            assert replay(game, result.moves).is_solved()
+            assert game.npush == result.npush
+            if optimize == Solver.PUSHES_THEN_MOVES:
+                assert (game.npush, game.nmove) == cost
+            else:
+                assert (game.npush, game.nmove)[optimize == Solver.MOVES] == cost
+
+    # The second extra level needs more pushes for fewer moves.
+    game = Sokoban(levels[-1])
+    result = solve(game, max_nodes=3, optimize=Solver.PUSHES_THEN_MOVES)
+    assert result.status == SolverResult.LIMIT and not result.optimal
+    assert result.lower_bound <= (4, 15)
+    assert len(game.solve(optimize=Solver.MOVES)) == 13
+    assert len(solve(game, max_bytes=4096, optimize=Solver.MOVES).moves) == 13
+
+    with pytest.raises(ValueError):
+        solve(game, optimize="boxes")
+    with pytest.raises(ValueError):
+        solve(game, jobs=2, optimize=Solver.MOVES)
+
+
+def test_goal_matching():
+    from sokobanpy.solver import INF, _GoalMatching, _Level
+
+    def best_cost(level, boxes):
+        return min(
+            sum(level.goal_distances[goal][box] for goal, box in zip(goals, boxes))
+            for goals in itertools.permutations(level.goal_order)
+        )
+
+    rng = random.Random(0)
+    for level_string in load_levels("Novoban.slc")[:10]:
+        level = _Level(Sokoban(level_string))
+        floor = [i for i in range(level.size) if level.floor[i]]
+        matching = _GoalMatching(level, rng.sample(floor, len(level.goals)))
+        assert matching.cost == best_cost(level, matching.boxes[1:])
+        for _ in range(20):
+            box = rng.choice(matching.boxes[1:])
+            new_box = rng.choice([i for i in floor if i not in matching.boxes])
+            new_matching = matching.push(box, new_box)
+            assert new_matching.cost == best_cost(level, new_matching.boxes[1:])
+            assert box in matching.boxes
+            matching = new_matching
+
+    # Both boxes can reach only the same goal.
+    game = Sokoban("########\n#@ $ $.#\n#.######\n########")
+    assert _GoalMatching(_Level(game), _Level(game).goals).cost == 0
+    result = solve(game)
+    assert result.status == SolverResult.UNSOLVABLE and result.nodes == 0
+    assert Solver(game, matching=False).solve().nodes > 0
+
+    game = Sokoban(load_levels("Novoban.slc")[-1])
+    matching = Solver(game).solve()
+    nearest = Solver(game, matching=False).solve()
+    assert matching.lower_bound == nearest.lower_bound
+    assert matching.nodes < nearest.nodes
+
+
+def test_bidirectional_solve():
+    for level_string in load_levels("0Beginner.slc") + load_levels("Novoban.slc")[-3:]:
+        game = Sokoban(level_string)
+        result = solve(game, bidirectional=True)
+
+        assert result.status == SolverResult.SOLVED
+        assert replay(game, result.moves).is_solved()
+        assert game.npush == result.npush
+
+    # Long pushes along a corridor meet halfway.
+    result = BidirectionalSolver(Sokoban(LEVEL_STRING)).solve()
+    assert replay(Sokoban(LEVEL_STRING), result.moves).is_solved()
+    assert result.nodes < solve(Sokoban(LEVEL_STRING)).nodes
+    assert not result.optimal
+
+    game = Sokoban("#########\n#..$@$  #\n#########")
+    assert solve(game, bidirectional=True).status == SolverResult.UNSOLVABLE
+    game = Sokoban("#####\n#$ .#\n#@  #\n#####\n")
+    assert solve(game, bidirectional=True).status == SolverResult.UNSOLVABLE
+    result = solve(Sokoban(LEVEL_STRING), max_nodes=10, bidirectional=True)
+    assert result.status == SolverResult.LIMIT
+
+    with pytest.raises(ValueError):
+        solve(game, bidirectional=True, optimize=Solver.PUSHES)
+    with pytest.raises(ValueError):
+        solve(game, bidirectional=True, jobs=2)
+
+
+def test_macros():
+    level = _Level(Sokoban(LEVEL_STRING), macros=True)
+    assert level.entrance == level.index(SokobanVector(7, 14))
+    assert set(level.room_order) == level.goals
+    assert level.tunnels[0][level.index(SokobanVector(7, 13))]
+    assert not level.tunnels[1][level.index(SokobanVector(7, 13))]
+    assert not _Level(Sokoban(LEVEL_STRING)).entrance
+
+    # The whole corridor is one transition.
+    game = Sokoban("##########\n#@$     .#\n##########")
+    result = solve(game, macros=True)
+    assert (result.nodes, result.npush) == (1, 6)
+    assert not result.optimal and result.optimize is None
+    assert replay(game, result.moves).is_solved()
+
+    for level_string in load_levels("0Beginner.slc") + [LEVEL_STRING]:
+        game = Sokoban(level_string)
+        result = solve(game, macros=True)
+        plain = solve(Sokoban(level_string))
+
+        assert result.status == SolverResult.SOLVED
+        assert replay(game, result.moves).is_solved()
+        assert game.npush == result.npush
+        assert result.nodes <= plain.nodes
+    assert result.nodes < plain.nodes // 2
+
+    # Running out of states is not a proof when macros prune pushes.
+    game = Sokoban("#########\n#..$@$  #\n#########")
+    assert solve(game).status == SolverResult.UNSOLVABLE
+    result = solve(game, macros=True)
+    assert result.status == SolverResult.LIMIT and result.nodes > 0
+
+    with pytest.raises(ValueError):
+        Solver(game, optimize=Solver.MOVES, macros=True)
+    with pytest.raises(ValueError):
+        solve(game, macros=True, jobs=2)
+    with pytest.raises(ValueError):
+        solve(game, macros=True, optimize=Solver.PUSHES)
+
+
+def test_TranspositionTable():
+    table = TranspositionTable(max_bytes=1280, probe=4)
+    assert table.capacity == 64 and table.nbytes == 1280
+
+    assert table.visit(5, 3)
+    assert not table.visit(5, 3)
+    assert table.visit(5, 2)
+    assert table.get(5) == 2 and 5 in table and 6 not in table
+    assert table.visit(0, 1) and 0 in table
+    assert table.visit(9, 3 << 32 | 7) and not table.visit(9, 3 << 32 | 8)
+    assert table.visit(9, 2 << 32 | 99) and table.get(9) == 2 << 32 | 99
+
+    # Keys sharing a home slot evict the deepest entry once the probe is full.
+    for i in range(1, 5):
+        assert table.visit(i * 64 + 5, 10 + i)
+    assert table.evictions == 1
+    assert 4 * 64 + 5 in table and 3 * 64 + 5 not in table
+    assert len(table) == 6
+
+    table = TranspositionTable(max_bytes=1024, policy=TranspositionTable.AGE)
+    for i in range(9):
+        table.visit(i * 64 + 7, 9 - i)
+    assert 7 not in table and 8 * 64 + 7 in table
+
+    with pytest.raises(ValueError):
+        TranspositionTable(policy="random")
+    with pytest.raises(ValueError):
+        TranspositionTable(max_bytes=100)
+
+    table.clear()
+    assert len(table) == 0 and table.evictions == 0 and 8 * 64 + 7 not in table
+
+    # A search still succeeds with a table smaller than its states.
+    for policy in (TranspositionTable.DEPTH, TranspositionTable.AGE):
+        game = Sokoban(load_levels("Novoban.slc")[-1])
+        result = solve(game, max_nodes=50000, max_bytes=131072, table_policy=policy)
+        assert replay(game, result.moves).is_solved()
+    with pytest.raises(ValueError):
+        Solver(game, max_bytes=65536, table_policy="random")
+
+    # Pushes then moves compares (pushes, moves) costs in the table too.
+    for optimize in (Solver.MOVES, Solver.PUSHES_THEN_MOVES):
+        game = Sokoban(load_levels("0Beginner.slc")[-1])
+        small = solve(game, max_bytes=4096, optimize=optimize)
+        full = solve(game, optimize=optimize)
+        assert len(small.moves) == len(full.moves) and small.npush == full.npush
+
+
+def test_parallel_solve():
+    for level_string in load_levels("Novoban.slc")[-3:]:
+        game = Sokoban(level_string)
+        result = solve(game, jobs=2)
+        assert result.status == SolverResult.SOLVED
+        assert replay(game, result.moves).is_solved()
+
+    game = Sokoban("#########\n#..$@$  #\n#########")
+    assert solve(game, jobs=2).status == SolverResult.UNSOLVABLE
+
+    game = Sokoban(load_levels("Novoban.slc")[-1])
+    assert solve(game, max_nodes=10, jobs=2).status == SolverResult.LIMIT
+
+
+def test_solve_collection():
+    path = COLLECTION_PATH / "0Beginner.slc"
+    results = dict(solve_collection(path, jobs=2, max_nodes=10000))
+    assert sorted(results) == list(range(20))
+    for index, level_string in enumerate(load_levels("0Beginner.slc")):
+        assert replay(Sokoban(level_string), results[index].moves).is_solved()
+
+    # Workers starved of memory do not stop the run.
+    results = dict(solve_collection(path, jobs=2, memory_limit=2**20))
+    assert sorted(results) == list(range(20))